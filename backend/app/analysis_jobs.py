@@ -0,0 +1,344 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import multiprocessing
+import queue
+import socket
+
+import sys
+import os
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
+
+from utils.database import Database
+from app.auth import get_current_user
+
+router = APIRouter(prefix="/api/video/analysis", tags=["视频"])
+
+JOB_COLLECTION = "analysis_jobs"
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", 1))  # 同时运行的分析进程数
+ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", 900))  # 单次分析的最长时间（秒）
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", 3))
+ANALYSIS_RETRY_DELAY = int(os.getenv("ANALYSIS_RETRY_DELAY", 30))  # 重试间隔（秒），按已尝试次数递增
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", 2))
+ANALYSIS_LEASE = 60  # 任务租约（秒），运行中定期续期，过期视为崩溃
+
+# 逐帧关键点单独存储，每个文档保存连续 KEYPOINT_CHUNK_FRAMES 个取样帧
+KEYPOINT_COLLECTION = "video_keypoints"
+KEYPOINT_CHUNK_FRAMES = 300
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_running_tasks = set()
+_dispatcher_task = None
+_wakeup = None
+
+
+def _worker_main(video_path: str, angle, messages):
+    """分析进程入口：进度与结果通过队列发回；没有可用模型时发回 fatal，任务不再重试"""
+    try:
+        # 仅在分析进程中加载 OpenCV 与推理运行时
+        from utils.pose_analysis import analyze_video_file
+        from utils.pose_models import PoseModelUnavailable
+    except Exception as e:
+        messages.put(("error", f"{type(e).__name__}: {e}"))
+        return
+    try:
+        result = analyze_video_file(video_path, lambda percent: messages.put(("progress", percent)), angle)
+        messages.put(("result", result))
+    except PoseModelUnavailable as e:
+        messages.put(("fatal", str(e)))
+    except Exception as e:
+        messages.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def format_analysis_job(job: dict) -> dict:
+    return {
+        "id": str(job["_id"]),
+        "video_id": str(job["video_id"]),
+        "status": job.get("status"),
+        "progress": job.get("progress", 0),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "performance": job.get("performance"),
+        "created_at": job["created_at"].isoformat() if isinstance(job.get("created_at"), datetime) else None,
+        "started_at": job["started_at"].isoformat() if isinstance(job.get("started_at"), datetime) else None,
+        "completed_at": job["completed_at"].isoformat() if isinstance(job.get("completed_at"), datetime) else None,
+    }
+
+
+async def _update_video(video_id: ObjectId, fields: dict):
+    collection = Database.get_collection("videos")
+    await collection.update_one({"_id": video_id}, {"$set": {**fields, "updated_at": datetime.now()}})
+
+
+async def enqueue_analysis(video: dict) -> dict:
+    """为视频创建分析任务（已有未完成的任务时直接返回该任务）
+
+    未完成的任务带有 active 字段，由 video_id 上的唯一部分索引保证每个视频最多一个，
+    并发提交时插入失败的一方返回已有任务。
+    """
+    collection = Database.get_collection(JOB_COLLECTION)
+    unfinished = {"video_id": video["_id"], "status": {"$in": ["pending", "processing"]}}
+    existing = await collection.find_one(unfinished)
+    if existing:
+        return existing
+
+    now = datetime.now()
+    job = {
+        "video_id": video["_id"],
+        "user_id": video["user_id"],
+        "filepath": video["filepath"],
+        "angle": video.get("angle"),
+        "status": "pending",
+        "active": True,
+        "progress": 0,
+        "attempts": 0,
+        "error": None,
+        "available_at": now,
+        "lease_until": None,
+        "created_at": now,
+    }
+    try:
+        result = await collection.insert_one(job)
+    except DuplicateKeyError:
+        existing = await collection.find_one(unfinished)
+        if existing:
+            return existing
+        # 已有任务恰好在此期间结束，重新提交
+        return await enqueue_analysis(video)
+    job["_id"] = result.inserted_id
+    await _update_video(video["_id"], {"analysis_status": "pending", "analysis_progress": 0, "analysis_job_id": result.inserted_id})
+    if _wakeup:
+        _wakeup.set()
+    return job
+
+
+async def _claim_job():
+    """原子地领取一个到期的待处理任务"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    now = datetime.now()
+    return await collection.find_one_and_update(
+        {"status": "pending", "available_at": {"$lte": now}},
+        {
+            "$set": {"status": "processing", "started_at": now, "lease_until": now + timedelta(seconds=ANALYSIS_LEASE), "worker": WORKER_ID},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def store_key_points(video_id: ObjectId, job_id: ObjectId, key_points: dict, fps: float) -> dict:
+    """按块写入逐帧关键点，返回写入分析结果的引用
+
+    先写入本次任务的数据，再删除该视频其他任务的旧数据，读取方始终按引用中的 job_id 查询。
+    """
+    collection = Database.get_collection(KEYPOINT_COLLECTION)
+    frames, points = key_points["frames"], key_points["points"]
+    chunks = []
+    for start in range(0, len(frames), KEYPOINT_CHUNK_FRAMES):
+        chunk_frames = frames[start:start + KEYPOINT_CHUNK_FRAMES]
+        chunks.append({
+            "video_id": video_id,
+            "job_id": job_id,
+            "start": start,
+            "frames": chunk_frames,
+            "times": [round(frame / fps, 3) for frame in chunk_frames],
+            "points": points[start:start + KEYPOINT_CHUNK_FRAMES].astype(float).round(3).tolist(),
+        })
+    if chunks:
+        await collection.insert_many(chunks)
+    await collection.delete_many({"video_id": video_id, "job_id": {"$ne": job_id}})
+    return {"job_id": job_id, "count": len(frames)}
+
+
+async def _finish_job(job: dict, result: dict = None, error: str = None, retry: bool = True):
+    """记录任务结果；可重试的失败在未达到最大尝试次数时重新排队"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    now = datetime.now()
+    if error is None:
+        result["key_points"] = await store_key_points(job["video_id"], job["_id"], result["key_points"], result["video"]["fps"])
+        await collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                "status": "completed",
+                "progress": 100,
+                "error": None,
+                "performance": result.get("performance"),
+                "completed_at": now,
+                "lease_until": None
+            }, "$unset": {"active": ""}}
+        )
+        await _update_video(job["video_id"], {"analysis_status": "completed", "analysis_progress": 100, "analysis_result": result})
+    elif retry and job["attempts"] < ANALYSIS_MAX_ATTEMPTS:
+        await collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                "status": "pending",
+                "progress": 0,
+                "error": error,
+                "available_at": now + timedelta(seconds=ANALYSIS_RETRY_DELAY * job["attempts"]),
+                "lease_until": None
+            }}
+        )
+        await _update_video(job["video_id"], {"analysis_status": "pending", "analysis_progress": 0})
+    else:
+        await collection.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "failed", "error": error, "completed_at": now, "lease_until": None}, "$unset": {"active": ""}}
+        )
+        await _update_video(job["video_id"], {"analysis_status": "failed", "analysis_error": error})
+
+
+def _drain(messages) -> list:
+    """非阻塞地取出分析进程已发送的全部消息"""
+    items = []
+    while True:
+        try:
+            items.append(messages.get_nowait())
+        except queue.Empty:
+            return items
+
+
+async def run_analysis_job(job: dict):
+    """在独立进程中执行分析：转发进度、续期租约，超时或进程崩溃时终止并按失败处理"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    loop = asyncio.get_running_loop()
+    context = multiprocessing.get_context("spawn")
+    messages = context.Queue()
+    process = context.Process(target=_worker_main, args=(job["filepath"], job.get("angle"), messages), daemon=True)
+    process.start()
+
+    deadline = loop.time() + ANALYSIS_TIMEOUT
+    lease_renew_at = loop.time() + ANALYSIS_LEASE / 3
+    progress = job.get("progress", 0)
+    result, error, retry = None, None, True
+    try:
+        while result is None and error is None:
+            exited = not process.is_alive()
+            # 进程退出前写入的消息在退出后仍可读取，因此先判断存活再取消息
+            for kind, value in _drain(messages):
+                if kind == "progress":
+                    progress = round(value, 1)
+                elif kind == "result":
+                    result = value
+                else:
+                    error = value
+                    retry = kind != "fatal"
+            if result is not None or error is not None:
+                break
+            if exited:
+                error = f"分析进程异常退出（退出码 {process.exitcode}）"
+                break
+            if loop.time() > deadline:
+                error = f"分析超时（超过{ANALYSIS_TIMEOUT}秒）"
+                break
+
+            update = {}
+            if progress != job.get("progress"):
+                update["progress"] = job["progress"] = progress
+            if loop.time() >= lease_renew_at:
+                update["lease_until"] = datetime.now() + timedelta(seconds=ANALYSIS_LEASE)
+                lease_renew_at = loop.time() + ANALYSIS_LEASE / 3
+            if update:
+                await collection.update_one({"_id": job["_id"], "status": "processing"}, {"$set": update})
+                if "progress" in update:
+                    await _update_video(job["video_id"], {"analysis_status": "processing", "analysis_progress": progress})
+            await asyncio.sleep(0.5)
+    except asyncio.CancelledError:
+        # 服务关闭：任务重新排队，本次不计入尝试次数
+        await collection.update_one(
+            {"_id": job["_id"], "status": "processing"},
+            {"$set": {"status": "pending", "available_at": datetime.now(), "lease_until": None}, "$inc": {"attempts": -1}}
+        )
+        raise
+    finally:
+        if process.is_alive():
+            process.terminate()
+        await asyncio.to_thread(process.join, 5)
+        messages.close()
+
+    await _finish_job(job, result, error, retry)
+
+
+async def recover_stale_jobs() -> int:
+    """恢复租约已过期的 processing 任务（工作进程或服务崩溃遗留），返回恢复数量"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    count = 0
+    async for job in collection.find({"status": "processing", "lease_until": {"$lt": datetime.now()}}):
+        # 仅当任务仍处于同一租约时更新，避免与续期竞争
+        claimed = await collection.find_one_and_update(
+            {"_id": job["_id"], "status": "processing", "lease_until": job["lease_until"]},
+            {"$set": {"lease_until": None}}
+        )
+        if claimed:
+            await _finish_job(job, error=job.get("error") or "分析进程中断（租约过期）")
+            count += 1
+    return count
+
+
+def _on_job_done(task: asyncio.Task):
+    _running_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        print(f"⚠️ 视频分析任务失败: {task.exception()}")
+    if _wakeup:
+        _wakeup.set()
+
+
+async def _dispatch_loop():
+    """领取任务直到占满 ANALYSIS_WORKERS 个进程；有新任务或任务结束时立即唤醒"""
+    while True:
+        try:
+            await recover_stale_jobs()
+            while len(_running_tasks) < ANALYSIS_WORKERS:
+                job = await _claim_job()
+                if not job:
+                    break
+                await _update_video(job["video_id"], {"analysis_status": "processing", "analysis_progress": job.get("progress", 0)})
+                task = asyncio.create_task(run_analysis_job(job))
+                _running_tasks.add(task)
+                task.add_done_callback(_on_job_done)
+        except Exception as e:
+            print(f"⚠️ 调度视频分析任务失败: {e}")
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), ANALYSIS_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start_analysis_jobs():
+    """启动分析任务调度；崩溃遗留的 processing 任务在租约过期后自动恢复"""
+    global _dispatcher_task, _wakeup
+    _wakeup = asyncio.Event()
+    _dispatcher_task = asyncio.create_task(_dispatch_loop())
+
+
+async def stop_analysis_jobs():
+    """停止调度并终止运行中的分析进程（其任务重新排队）"""
+    if _dispatcher_task:
+        _dispatcher_task.cancel()
+    tasks = list(_running_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.get("/{job_id}")
+async def get_analysis_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """查询视频分析任务状态与进度"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的任务ID")
+    collection = Database.get_collection(JOB_COLLECTION)
+    job = await collection.find_one({"_id": ObjectId(job_id), "user_id": current_user["id"]})
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="分析任务不存在")
+    return format_analysis_job(job)
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends
+from typing import Optional
+
+import sys
+import os
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
+
+from utils import analytics
+from app.auth import get_current_user
+
+router = APIRouter(prefix="/api/analytics", tags=["数据分析"])
+
+
+@router.get("/training-load")
+async def get_training_load(
+    days: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取每日训练负荷（ATL/CTL/TSB）"""
+    arrays = await analytics.load_exercise_arrays(current_user["id"], days)
+    return analytics.training_load(arrays)
+
+
+@router.get("/heart-rate-zones")
+async def get_heart_rate_zones(
+    days: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取心率区间分布"""
+    arrays = await analytics.load_exercise_arrays(current_user["id"], days)
+    return analytics.heart_rate_zones(arrays)
+
+
+@router.get("/weekly-volume")
+async def get_weekly_volume(
+    days: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取每周训练量"""
+    arrays = await analytics.load_exercise_arrays(current_user["id"], days)
+    return analytics.weekly_volume(arrays)
+
+
+@router.get("/pace-trend")
+async def get_pace_trend(
+    days: Optional[int] = None,
+    window: int = 5,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取配速趋势"""
+    arrays = await analytics.load_exercise_arrays(current_user["id"], days)
+    return analytics.pace_trend(arrays, window)
+
+
+@router.get("/summary")
+async def get_analytics_summary(
+    days: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """获取训练分析摘要"""
+    arrays = await analytics.load_exercise_arrays(current_user["id"], days)
+    return analytics.summarize(arrays)
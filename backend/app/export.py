@@ -0,0 +1,243 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import sys
+import os
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
+
+from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
+from utils.pagination import decode_cursor, encode_cursor, keyset_after, keyset_until
+from utils.export_schema import TABLE_EXPORT_SCHEMA, ExportSchema, iter_batches, normalize_documents
+from utils.export import export_to_csv, export_to_json, export_to_pdf, EXPORT_CHUNK_SIZE, EXPORT_MAX_CHUNK_SIZE, JSON_EXPORT_FORMATS
+from utils.compression import compress_streaming_response
+from utils.columnar import COLUMNAR_FORMATS, ROW_GROUP_SIZE, MAX_ROW_GROUP_SIZE, select_columns, iter_columnar
+from app.auth import get_current_user
+
+router = APIRouter(prefix="/api/export", tags=["数据导出"])
+
+# 水位线滞后时间（秒）：写入时间戳在提交之前生成，最近这段时间内的记录可能尚未提交，
+# 留到下次增量导出，避免时间戳早于水位线、提交晚于水位线的记录被跳过
+EXPORT_WATERMARK_LAG = int(os.getenv("EXPORT_WATERMARK_LAG", 60))
+
+
+async def resolve_export_range(
+    user_id: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None
+) -> Tuple[dict, Optional[str]]:
+    """构建导出查询并确定水位线
+
+    水位线取 EXPORT_WATERMARK_LAG 秒之前最新的一条记录的游标，下次以 after_cursor=水位线
+    导出即只包含之后写入的记录。增量导出（带 after_cursor）截止到水位线，最近的记录留到下次；
+    全量导出包含现有的全部记录（包括缺少 timestamp 的），水位线之后的记录可能在下次增量导出中重复出现。
+    没有满足滞后条件的记录时水位线保持为 after_cursor。after_cursor 无效时抛出 ValueError。
+    """
+    conditions = [{"userId": user_id}]
+    time_range = {}
+    if since:
+        time_range["$gte"] = since
+    if until:
+        time_range["$lt"] = until
+    if time_range:
+        conditions.append({"timestamp": time_range})
+
+    settled = {"timestamp": {"$lte": datetime.now() - timedelta(seconds=EXPORT_WATERMARK_LAG)}}
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    sort = [("timestamp", -1), ("_id", -1)]
+    if after_cursor:
+        # 显式的时间下界使索引扫描范围收紧，$or 只用于同一时间戳内按 _id 区分
+        after_timestamp = decode_cursor(after_cursor)[0]
+        if after_timestamp is not None:
+            conditions.append({"timestamp": {"$gte": after_timestamp}})
+        conditions.append(keyset_after(after_cursor))
+        conditions.append(settled)
+        end = mark = await collection.find_one({"$and": conditions}, {"timestamp": 1}, sort=sort)
+    else:
+        mark = await collection.find_one({"$and": conditions + [settled]}, {"timestamp": 1}, sort=sort)
+        end = await collection.find_one({"$and": conditions}, {"timestamp": 1}, sort=sort)
+
+    watermark = encode_cursor(mark["timestamp"], mark["_id"]) if mark else after_cursor
+    if end and "timestamp" in end:
+        # 固定导出范围的上界，导出期间新写入的记录不会混入
+        conditions.append(keyset_until(end["timestamp"], end["_id"]))
+    return {"$and": conditions}, watermark
+
+
+def with_watermark(response: StreamingResponse, watermark: Optional[str]) -> StreamingResponse:
+    """在响应头中返回水位线"""
+    if watermark:
+        response.headers["X-Export-Watermark"] = watermark
+    return response
+
+
+def _export_cursor(query: dict, fields: Optional[dict], batch_size: int):
+    """按时间倒序读取运动数据（fields 为 MongoDB 投影）"""
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    return collection.find(query, fields).sort([("timestamp", -1), ("_id", -1)]).batch_size(batch_size)
+
+
+async def _iter_rows(schema: ExportSchema, query: dict, batch_size: int):
+    """按批次读取游标并整批格式化为行"""
+    cursor = _export_cursor(query, schema.projection(), batch_size)
+    async for docs in iter_batches(cursor, batch_size):
+        yield schema.format_batch(docs)
+
+
+async def build_csv_export(query: dict, chunk_size: int = EXPORT_CHUNK_SIZE) -> StreamingResponse:
+    """生成CSV导出响应"""
+    rows = _iter_rows(TABLE_EXPORT_SCHEMA, query, chunk_size)
+    return await export_to_csv(TABLE_EXPORT_SCHEMA.headers, rows, "running_data.csv")
+
+
+async def build_json_export(
+    query: dict,
+    format: str = "json",
+    pretty: bool = False,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> StreamingResponse:
+    """生成JSON/NDJSON导出响应（完整文档，ObjectId 与 datetime 由序列化器处理）"""
+    cursor = _export_cursor(query, None, chunk_size)
+
+    async def iter_docs():
+        async for docs in iter_batches(cursor, chunk_size):
+            yield normalize_documents(docs)
+
+    return await export_to_json(iter_docs(), "running_data", format, pretty)
+
+
+async def build_pdf_export(query: dict) -> StreamingResponse:
+    """生成PDF导出响应"""
+    rows = _iter_rows(TABLE_EXPORT_SCHEMA, query, EXPORT_CHUNK_SIZE)
+    return await export_to_pdf(TABLE_EXPORT_SCHEMA.headers, rows, "运动数据导出", "running_data.pdf")
+
+
+async def build_columnar_export(
+    query: dict,
+    format: str = "parquet",
+    columns: Optional[str] = None,
+    row_group_size: int = ROW_GROUP_SIZE
+) -> StreamingResponse:
+    """生成Parquet/Arrow导出响应，columns 为逗号分隔的列名"""
+    schema = select_columns(columns)
+    cursor = _export_cursor(query, schema.projection(), min(row_group_size, EXPORT_CHUNK_SIZE))
+    media_type, extension = COLUMNAR_FORMATS[format]
+
+    return StreamingResponse(
+        iter_columnar(iter_batches(cursor, row_group_size), schema, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=running_data{extension}"}
+    )
+
+
+async def _export_range(
+    user_id: str,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    after_cursor: Optional[str]
+) -> Tuple[dict, Optional[str]]:
+    try:
+        return await resolve_export_range(user_id, since, until, after_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/csv")
+async def export_csv(
+    request: Request,
+    userId: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=EXPORT_MAX_CHUNK_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """导出CSV数据（流式输出，内存占用与数据量无关；按 Accept-Encoding 逐块压缩）
+
+    since/until 限定时间范围 [since, until)；after_cursor 为上次导出返回的
+    X-Export-Watermark，仅导出之后写入的记录。
+    """
+    # 如果未指定userId，使用当前用户ID
+    query, watermark = await _export_range(userId or current_user["id"], since, until, after_cursor)
+    response = await build_csv_export(query, chunk_size)
+    return compress_streaming_response(request, with_watermark(response, watermark))
+
+
+@router.get("/json")
+async def export_json(
+    request: Request,
+    userId: Optional[str] = None,
+    format: str = "json",
+    pretty: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, ge=1, le=EXPORT_MAX_CHUNK_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """导出JSON数据（format=json 为JSON数组，format=ndjson 为每行一条；pretty=true 时缩进输出；按 Accept-Encoding 逐块压缩）
+
+    since/until/after_cursor 与 CSV 导出相同。
+    """
+    if format not in JSON_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+
+    # 如果未指定userId，使用当前用户ID
+    query, watermark = await _export_range(userId or current_user["id"], since, until, after_cursor)
+    response = await build_json_export(query, format, pretty, chunk_size)
+    return compress_streaming_response(request, with_watermark(response, watermark))
+
+
+@router.get("/pdf")
+async def export_pdf(
+    userId: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """导出PDF数据（since/until/after_cursor 与 CSV 导出相同）"""
+    # 如果未指定userId，使用当前用户ID
+    query, watermark = await _export_range(userId or current_user["id"], since, until, after_cursor)
+    return with_watermark(await build_pdf_export(query), watermark)
+
+
+@router.get("/parquet")
+async def export_parquet(
+    userId: Optional[str] = None,
+    columns: Optional[str] = None,
+    row_group_size: int = Query(ROW_GROUP_SIZE, ge=1, le=MAX_ROW_GROUP_SIZE),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """导出Parquet数据（嵌套字段展开为带类型的列，columns 指定导出的列；since/until/after_cursor 与 CSV 导出相同）"""
+    query, watermark = await _export_range(userId or current_user["id"], since, until, after_cursor)
+    return with_watermark(await _columnar_response(query, "parquet", columns, row_group_size), watermark)
+
+
+@router.get("/arrow")
+async def export_arrow(
+    userId: Optional[str] = None,
+    columns: Optional[str] = None,
+    row_group_size: int = Query(ROW_GROUP_SIZE, ge=1, le=MAX_ROW_GROUP_SIZE),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """导出Arrow IPC流数据（嵌套字段展开为带类型的列，columns 指定导出的列；since/until/after_cursor 与 CSV 导出相同）"""
+    query, watermark = await _export_range(userId or current_user["id"], since, until, after_cursor)
+    return with_watermark(await _columnar_response(query, "arrow", columns, row_group_size), watermark)
+
+
+async def _columnar_response(query: dict, format: str, columns: Optional[str], row_group_size: int) -> StreamingResponse:
+    try:
+        return await build_columnar_export(query, format, columns, row_group_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,373 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import hashlib
+import json
+import socket
+import time
+import uuid
+import aiofiles
+
+import sys
+import os
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
+
+from models.export import ExportJobCreate
+from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
+from utils.ranges import range_file_response
+from app.auth import get_current_user
+from app.export import resolve_export_range, build_csv_export, build_json_export, build_pdf_export, build_columnar_export
+
+router = APIRouter(prefix="/api/export/jobs", tags=["数据导出"])
+
+JOB_COLLECTION = "export_jobs"
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(backend_root), "data", "exports"))
+EXPORT_JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", 24 * 3600))  # 导出文件保留时间（秒）
+EXPORT_JOB_CLEANUP_INTERVAL = int(os.getenv("EXPORT_JOB_CLEANUP_INTERVAL", 600))
+EXPORT_JOB_LEASE = 60  # 任务租约（秒），运行中定期续期，过期视为执行进程已崩溃
+EXPORT_JOB_MAX_ATTEMPTS = int(os.getenv("EXPORT_JOB_MAX_ATTEMPTS", 3))  # 执行进程中断后最多重新执行的总次数
+os.makedirs(EXPORT_DIR, exist_ok=True)
+
+# 导出格式 -> (文件扩展名, 根据查询生成导出响应)
+EXPORT_JOB_FORMATS = {
+    "csv": (".csv", lambda query, options: build_csv_export(query)),
+    "json": (".json", lambda query, options: build_json_export(query, "json", options.get("pretty", False))),
+    "ndjson": (".ndjson", lambda query, options: build_json_export(query, "ndjson")),
+    "pdf": (".pdf", lambda query, options: build_pdf_export(query)),
+    "parquet": (".parquet", lambda query, options: build_columnar_export(query, "parquet", options.get("columns"))),
+    "arrow": (".arrows", lambda query, options: build_columnar_export(query, "arrow", options.get("columns"))),
+}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_running_tasks = set()
+_cleanup_task = None
+
+
+async def _data_version(user_id: str) -> str:
+    """用户最新一条运动数据的ID，数据变化后相同请求不再复用旧文件"""
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    latest = await collection.find_one({"userId": user_id}, {"_id": 1}, sort=[("timestamp", -1), ("_id", -1)])
+    return str(latest["_id"]) if latest else ""
+
+
+def _job_key(user_id: str, format: str, options: dict, version: str, watermark: Optional[str]) -> str:
+    payload = json.dumps([user_id, format, options, version, watermark], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+async def _resolve_range(user_id: str, options: dict):
+    """按任务选项解析导出范围，返回 (查询条件, 水位线)"""
+    return await resolve_export_range(
+        user_id,
+        _parse_datetime(options.get("since")),
+        _parse_datetime(options.get("until")),
+        options.get("after_cursor")
+    )
+
+
+def _job_path(job_id, format: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{job_id}{EXPORT_JOB_FORMATS[format][0]}")
+
+
+def _format_job(job: dict) -> dict:
+    job_id = str(job["_id"])
+    result = {
+        "id": job_id,
+        "format": job.get("format"),
+        "status": job.get("status"),
+        "attempts": job.get("attempts", 0),
+        "file_size": job.get("file_size"),
+        "error": job.get("error"),
+        "watermark": job.get("watermark"),
+        "created_at": job["created_at"].isoformat() if isinstance(job.get("created_at"), datetime) else None,
+        "completed_at": job["completed_at"].isoformat() if isinstance(job.get("completed_at"), datetime) else None,
+        "expires_at": job["expires_at"].isoformat() if isinstance(job.get("expires_at"), datetime) else None,
+    }
+    if job.get("status") == "completed":
+        result["download_url"] = f"{router.prefix}/{job_id}/download"
+    return result
+
+
+async def _renew_lease(job_id: ObjectId):
+    """任务运行期间定期续租"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    while True:
+        await asyncio.sleep(EXPORT_JOB_LEASE / 3)
+        await collection.update_one(
+            {"_id": job_id, "status": "processing", "worker": WORKER_ID},
+            {"$set": {"lease_until": datetime.now() + timedelta(seconds=EXPORT_JOB_LEASE)}}
+        )
+
+
+async def run_export_job(job_id: ObjectId):
+    """执行导出任务：生成文件后原子替换到导出目录"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    now = datetime.now()
+    job = await collection.find_one_and_update(
+        {"_id": job_id, "status": "pending"},
+        {"$set": {
+            "status": "processing",
+            "worker": WORKER_ID,
+            "lease_until": now + timedelta(seconds=EXPORT_JOB_LEASE),
+            "started_at": now
+        }, "$inc": {"attempts": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return
+
+    # 仅当任务仍由本进程持有时写入结果（租约过期后可能已被其他进程接管）
+    owned = {"_id": job_id, "status": "processing", "worker": WORKER_ID}
+    filepath = _job_path(job_id, job["format"])
+    temp_path = f"{filepath}.{uuid.uuid4().hex}.part"
+    renewer = asyncio.create_task(_renew_lease(job_id))
+    try:
+        _, builder = EXPORT_JOB_FORMATS[job["format"]]
+        options = job.get("options", {})
+        query, watermark = await _resolve_range(job["user_id"], options)
+        response = await builder(query, options)
+        file_size = 0
+        async with aiofiles.open(temp_path, "wb") as f:
+            async for chunk in response.body_iterator:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                await f.write(chunk)
+                file_size += len(chunk)
+        os.replace(temp_path, filepath)
+
+        await collection.update_one(
+            owned,
+            {"$set": {
+                "status": "completed",
+                "filepath": filepath,
+                "file_size": file_size,
+                "media_type": response.media_type,
+                "watermark": watermark,
+                "lease_until": None,
+                "completed_at": datetime.now()
+            }}
+        )
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        # 失败的任务不再参与去重，相同请求可以重新创建
+        await collection.update_one(
+            owned,
+            {
+                "$set": {"status": "failed", "error": str(e), "lease_until": None, "completed_at": datetime.now()},
+                "$unset": {"dedupe_key": ""}
+            }
+        )
+    finally:
+        renewer.cancel()
+
+
+def schedule_export_job(job_id: ObjectId):
+    """在后台执行导出任务"""
+    task = asyncio.create_task(run_export_job(job_id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+
+
+def _remove_orphaned_parts() -> int:
+    """删除执行进程中断后遗留的临时文件（同步，需在线程中调用）"""
+    deadline = time.time() - EXPORT_JOB_TTL
+    count = 0
+    with os.scandir(EXPORT_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".part") and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                count += 1
+    return count
+
+
+async def cleanup_expired_jobs() -> int:
+    """删除过期的导出任务及其文件，以及中断遗留的临时文件，返回删除的任务数量"""
+    collection = Database.get_collection(JOB_COLLECTION)
+    count = 0
+    async for job in collection.find({"expires_at": {"$lt": datetime.now()}}, {"filepath": 1}):
+        filepath = job.get("filepath")
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+        await collection.delete_one({"_id": job["_id"]})
+        count += 1
+    await asyncio.to_thread(_remove_orphaned_parts)
+    return count
+
+
+async def recover_stale_jobs() -> int:
+    """处理租约已过期的 processing 任务（执行进程崩溃遗留）：未达到最大尝试次数的重新排队并执行，
+    否则标记为失败，返回处理的任务数量
+    """
+    collection = Database.get_collection(JOB_COLLECTION)
+    count = 0
+    stale = {"status": "processing", "$or": [{"lease_until": {"$lt": datetime.now()}}, {"lease_until": {"$exists": False}}]}
+    async for job in collection.find(stale, {"_id": 1}):
+        # 条件更新：其他进程同时恢复或原进程恰好续租时只有一方成功
+        recovered = await collection.update_one(
+            {"_id": job["_id"], **stale, "attempts": {"$not": {"$gte": EXPORT_JOB_MAX_ATTEMPTS}}},
+            {"$set": {"status": "pending", "lease_until": None}}
+        )
+        if recovered.modified_count:
+            schedule_export_job(job["_id"])
+            count += 1
+            continue
+        failed = await collection.update_one(
+            {"_id": job["_id"], **stale},
+            {
+                "$set": {"status": "failed", "error": "导出进程多次中断（租约过期）", "lease_until": None, "completed_at": datetime.now()},
+                "$unset": {"dedupe_key": ""}
+            }
+        )
+        count += failed.modified_count
+    return count
+
+
+async def _cleanup_loop():
+    last_cleanup = 0.0
+    while True:
+        try:
+            await recover_stale_jobs()
+            if time.monotonic() - last_cleanup >= EXPORT_JOB_CLEANUP_INTERVAL:
+                await cleanup_expired_jobs()
+                last_cleanup = time.monotonic()
+        except Exception as e:
+            print(f"⚠️ 清理导出任务失败: {e}")
+        await asyncio.sleep(EXPORT_JOB_LEASE)
+
+
+async def start_export_jobs():
+    """启动时执行待处理的任务，并开始定期恢复中断的任务与清理过期任务
+
+    仅恢复租约已过期的 processing 任务，多个 API 进程同时启动或滚动重启时
+    不会重置仍在其他进程中运行的任务。
+    """
+    global _cleanup_task
+    collection = Database.get_collection(JOB_COLLECTION)
+    async for job in collection.find({"status": "pending"}, {"_id": 1}):
+        schedule_export_job(job["_id"])
+    _cleanup_task = asyncio.create_task(_cleanup_loop())
+
+
+async def stop_export_jobs():
+    """停止定期清理"""
+    if _cleanup_task:
+        _cleanup_task.cancel()
+
+
+async def _get_user_job(job_id: str, user_id: str) -> dict:
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的任务ID")
+    collection = Database.get_collection(JOB_COLLECTION)
+    job = await collection.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="导出任务不存在")
+    return job
+
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    job_data: ExportJobCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """创建导出任务（相同请求且数据与水位线均未变化时复用已有任务）"""
+    if job_data.format not in EXPORT_JOB_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的导出格式。支持的格式：{', '.join(EXPORT_JOB_FORMATS)}"
+        )
+
+    user_id = current_user["id"]
+    options = {}
+    if job_data.format == "json":
+        options["pretty"] = job_data.pretty
+    if job_data.format in ("parquet", "arrow") and job_data.columns:
+        options["columns"] = job_data.columns
+    if job_data.since:
+        options["since"] = job_data.since.isoformat()
+    if job_data.until:
+        options["until"] = job_data.until.isoformat()
+    if job_data.after_cursor:
+        options["after_cursor"] = job_data.after_cursor
+    try:
+        # 水位线与执行时相同（含滞后），最新数据越过滞后时间后相同请求同样不再复用旧任务
+        _, watermark = await _resolve_range(user_id, options)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    key = _job_key(user_id, job_data.format, options, await _data_version(user_id), watermark)
+
+    collection = Database.get_collection(JOB_COLLECTION)
+    now = datetime.now()
+    job = {
+        "user_id": user_id,
+        "format": job_data.format,
+        "options": options,
+        # 可复用的任务（pending / processing / 未过期的 completed）才带有 dedupe_key，
+        # (user_id, dedupe_key) 上的唯一部分索引保证并发的相同请求只创建一个任务
+        "dedupe_key": key,
+        "status": "pending",  # pending, processing, completed, failed
+        "attempts": 0,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=EXPORT_JOB_TTL)
+    }
+    for _ in range(2):
+        existing = await collection.find_one({"user_id": user_id, "dedupe_key": key})
+        if existing and existing["expires_at"] > now:
+            return _format_job(existing)
+        if existing:
+            # 已过期但尚未被清理的任务不再复用
+            await collection.update_one({"_id": existing["_id"]}, {"$unset": {"dedupe_key": ""}})
+        try:
+            result = await collection.insert_one(job)
+            break
+        except DuplicateKeyError:
+            job.pop("_id", None)
+    else:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="相同的导出任务正在创建，请稍后重试")
+    schedule_export_job(result.inserted_id)
+
+    return _format_job(job)
+
+
+@router.get("/{job_id}")
+async def get_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """查询导出任务状态"""
+    return _format_job(await _get_user_job(job_id, current_user["id"]))
+
+
+@router.get("/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """下载导出文件（支持 Range 断点续传）"""
+    job = await _get_user_job(job_id, current_user["id"])
+    if job.get("status") != "completed":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="导出任务尚未完成")
+
+    filepath = job.get("filepath")
+    if not filepath or not os.path.exists(filepath):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="导出文件不存在或已过期")
+
+    extension = EXPORT_JOB_FORMATS[job["format"]][0]
+    return range_file_response(
+        request,
+        filepath,
+        job.get("media_type", "application/octet-stream"),
+        f"attachment; filename=running_data{extension}"
+    )
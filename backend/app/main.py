@@ -1,10 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
 from datetime import datetime
 from bson import ObjectId
-import csv
-import io
 from typing import List, Optional
 
 import sys
@@ -17,18 +14,37 @@ sys.path.insert(0, backend_root)
 
 from models.exercise import ExerciseData, ExerciseDataCreate
 from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
 from app.auth import router as auth_router
 from app.video import router as video_router
+from app.video_uploads import router as video_uploads_router, start_upload_sessions, stop_upload_sessions
+from app.analysis_jobs import router as analysis_jobs_router, start_analysis_jobs, stop_analysis_jobs
 from app.training_plan import router as training_plan_router
-from app.auth import get_current_user
-from utils.export import export_to_csv, export_to_json, export_to_pdf
+from app.analytics import router as analytics_router
+from app.export import router as export_router
+from app.export_jobs import router as export_jobs_router, start_export_jobs, stop_export_jobs
+from utils.export import shutdown_pdf_executor
+from utils.statistics import compute_statistics
+from utils.downsample import downsample_statistics
+from utils import stats_rollup
+from utils.pagination import keyset_filter, next_cursor
+from utils.cache import response_cache, request_key, encode_json, cached_response
+from utils.ingest import ingest, iter_json_array, iter_ndjson, LineTooLong, NDJSON_MEDIA_TYPES
+
+# 统计图表序列默认最大点数（0 表示不降采样）
+STATS_MAX_POINTS = int(os.getenv("STATS_MAX_POINTS", 500))
 
 app = FastAPI(title="跑步分析系统API", version="2.0.0")
 
 # 注册路由
 app.include_router(auth_router)
+app.include_router(video_uploads_router)
+app.include_router(analysis_jobs_router)
 app.include_router(video_router)
 app.include_router(training_plan_router)
+app.include_router(analytics_router)
+app.include_router(export_router)
+app.include_router(export_jobs_router)
 
 # 配置CORS
 app.add_middleware(
@@ -37,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Export-Watermark", "ETag", "Upload-Offset", "Upload-Length"],
 )
 
 
@@ -44,12 +61,19 @@ app.add_middleware(
 async def startup_event():
     """应用启动时连接数据库"""
     await Database.connect()
+    await start_export_jobs()
+    await start_upload_sessions()
+    await start_analysis_jobs()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时断开数据库连接"""
+    await stop_export_jobs()
+    await stop_upload_sessions()
+    await stop_analysis_jobs()
     await Database.disconnect()
+    shutdown_pdf_executor()
 
 
 @app.get("/")
@@ -70,64 +94,121 @@ async def root():
             "运动数据": {
                 "GET /api/exercise": "获取运动数据列表",
                 "POST /api/exercise": "提交运动数据",
+                "POST /api/exercise/batch": "批量提交运动数据（JSON数组或NDJSON）",
                 "GET /api/exercise/{id}": "获取单条运动数据",
                 "GET /api/statistics": "获取统计数据"
             },
             "视频分析": {
                 "POST /api/video/upload": "上传视频",
+                "POST /api/video/uploads": "创建断点续传上传会话",
+                "GET /api/video/uploads/{id}": "查询已上传偏移",
+                "PATCH /api/video/uploads/{id}": "按偏移上传分块",
+                "POST /api/video/uploads/{id}/complete": "完成断点续传上传",
+                "DELETE /api/video/uploads/{id}": "取消上传",
                 "GET /api/video/list": "获取视频列表",
                 "GET /api/video/{id}/preview": "预览视频",
-                "POST /api/video/{id}/analyze": "分析视频"
+                "POST /api/video/{id}/analyze": "提交视频分析任务",
+                "GET /api/video/analysis/{id}": "查询视频分析任务进度"
             },
             "训练计划": {
                 "POST /api/training-plan/generate": "生成训练计划",
                 "GET /api/training-plan/list": "获取训练计划列表",
-                "GET /api/training-plan/{id}": "获取训练计划详情"
+                "GET /api/training-plan/{id}": "获取训练计划详情",
+                "GET /api/training-plan/{id}/pdf": "下载训练计划PDF"
+            },
+            "数据分析": {
+                "GET /api/analytics/training-load": "训练负荷（ATL/CTL/TSB）",
+                "GET /api/analytics/heart-rate-zones": "心率区间分布",
+                "GET /api/analytics/weekly-volume": "每周训练量",
+                "GET /api/analytics/pace-trend": "配速趋势",
+                "GET /api/analytics/summary": "训练分析摘要"
             },
             "数据导出": {
                 "GET /api/export/csv": "导出CSV数据",
                 "GET /api/export/json": "导出JSON数据",
-                "GET /api/export/pdf": "导出PDF数据"
+                "GET /api/export/pdf": "导出PDF数据",
+                "GET /api/export/parquet": "导出Parquet数据",
+                "GET /api/export/arrow": "导出Arrow IPC数据",
+                "POST /api/export/jobs": "创建异步导出任务",
+                "GET /api/export/jobs/{id}": "查询导出任务状态",
+                "GET /api/export/jobs/{id}/download": "下载导出文件（支持断点续传）"
             }
         }
     }
 
 
+async def on_exercises_inserted(docs: List[dict]):
+    """运动数据写入后：增量更新统计汇总并失效相关缓存"""
+    await stats_rollup.apply_exercises(docs)
+    for user_id in {doc.get("userId") for doc in docs}:
+        response_cache.invalidate(user_id)
+
+
 @app.get("/api/exercise", response_model=List[ExerciseData])
 async def get_exercise_data(
+    request: Request,
     userId: Optional[str] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     skip: int = 0
 ):
-    """获取运动数据列表"""
-    collection = Database.get_collection("exercise")
+    """获取运动数据列表
+    
+    使用 cursor 按 (timestamp, _id) 翻页，下一页游标通过 X-Next-Cursor 响应头返回；
+    skip 仅作为旧版分页方式保留。
+    """
+    cache_key = request_key(request)
+    generation = response_cache.generation(userId)
+    cached = response_cache.get(userId, cache_key)
+    if cached:
+        return cached_response(request, cached)
+    
+    collection = Database.get_collection(EXERCISE_COLLECTION)
     
     query = {}
     if userId:
         query["userId"] = userId
     
-    cursor = collection.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-    results = await cursor.to_list(length=limit)
+    if cursor:
+        try:
+            query.update(keyset_filter(cursor))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        skip = 0
+    
+    db_cursor = collection.find(query).sort([("timestamp", -1), ("_id", -1)]).skip(skip).limit(limit)
+    results = await db_cursor.to_list(length=limit)
     
     exercise_list = []
     for doc in results:
-        doc["id"] = str(doc["_id"])
-        doc["timestamp"] = doc.get("timestamp", doc.get("_id").generation_time)
-        exercise_list.append(ExerciseData(**doc))
+        # 游标使用库中保存的 timestamp，展示时缺失才回退到 _id 生成时间
+        exercise_list.append(ExerciseData(**{
+            **doc,
+            "id": str(doc["_id"]),
+            "timestamp": doc.get("timestamp") or doc["_id"].generation_time
+        }))
     
-    return exercise_list
+    headers = {}
+    cursor_value = next_cursor(results, limit)
+    if cursor_value:
+        headers["X-Next-Cursor"] = cursor_value
+    
+    cached = response_cache.set(userId, cache_key, encode_json(exercise_list), headers, generation)
+    return cached_response(request, cached)
 
 
 @app.post("/api/exercise", response_model=ExerciseData)
 async def create_exercise_data(exercise: ExerciseDataCreate):
     """创建运动数据"""
-    collection = Database.get_collection("exercise")
+    collection = Database.get_collection(EXERCISE_COLLECTION)
     
     exercise_dict = exercise.dict()
     exercise_dict["timestamp"] = datetime.now()
     
     result = await collection.insert_one(exercise_dict)
     
+    await on_exercises_inserted([exercise_dict])
+    
     # 获取插入的文档
     inserted_doc = await collection.find_one({"_id": result.inserted_id})
     inserted_doc["id"] = str(inserted_doc["_id"])
@@ -136,10 +217,30 @@ async def create_exercise_data(exercise: ExerciseDataCreate):
     return ExerciseData(**inserted_doc)
 
 
+@app.post("/api/exercise/batch")
+async def create_exercise_data_batch(request: Request):
+    """批量创建运动数据（JSON数组或NDJSON）"""
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_MEDIA_TYPES:
+        items = iter_ndjson(request.stream())
+    else:
+        try:
+            items = iter_json_array(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无效的请求体: {str(e)}")
+    
+    try:
+        return await ingest(collection, items, on_inserted=on_exercises_inserted)
+    except LineTooLong as e:
+        raise HTTPException(status_code=413, detail=f"{str(e)}，该记录之前已写入的数据块不会回滚")
+
+
 @app.get("/api/exercise/{exercise_id}", response_model=ExerciseData)
 async def get_exercise_by_id(exercise_id: str):
     """根据ID获取运动数据"""
-    collection = Database.get_collection("exercise")
+    collection = Database.get_collection(EXERCISE_COLLECTION)
     
     try:
         doc = await collection.find_one({"_id": ObjectId(exercise_id)})
@@ -154,185 +255,32 @@ async def get_exercise_by_id(exercise_id: str):
 
 
 @app.get("/api/statistics")
-async def get_statistics(userId: Optional[str] = None):
-    """获取统计数据"""
-    collection = Database.get_collection("exercise")
-    
-    query = {}
-    if userId:
-        query["userId"] = userId
-    
-    cursor = collection.find(query)
-    results = await cursor.to_list(length=None)
-    
-    if not results:
-        return {
-            "heartRate": {"avg": 0, "max": 0, "min": 0, "data": []},
-            "pace": {"avg": 0, "max": 0, "min": 0, "data": []},
-            "calories": {"avg": 0, "max": 0, "min": 0, "data": []},
-            "dates": []
-        }
-    
-    heart_rates = []
-    paces = []
-    calories_list = []
-    dates = []
-    
-    for doc in results:
-        timestamp = doc.get("timestamp", doc["_id"].generation_time)
-        if isinstance(timestamp, datetime):
-            dates.append(timestamp.strftime("%Y-%m-%d"))
-        else:
-            dates.append(str(timestamp))
-        
-        if "bandData" in doc and doc["bandData"]:
-            if "heartRate" in doc["bandData"] and doc["bandData"]["heartRate"]:
-                heart_rates.append(doc["bandData"]["heartRate"])
-            if "pace" in doc["bandData"] and doc["bandData"]["pace"]:
-                paces.append(doc["bandData"]["pace"])
-            if "calories" in doc["bandData"] and doc["bandData"]["calories"]:
-                calories_list.append(doc["bandData"]["calories"])
-    
-    def calc_stats(values):
-        if not values:
-            return {"avg": 0, "max": 0, "min": 0, "data": []}
-        return {
-            "avg": round(sum(values) / len(values), 2),
-            "max": max(values),
-            "min": min(values),
-            "data": values
-        }
-    
-    return {
-        "heartRate": calc_stats(heart_rates),
-        "pace": calc_stats(paces),
-        "calories": calc_stats(calories_list),
-        "dates": dates[:len(heart_rates)] if heart_rates else dates
-    }
-
-
-@app.get("/api/export/csv")
-async def export_csv(
-    userId: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """导出CSV数据"""
-    collection = Database.get_collection("exercise")
-    
-    # 如果未指定userId，使用当前用户ID
-    if not userId:
-        userId = current_user["id"]
-    
-    query = {"userId": userId}
-    
-    cursor = collection.find(query).sort("timestamp", -1)
-    results = await cursor.to_list(length=None)
-    
-    # 格式化数据
-    data = []
-    for doc in results:
-        timestamp = doc.get("timestamp", doc["_id"].generation_time)
-        if isinstance(timestamp, datetime):
-            date_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            date_str = str(timestamp)
-        
-        band_data = doc.get("bandData", {}) or {}
-        treadmill_data = doc.get("treadmillData", {}) or {}
-        basic_info = doc.get("basicInfo", {}) or {}
-        
-        data.append({
-            "日期": date_str,
-            "用户ID": doc.get("userId", ""),
-            "心率(bpm)": band_data.get("heartRate", ""),
-            "配速(min/km)": band_data.get("pace", ""),
-            "卡路里(kcal)": band_data.get("calories", ""),
-            "速度(km/h)": treadmill_data.get("speed", ""),
-            "距离(km)": treadmill_data.get("distance", ""),
-            "时长(分钟)": treadmill_data.get("duration", ""),
-            "身高(cm)": basic_info.get("height", ""),
-            "体重(kg)": basic_info.get("weight", ""),
-            "体脂率(%)": basic_info.get("bodyFat", "")
-        })
-    
-    return await export_to_csv(data, "running_data.csv")
-
-
-@app.get("/api/export/json")
-async def export_json(
+async def get_statistics(
+    request: Request,
     userId: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    max_points: int = STATS_MAX_POINTS
 ):
-    """导出JSON数据"""
-    collection = Database.get_collection("exercise")
-    
-    # 如果未指定userId，使用当前用户ID
-    if not userId:
-        userId = current_user["id"]
-    
-    query = {"userId": userId}
+    """获取统计数据（MongoDB聚合管道计算，可选日期范围）
     
-    cursor = collection.find(query).sort("timestamp", -1)
-    results = await cursor.to_list(length=None)
+    图表序列按 max_points 降采样，max_points=0 时返回完整序列。
+    """
+    cache_key = request_key(request)
+    generation = response_cache.generation(userId)
+    cached = response_cache.get(userId, cache_key)
+    if cached:
+        return cached_response(request, cached)
     
-    # 格式化数据
-    data = []
-    for doc in results:
-        doc["id"] = str(doc["_id"])
-        doc["timestamp"] = doc.get("timestamp", doc["_id"].generation_time)
-        if isinstance(doc["timestamp"], datetime):
-            doc["timestamp"] = doc["timestamp"].isoformat()
-        doc.pop("_id", None)
-        data.append(doc)
-    
-    return await export_to_json(data, "running_data.json")
-
-
-@app.get("/api/export/pdf")
-async def export_pdf(
-    userId: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """导出PDF数据"""
-    collection = Database.get_collection("exercise")
-    
-    # 如果未指定userId，使用当前用户ID
-    if not userId:
-        userId = current_user["id"]
-    
-    query = {"userId": userId}
-    
-    cursor = collection.find(query).sort("timestamp", -1)
-    results = await cursor.to_list(length=None)
-    
-    # 格式化数据
-    data = []
-    for doc in results:
-        timestamp = doc.get("timestamp", doc["_id"].generation_time)
-        if isinstance(timestamp, datetime):
-            date_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            date_str = str(timestamp)
-        
-        band_data = doc.get("bandData", {}) or {}
-        treadmill_data = doc.get("treadmillData", {}) or {}
-        basic_info = doc.get("basicInfo", {}) or {}
-        
-        data.append({
-            "日期": date_str,
-            "用户ID": doc.get("userId", ""),
-            "心率(bpm)": str(band_data.get("heartRate", "")),
-            "配速(min/km)": str(band_data.get("pace", "")),
-            "卡路里(kcal)": str(band_data.get("calories", "")),
-            "速度(km/h)": str(treadmill_data.get("speed", "")),
-            "距离(km)": str(treadmill_data.get("distance", "")),
-            "时长(分钟)": str(treadmill_data.get("duration", "")),
-            "身高(cm)": str(basic_info.get("height", "")),
-            "体重(kg)": str(basic_info.get("weight", "")),
-            "体脂率(%)": str(basic_info.get("bodyFat", ""))
-        })
+    if userId and stats_rollup.STATS_ROLLUP_ENABLED:
+        stats = await stats_rollup.read_statistics(userId, start_date, end_date)
+    else:
+        collection = Database.get_collection(EXERCISE_COLLECTION)
+        stats = await compute_statistics(collection, userId, start_date, end_date)
     
-    return await export_to_pdf(data, "运动数据导出", "running_data.pdf")
+    stats = downsample_statistics(stats, max_points)
+    cached = response_cache.set(userId, cache_key, encode_json(stats), generation=generation)
+    return cached_response(request, cached)
 
 
 if __name__ == "__main__":
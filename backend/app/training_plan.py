@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from typing import Optional, List
 from datetime import datetime, timedelta
 from bson import ObjectId
@@ -12,6 +12,12 @@ sys.path.insert(0, backend_root)
 
 from models.user import User
 from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
+from utils import stats_rollup
+from utils import analytics
+from utils.projections import projection
+from utils.pdf_cache import get_plan_pdf
+from utils.ranges import range_file_response
 from app.auth import get_current_user
 
 router = APIRouter(prefix="/api/training-plan", tags=["训练计划"])
@@ -21,49 +27,97 @@ DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "")
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 
 
+def _average(values: list) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+async def _get_latest_basic_info(user_id: str) -> dict:
+    """获取用户最近一次运动数据中的基础信息"""
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    latest = await collection.find_one(
+        {"userId": user_id},
+        {"basicInfo": 1},
+        sort=[("timestamp", -1)]
+    )
+    return (latest or {}).get("basicInfo", {}) or {}
+
+
 async def get_user_history_data(user_id: str, days: int = 30) -> dict:
     """获取用户历史数据"""
-    collection = Database.get_collection("exercise")
-    
     # 计算日期范围
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
     
-    # 查询数据
-    cursor = collection.find({
-        "userId": user_id,
-        "timestamp": {"$gte": start_date, "$lte": end_date}
-    }).sort("timestamp", 1)
-    
-    exercises = await cursor.to_list(length=None)
-    
-    # 统计数据
-    heart_rates = []
-    paces = []
-    calories_list = []
-    distances = []
-    durations = []
-    
-    for ex in exercises:
-        band_data = ex.get("bandData", {}) or {}
-        treadmill_data = ex.get("treadmillData", {}) or {}
+    # 统计汇总已开启时直接读取按天汇总，无需扫描原始数据
+    if stats_rollup.STATS_ROLLUP_ENABLED:
+        summary = await stats_rollup.read_summary(user_id, start_date, end_date)
+        averages = {
+            name: summary[name]["sum"] / summary[name]["count"] if name in summary else 0
+            for name in stats_rollup.ROLLUP_FIELDS
+        }
+        basic_info = await _get_latest_basic_info(user_id)
+        history = {
+            "heart_rates": [],
+            "paces": [],
+            "calories": [],
+            "distances": [],
+            "durations": [],
+            "total_exercises": summary["exercises"]
+        }
+    else:
+        collection = Database.get_collection(EXERCISE_COLLECTION)
         
-        if band_data.get("heartRate"):
-            heart_rates.append(band_data["heartRate"])
-        if band_data.get("pace"):
-            paces.append(band_data["pace"])
-        if band_data.get("calories"):
-            calories_list.append(band_data["calories"])
-        if treadmill_data.get("distance"):
-            distances.append(treadmill_data["distance"])
-        if treadmill_data.get("duration"):
-            durations.append(treadmill_data["duration"])
+        # 查询数据
+        cursor = collection.find({
+            "userId": user_id,
+            "timestamp": {"$gte": start_date, "$lte": end_date}
+        }, projection("history")).sort("timestamp", 1)
+        
+        exercises = await cursor.to_list(length=None)
+        
+        # 统计数据
+        heart_rates = []
+        paces = []
+        calories_list = []
+        distances = []
+        durations = []
+        
+        for ex in exercises:
+            band_data = ex.get("bandData", {}) or {}
+            treadmill_data = ex.get("treadmillData", {}) or {}
+            
+            if band_data.get("heartRate"):
+                heart_rates.append(band_data["heartRate"])
+            if band_data.get("pace"):
+                paces.append(band_data["pace"])
+            if band_data.get("calories"):
+                calories_list.append(band_data["calories"])
+            if treadmill_data.get("distance"):
+                distances.append(treadmill_data["distance"])
+            if treadmill_data.get("duration"):
+                durations.append(treadmill_data["duration"])
+        
+        averages = {
+            "heartRate": _average(heart_rates),
+            "pace": _average(paces),
+            "calories": _average(calories_list),
+            "distance": _average(distances),
+            "duration": _average(durations)
+        }
+        basic_info = ex.get("basicInfo", {}) or {} if exercises else {}
+        history = {
+            "heart_rates": heart_rates,
+            "paces": paces,
+            "calories": calories_list,
+            "distances": distances,
+            "durations": durations,
+            "total_exercises": len(exercises)
+        }
     
     # 获取用户基础信息
     user_collection = Database.get_collection("users")
     user = await user_collection.find_one({"_id": ObjectId(user_id)})
     
-    basic_info = ex.get("basicInfo", {}) or {} if exercises else {}
     if user:
         basic_info.update({
             "gender": user.get("gender"),
@@ -72,24 +126,50 @@ async def get_user_history_data(user_id: str, days: int = 30) -> dict:
     
     return {
         "basic_info": basic_info,
-        "heart_rates": heart_rates,
-        "paces": paces,
-        "calories": calories_list,
-        "distances": distances,
-        "durations": durations,
-        "total_exercises": len(exercises),
+        **history,
+        "averages": averages,
         "days": days
     }
 
 
-def format_prompt_for_deepseek(history_data: dict, plan_type: str, goal: str) -> str:
+def format_analytics_for_prompt(summary: Optional[dict]) -> str:
+    """将训练分析摘要格式化为提示词片段"""
+    if not summary or not summary.get("training_load"):
+        return ""
+    
+    load = summary["training_load"]
+    zones = "，".join(
+        f"{zone['zone']}({zone['range'][0]}-{zone['range'][1]}bpm) {zone['percent']}%"
+        for zone in summary.get("heart_rate_zones", [])
+    )
+    weeks = "；".join(
+        f"{week['week_start']}起 {week['sessions']}次/{week['distance']}km/{week['duration']}分钟"
+        for week in summary.get("recent_weeks", [])
+    )
+    return f"""
+训练负荷分析：
+- 慢性训练负荷CTL（体能）：{load['ctl']}
+- 急性训练负荷ATL（疲劳）：{load['atl']}
+- 训练压力平衡TSB（状态）：{load['tsb']}
+- 心率区间分布：{zones}
+- 最近几周训练量：{weeks}
+- 配速趋势：{summary.get('pace_slope_per_week', 0):+.3f}min/km 每周
+"""
+
+
+def format_prompt_for_deepseek(
+    history_data: dict,
+    plan_type: str,
+    goal: str,
+    analytics_summary: Optional[dict] = None
+) -> str:
     """格式化提示词给DeepSeek API"""
     basic_info = history_data.get("basic_info", {})
-    heart_rates = history_data.get("heart_rates", [])
-    paces = history_data.get("paces", [])
+    averages = history_data.get("averages", {})
     
-    avg_heart_rate = sum(heart_rates) / len(heart_rates) if heart_rates else 0
-    avg_pace = sum(paces) / len(paces) if paces else 0
+    avg_heart_rate = averages.get("heartRate", 0)
+    avg_pace = averages.get("pace", 0)
+    avg_calories = averages.get("calories", 0)
     
     prompt = f"""你是一位专业的跑步训练教练。请根据以下用户数据，生成一份科学的个性化训练计划。
 
@@ -104,8 +184,8 @@ def format_prompt_for_deepseek(history_data: dict, plan_type: str, goal: str) ->
 - 训练次数：{history_data.get('total_exercises', 0)}次
 - 平均心率：{avg_heart_rate:.1f}bpm
 - 平均配速：{avg_pace:.2f}min/km
-- 平均卡路里：{sum(history_data.get('calories', [])) / len(history_data.get('calories', [])) if history_data.get('calories') else 0:.0f}kcal
-
+- 平均卡路里：{avg_calories:.0f}kcal
+{format_analytics_for_prompt(analytics_summary)}
 训练目标：{goal}
 计划类型：{plan_type}（{'短期计划1-4周' if plan_type == 'short' else '长期计划1-6个月'}）
 
@@ -210,8 +290,12 @@ async def generate_training_plan(
     # 获取历史数据
     history_data = await get_user_history_data(user_id, days)
     
+    # 训练负荷分析（CTL 需要更长的历史窗口）
+    arrays = await analytics.load_exercise_arrays(user_id, max(days, 3 * analytics.CTL_DAYS))
+    analytics_summary = analytics.summarize(arrays)
+    
     # 格式化提示词
-    prompt = format_prompt_for_deepseek(history_data, plan_type, goal)
+    prompt = format_prompt_for_deepseek(history_data, plan_type, goal, analytics_summary)
     
     # 调用DeepSeek API
     plan_data = await call_deepseek_api(prompt)
@@ -224,8 +308,8 @@ async def generate_training_plan(
         "goal": goal,
         "plan_data": plan_data,
         "history_data_summary": {
-            "avg_heart_rate": sum(history_data.get("heart_rates", [])) / len(history_data.get("heart_rates", [])) if history_data.get("heart_rates") else 0,
-            "avg_pace": sum(history_data.get("paces", [])) / len(history_data.get("paces", [])) if history_data.get("paces") else 0,
+            "avg_heart_rate": history_data["averages"].get("heartRate", 0),
+            "avg_pace": history_data["averages"].get("pace", 0),
             "total_exercises": history_data.get("total_exercises", 0)
         },
         "created_at": datetime.now(),
@@ -305,3 +389,45 @@ async def get_training_plan(
         "created_at": plan["created_at"].isoformat() if isinstance(plan["created_at"], datetime) else str(plan["created_at"])
     }
 
+
+@router.get("/{plan_id}/pdf")
+async def download_training_plan_pdf(
+    plan_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """下载训练计划PDF（按计划内容缓存，内容不变时直接返回已生成的文件）"""
+    if not ObjectId.is_valid(plan_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的训练计划ID"
+        )
+    
+    collection = Database.get_collection("training_plans")
+    plan = await collection.find_one(
+        {"_id": ObjectId(plan_id), "user_id": current_user["id"]},
+        {"plan_data": 1}
+    )
+    
+    if not plan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="训练计划不存在"
+        )
+    
+    # 缓存文件在返回路径后、打开前被淘汰时视为未命中，重新渲染
+    for attempt in range(3):
+        path = await get_plan_pdf(plan.get("plan_data") or {})
+        try:
+            return range_file_response(
+                request,
+                path,
+                "application/pdf",
+                f"attachment; filename=training_plan_{plan_id}.pdf"
+            )
+        except FileNotFoundError:
+            continue
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="PDF缓存空间不足，请稍后重试"
+    )
@@ -1,10 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Request, Depends, HTTPException, Query, status
 from typing import Optional, List
 from datetime import datetime
 from bson import ObjectId
 import os
-import aiofiles
 
 import sys
 import os as os_module
@@ -12,7 +10,10 @@ backend_root = os_module.path.dirname(os_module.path.dirname(os_module.path.absp
 sys.path.insert(0, backend_root)
 
 from utils.database import Database
+from utils.upload import StreamedUpload, receive_upload
+from utils.ranges import content_disposition, range_file_response
 from app.auth import get_current_user
+from app.analysis_jobs import enqueue_analysis, format_analysis_job, KEYPOINT_COLLECTION, KEYPOINT_CHUNK_FRAMES
 
 router = APIRouter(prefix="/api/video", tags=["视频"])
 UPLOAD_DIR = os.path.join(os_module.path.dirname(os_module.path.dirname(os_module.path.dirname(backend_root))), "data", "videos")
@@ -21,58 +22,79 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # 允许的视频格式
 ALLOWED_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+ALLOWED_ANGLES = ["front", "side", "back"]
 
 
-@router.post("/upload")
+# 上传接口直接读取请求流，在 OpenAPI 中声明 multipart 请求体以便文档与客户端生成
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "file": {
+                        "type": "string",
+                        "format": "binary",
+                        "description": f"视频文件（{', '.join(sorted(ALLOWED_EXTENSIONS))}，最大{MAX_FILE_SIZE // 1024 // 1024}MB）"
+                    }
+                },
+                "required": ["file"]
+            }
+        }
+    }
+}
+
+
+@router.post("/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 async def upload_video(
-    file: UploadFile = File(...),
+    request: Request,
     angle: str = "front",  # front, side, back
     current_user: dict = Depends(get_current_user)
 ):
-    """上传视频文件"""
-    # 检查文件扩展名
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"不支持的文件格式。支持的格式：{', '.join(ALLOWED_EXTENSIONS)}"
-        )
+    """上传视频文件（multipart 字段名 file）
     
+    文件按块流式写入临时文件并计算 SHA-256，超过大小限制时立即中止，
+    完成后原子移动到上传目录。
+    """
     # 检查角度
-    if angle not in ["front", "side", "back"]:
+    if angle not in ALLOWED_ANGLES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="角度必须是 front、side 或 back"
         )
     
-    # 读取文件内容
-    content = await file.read()
-    
-    # 检查文件大小
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"文件大小超过限制（最大{MAX_FILE_SIZE // 1024 // 1024}MB）"
-        )
+    # 流式接收文件（同时检查扩展名和大小）
+    upload = await receive_upload(request, UPLOAD_DIR, MAX_FILE_SIZE, "file", ALLOWED_EXTENSIONS)
     
+    try:
+        return await register_video(current_user["id"], angle, upload)
+    except Exception:
+        upload.discard()
+        raise
+
+
+async def register_video(user_id: str, angle: str, upload: StreamedUpload) -> dict:
+    """将已接收的上传文件移动到上传目录并写入 videos 记录"""
     # 生成文件名
+    file_ext = os.path.splitext(upload.filename)[1].lower()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{current_user['id']}_{angle}_{timestamp}{file_ext}"
+    filename = f"{user_id}_{angle}_{timestamp}_{upload.sha256[:8]}{file_ext}"
     filepath = os.path.join(UPLOAD_DIR, filename)
     
     # 保存文件
-    async with aiofiles.open(filepath, 'wb') as f:
-        await f.write(content)
+    upload.commit(filepath)
     
     # 保存视频信息到数据库
     collection = Database.get_collection("videos")
     video_data = {
-        "user_id": current_user["id"],
+        "user_id": user_id,
         "filename": filename,
         "filepath": filepath,
         "angle": angle,
-        "original_filename": file.filename,
-        "file_size": len(content),
+        "original_filename": upload.filename,
+        "file_size": upload.size,
+        "sha256": upload.sha256,
         "uploaded_at": datetime.now(),
         "analysis_status": "pending",  # pending, processing, completed, failed
         "analysis_result": None
@@ -86,7 +108,8 @@ async def upload_video(
         "video_id": video_data["id"],
         "filename": filename,
         "angle": angle,
-        "file_size": len(content)
+        "file_size": upload.size,
+        "sha256": upload.sha256
     }
 
 
@@ -102,7 +125,8 @@ async def list_videos(
     if angle:
         query["angle"] = angle
     
-    cursor = collection.find(query).sort("uploaded_at", -1)
+    # 逐帧关键点数据量大，列表中不返回（通过 /{video_id}/keypoints 分页获取）
+    cursor = collection.find(query, {"analysis_result.key_points": 0}).sort("uploaded_at", -1)
     videos = await cursor.to_list(length=100)
     
     result = []
@@ -117,23 +141,33 @@ async def list_videos(
             "file_size": video.get("file_size"),
             "uploaded_at": video["uploaded_at"].isoformat() if isinstance(video["uploaded_at"], datetime) else str(video["uploaded_at"]),
             "analysis_status": video.get("analysis_status", "pending"),
+            "analysis_progress": video.get("analysis_progress", 0),
             "analysis_result": video.get("analysis_result")
         })
     
     return {"videos": result}
 
 
+# HEAD 与 GET 共用处理函数；HEAD 不单独出现在 OpenAPI 中，避免重复的 operationId
+@router.head("/{video_id}/preview", include_in_schema=False)
 @router.get("/{video_id}/preview")
 async def preview_video(
     video_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """预览视频"""
+    """预览视频（支持 Range 拖动播放与 ETag / Last-Modified 缓存校验）"""
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的视频ID"
+        )
+    
     collection = Database.get_collection("videos")
-    video = await collection.find_one({
-        "_id": ObjectId(video_id),
-        "user_id": current_user["id"]
-    })
+    video = await collection.find_one(
+        {"_id": ObjectId(video_id), "user_id": current_user["id"]},
+        {"filepath": 1, "original_filename": 1}
+    )
     
     if not video:
         raise HTTPException(
@@ -142,41 +176,36 @@ async def preview_video(
         )
     
     filepath = video.get("filepath")
-    if not os.path.exists(filepath):
+    if not filepath or not os.path.exists(filepath):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="视频文件不存在"
         )
     
-    # 返回视频文件流
-    async def generate():
-        async with aiofiles.open(filepath, 'rb') as f:
-            while True:
-                chunk = await f.read(8192)
-                if not chunk:
-                    break
-                yield chunk
-    
-    return StreamingResponse(
-        generate(),
-        media_type="video/mp4",
-        headers={
-            "Content-Disposition": f'inline; filename="{video.get("original_filename", "video.mp4")}"'
-        }
+    return range_file_response(
+        request,
+        filepath,
+        content_disposition=content_disposition("inline", video.get("original_filename") or os.path.basename(filepath))
     )
 
 
-@router.post("/{video_id}/analyze")
+@router.post("/{video_id}/analyze", status_code=status.HTTP_202_ACCEPTED)
 async def analyze_video(
     video_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """分析视频姿势（占位符，实际需要集成MediaPipe或TensorFlow）"""
+    """提交视频姿势分析任务（后台进程执行，通过 /api/video/analysis/{job_id} 查询进度）"""
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的视频ID"
+        )
+    
     collection = Database.get_collection("videos")
-    video = await collection.find_one({
-        "_id": ObjectId(video_id),
-        "user_id": current_user["id"]
-    })
+    video = await collection.find_one(
+        {"_id": ObjectId(video_id), "user_id": current_user["id"]},
+        {"user_id": 1, "filepath": 1, "angle": 1}
+    )
     
     if not video:
         raise HTTPException(
@@ -184,43 +213,66 @@ async def analyze_video(
             detail="视频不存在"
         )
     
-    # 更新分析状态
-    await collection.update_one(
-        {"_id": ObjectId(video_id)},
-        {"$set": {
-            "analysis_status": "processing",
-            "updated_at": datetime.now()
-        }}
-    )
+    job = await enqueue_analysis(video)
     
-    # TODO: 这里应该集成MediaPipe或TensorFlow进行姿势分析
-    # 目前返回模拟结果
-    analysis_result = {
-        "score": 85,
-        "knee_alignment": "good",
-        "foot_strike": "midfoot",
-        "arm_swing": "optimal",
-        "posture": "upright",
-        "suggestions": [
-            "保持当前姿势",
-            "注意保持身体直立",
-            "适当增加步频"
-        ],
-        "key_points": []  # 关键点坐标
+    return {
+        "message": "视频分析任务已提交",
+        "job": format_analysis_job(job)
     }
+
+
+@router.get("/{video_id}/keypoints")
+async def get_video_keypoints(
+    video_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(KEYPOINT_CHUNK_FRAMES, ge=1, le=10 * KEYPOINT_CHUNK_FRAMES),
+    current_user: dict = Depends(get_current_user)
+):
+    """分页获取最近一次分析的逐帧关键点（offset / limit 按取样帧计数）"""
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的视频ID"
+        )
     
-    # 更新分析结果
-    await collection.update_one(
-        {"_id": ObjectId(video_id)},
-        {"$set": {
-            "analysis_status": "completed",
-            "analysis_result": analysis_result,
-            "updated_at": datetime.now()
-        }}
+    collection = Database.get_collection("videos")
+    video = await collection.find_one(
+        {"_id": ObjectId(video_id), "user_id": current_user["id"]},
+        {"analysis_result.key_points": 1, "analysis_result.keypoint_names": 1}
     )
     
+    if not video:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="视频不存在"
+        )
+    
+    reference = (video.get("analysis_result") or {}).get("key_points")
+    if not isinstance(reference, dict):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="该视频暂无关键点数据"
+        )
+    
+    # 只读取与 [offset, offset + limit) 相交的块
+    chunks = Database.get_collection(KEYPOINT_COLLECTION).find(
+        {
+            "video_id": video["_id"],
+            "job_id": reference["job_id"],
+            "start": {"$gt": offset - KEYPOINT_CHUNK_FRAMES, "$lt": offset + limit}
+        },
+        {"_id": 0, "start": 1, "frames": 1, "times": 1, "points": 1}
+    ).sort("start", 1)
+    
+    frames = []
+    async for chunk in chunks:
+        for position, (frame, time, points) in enumerate(zip(chunk["frames"], chunk["times"], chunk["points"]), chunk["start"]):
+            if offset <= position < offset + limit:
+                frames.append({"frame": frame, "time": time, "points": points})
+    
     return {
-        "message": "视频分析完成",
-        "analysis_result": analysis_result
+        "keypoint_names": video["analysis_result"].get("keypoint_names"),
+        "total": reference["count"],
+        "offset": offset,
+        "frames": frames
     }
-
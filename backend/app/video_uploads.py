@@ -0,0 +1,330 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from starlette.requests import ClientDisconnect
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from typing import Optional
+import asyncio
+import time
+import uuid
+import aiofiles
+
+import sys
+import os
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
+
+from models.video import UploadSessionCreate
+from utils.database import Database
+from utils.upload import StreamedUpload, file_sha256
+from app.auth import get_current_user
+from app.video import UPLOAD_DIR, ALLOWED_EXTENSIONS, ALLOWED_ANGLES, MAX_FILE_SIZE, register_video
+
+router = APIRouter(prefix="/api/video/uploads", tags=["视频"])
+
+SESSION_COLLECTION = "upload_sessions"
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))  # 会话无写入后的保留时间（秒）
+UPLOAD_SESSION_CLEANUP_INTERVAL = int(os.getenv("UPLOAD_SESSION_CLEANUP_INTERVAL", 600))
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024  # 建议的客户端分块大小
+UPLOAD_WRITE_LEASE = int(os.getenv("UPLOAD_WRITE_LEASE", 60))  # 写锁租约（秒），写入期间每 1/3 租约续期一次
+
+_cleanup_task = None
+
+
+def _session_path(session_id) -> str:
+    return os.path.join(UPLOAD_DIR, f".{session_id}.upload")
+
+
+def _offset_headers(session: dict) -> dict:
+    return {
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["size"]),
+        "Cache-Control": "no-store",
+    }
+
+
+def _session_gone() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_410_GONE, detail="上传会话已取消或已过期")
+
+
+async def _renew_write_lock(session_id, lock_token: str, lost: asyncio.Event):
+    """写入期间续期写锁；锁被接管或会话被删除时设置 lost"""
+    collection = Database.get_collection(SESSION_COLLECTION)
+    while True:
+        await asyncio.sleep(UPLOAD_WRITE_LEASE / 3)
+        result = await collection.update_one(
+            {"_id": session_id, "lock_token": lock_token},
+            {"$set": {"lock_until": datetime.now() + timedelta(seconds=UPLOAD_WRITE_LEASE)}}
+        )
+        if not result.matched_count:
+            lost.set()
+            return
+
+
+def _format_session(session: dict) -> dict:
+    return {
+        "upload_id": str(session["_id"]),
+        "filename": session["filename"],
+        "angle": session["angle"],
+        "size": session["size"],
+        "offset": session["offset"],
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "expires_at": session["expires_at"].isoformat(),
+    }
+
+
+async def _get_user_session(upload_id: str, user_id: str) -> dict:
+    if not ObjectId.is_valid(upload_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的上传ID")
+    collection = Database.get_collection(SESSION_COLLECTION)
+    session = await collection.find_one({"_id": ObjectId(upload_id), "user_id": user_id})
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传会话不存在或已过期")
+    return session
+
+
+def _remove_file(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def cleanup_expired_sessions() -> int:
+    """删除过期的上传会话及其临时文件，以及中断遗留的临时文件，返回删除的会话数量"""
+    collection = Database.get_collection(SESSION_COLLECTION)
+    count = 0
+    async for session in collection.find({"expires_at": {"$lt": datetime.now()}}, {"_id": 1}):
+        _remove_file(_session_path(session["_id"]))
+        await collection.delete_one({"_id": session["_id"]})
+        count += 1
+
+    # 进程中断时 receive_upload 未能清理的 .part 文件
+    deadline = time.time() - UPLOAD_SESSION_TTL
+    with os.scandir(UPLOAD_DIR) as it:
+        for entry in it:
+            if entry.name.startswith(".") and entry.name.endswith(".part") and entry.stat().st_mtime < deadline:
+                _remove_file(entry.path)
+    return count
+
+
+async def _cleanup_loop():
+    while True:
+        try:
+            await cleanup_expired_sessions()
+        except Exception as e:
+            print(f"⚠️ 清理上传会话失败: {e}")
+        await asyncio.sleep(UPLOAD_SESSION_CLEANUP_INTERVAL)
+
+
+async def start_upload_sessions():
+    """启动上传会话的定期清理"""
+    global _cleanup_task
+    _cleanup_task = asyncio.create_task(_cleanup_loop())
+
+
+async def stop_upload_sessions():
+    """停止定期清理"""
+    if _cleanup_task:
+        _cleanup_task.cancel()
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    session_data: UploadSessionCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """创建断点续传上传会话"""
+    file_ext = os.path.splitext(session_data.filename)[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件格式。支持的格式：{', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    if session_data.angle not in ALLOWED_ANGLES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="角度必须是 front、side 或 back"
+        )
+    if session_data.size > MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件大小超过限制（最大{MAX_FILE_SIZE // 1024 // 1024}MB）"
+        )
+
+    now = datetime.now()
+    session = {
+        "user_id": current_user["id"],
+        "filename": os.path.basename(session_data.filename),
+        "angle": session_data.angle,
+        "size": session_data.size,
+        "offset": 0,
+        "lock_until": None,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + timedelta(seconds=UPLOAD_SESSION_TTL),
+    }
+    collection = Database.get_collection(SESSION_COLLECTION)
+    result = await collection.insert_one(session)
+    session["_id"] = result.inserted_id
+
+    # 预先创建空文件，PATCH 按偏移写入
+    async with aiofiles.open(_session_path(result.inserted_id), "wb"):
+        pass
+
+    return _format_session(session)
+
+
+@router.get("/{upload_id}")
+async def get_upload_offset(
+    upload_id: str,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """查询已接收的字节数（断线后从该偏移继续上传）"""
+    session = await _get_user_session(upload_id, current_user["id"])
+    response.headers.update(_offset_headers(session))
+    return _format_session(session)
+
+
+@router.patch("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """从 offset 处写入一段数据（请求体为原始字节，偏移也可通过 Upload-Offset 头传入）
+
+    offset 必须等于已接收的字节数，否则返回 409 及当前偏移；
+    传输中断时已写入的部分仍然保留，客户端查询偏移后继续上传即可。
+    """
+    if offset is None:
+        header = request.headers.get("upload-offset", "")
+        if not header.isdigit():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="缺少上传偏移（offset 参数或 Upload-Offset 头）")
+        offset = int(header)
+    session = await _get_user_session(upload_id, current_user["id"])
+    collection = Database.get_collection(SESSION_COLLECTION)
+    now = datetime.now()
+
+    # 偏移一致且没有其他请求正在写入时获取写锁（令牌用于续期和释放时确认仍持有该锁）
+    lock_token = uuid.uuid4().hex
+    locked = await collection.find_one_and_update(
+        {
+            "_id": session["_id"],
+            "offset": offset,
+            "$or": [{"lock_until": None}, {"lock_until": {"$lt": now}}]
+        },
+        {"$set": {"lock_until": now + timedelta(seconds=UPLOAD_WRITE_LEASE), "lock_token": lock_token}}
+    )
+    if not locked:
+        current = await collection.find_one({"_id": session["_id"]})
+        if current is None:
+            raise _session_gone()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"偏移不一致或该会话正在写入，当前偏移：{current['offset']}",
+            headers=_offset_headers(current)
+        )
+
+    remaining = locked["size"] - offset
+    written = 0
+    too_large = False
+    lost = asyncio.Event()
+    renew_task = asyncio.create_task(_renew_write_lock(session["_id"], lock_token, lost))
+    try:
+        async with aiofiles.open(_session_path(session["_id"]), "r+b") as f:
+            await f.seek(offset)
+            async for chunk in request.stream():
+                if lost.is_set():
+                    break
+                if written + len(chunk) > remaining:
+                    too_large = True
+                    break
+                await f.write(chunk)
+                written += len(chunk)
+    except ClientDisconnect:
+        pass
+    finally:
+        renew_task.cancel()
+        # 无论请求是否完整，都记录实际写入的字节数并释放写锁（仅当仍持有该锁）
+        now = datetime.now()
+        locked = await collection.find_one_and_update(
+            {"_id": session["_id"], "lock_token": lock_token},
+            {
+                "$set": {
+                    "offset": offset + written,
+                    "lock_until": None,
+                    "updated_at": now,
+                    "expires_at": now + timedelta(seconds=UPLOAD_SESSION_TTL)
+                },
+                "$unset": {"lock_token": ""}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    if locked is None:
+        # 写入期间会话被取消，或写锁过期后被其他请求接管，本次写入不计入偏移
+        current = await collection.find_one({"_id": session["_id"]})
+        if current is None:
+            raise _session_gone()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"写锁已被其他请求接管，当前偏移：{current['offset']}",
+            headers=_offset_headers(current)
+        )
+
+    if too_large:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="写入的数据超过创建会话时声明的文件大小",
+            headers=_offset_headers(locked)
+        )
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_offset_headers(locked))
+
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """完成上传：校验大小、计算 SHA-256，并登记为视频（返回与直接上传相同的结果）"""
+    session = await _get_user_session(upload_id, current_user["id"])
+    if session["offset"] != session["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"上传未完成：已接收 {session['offset']} / {session['size']} 字节",
+            headers=_offset_headers(session)
+        )
+
+    # 先删除会话，避免重复完成
+    collection = Database.get_collection(SESSION_COLLECTION)
+    deleted = await collection.delete_one({"_id": session["_id"], "offset": session["size"], "lock_until": None})
+    if not deleted.deleted_count:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话正在写入或已完成")
+
+    path = _session_path(session["_id"])
+    upload = StreamedUpload(
+        filename=session["filename"],
+        temp_path=path,
+        size=session["size"],
+        sha256=await asyncio.to_thread(file_sha256, path)
+    )
+    try:
+        return await register_video(current_user["id"], session["angle"], upload)
+    except Exception:
+        upload.discard()
+        raise
+
+
+@router.delete("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """取消上传并删除已接收的数据"""
+    session = await _get_user_session(upload_id, current_user["id"])
+    collection = Database.get_collection(SESSION_COLLECTION)
+    await collection.delete_one({"_id": session["_id"]})
+    _remove_file(_session_path(session["_id"]))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
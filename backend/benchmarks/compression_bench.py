@@ -0,0 +1,110 @@
+"""响应压缩基准
+
+对 CSV、NDJSON 导出与统计接口 JSON 分别以 gzip / zstd 各压缩级别压缩，
+比较压缩耗时（CPU）与节省的字节数。导出按 EXPORT_CHUNK_SIZE 行分块逐块压缩，
+与线上流式压缩方式一致。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.compression_bench [--rows 100000] [--json]
+"""
+from datetime import datetime, timedelta
+import argparse
+import csv
+import io
+import json
+import time
+
+from benchmarks.projection_bench import make_exercise
+from utils.cache import encode_json
+from utils.compression import make_compressor
+from utils.export import EXPORT_CHUNK_SIZE, dumps_json
+from utils.export_schema import TABLE_EXPORT_SCHEMA, normalize_documents
+
+LEVELS = {
+    "gzip": [1, 6, 9],
+    "zstd": [1, 3, 9, 19],
+}
+
+
+def csv_chunks(docs: list) -> list:
+    chunks = []
+    for start in range(0, len(docs), EXPORT_CHUNK_SIZE):
+        output = io.StringIO()
+        csv.writer(output).writerows(TABLE_EXPORT_SCHEMA.format_batch(docs[start:start + EXPORT_CHUNK_SIZE]))
+        chunks.append(output.getvalue().encode("utf-8"))
+    return chunks
+
+
+def ndjson_chunks(docs: list) -> list:
+    docs = normalize_documents([dict(doc) for doc in docs])
+    return [
+        b"".join(dumps_json(doc) + b"\n" for doc in docs[start:start + EXPORT_CHUNK_SIZE])
+        for start in range(0, len(docs), EXPORT_CHUNK_SIZE)
+    ]
+
+
+def statistics_body(days: int) -> list:
+    start = datetime(2024, 1, 1)
+    stats = {
+        "totalExercises": days,
+        "dates": [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)],
+        "heartRate": [140 + i % 30 for i in range(days)],
+        "pace": [round(5 + (i % 17) / 10, 2) for i in range(days)],
+        "calories": [300 + i % 200 for i in range(days)],
+    }
+    return [encode_json(stats)]
+
+
+def measure(chunks: list, encoding: str, level: int) -> tuple:
+    """返回 (压缩后字节数, 耗时秒)"""
+    start = time.perf_counter()
+    compressor = make_compressor(encoding, level)
+    size = sum(len(compressor.compress(chunk)) for chunk in chunks) + len(compressor.finish())
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应压缩基准")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--json", action="store_true", help="输出JSON结果")
+    args = parser.parse_args()
+
+    start = datetime(2022, 1, 1)
+    docs = [make_exercise(i, start) for i in range(args.rows)]
+    payloads = {
+        "csv": csv_chunks(docs),
+        "ndjson": ndjson_chunks(docs),
+        "statistics": statistics_body(min(args.rows, 500)),
+    }
+
+    results = []
+    for payload, chunks in payloads.items():
+        raw_bytes = sum(len(chunk) for chunk in chunks)
+        for encoding, levels in LEVELS.items():
+            for level in levels:
+                size, elapsed = measure(chunks, encoding, level)
+                results.append({
+                    "payload": payload,
+                    "encoding": encoding,
+                    "level": level,
+                    "raw_bytes": raw_bytes,
+                    "compressed_bytes": size,
+                    "ratio": round(size / raw_bytes, 4),
+                    "cpu_ms": round(elapsed * 1000, 2),
+                    "mb_per_s": round(raw_bytes / elapsed / 1e6, 1),
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'数据':<12}{'编码':<6}{'级别':>4}{'原始字节':>12}{'压缩后':>12}{'比例':>8}{'耗时(ms)':>10}{'MB/s':>8}")
+    for r in results:
+        print(
+            f"{r['payload']:<12}{r['encoding']:<6}{r['level']:>4}{r['raw_bytes']:>12}"
+            f"{r['compressed_bytes']:>12}{r['ratio']:>8.1%}{r['cpu_ms']:>10.1f}{r['mb_per_s']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
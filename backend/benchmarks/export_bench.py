@@ -0,0 +1,244 @@
+"""导出吞吐基准
+
+对 CSV、JSON、PDF 导出分别以 1k / 100k / 1M 条运动数据测量：
+总耗时、首字节时间（TTFB）、输出字节数与峰值内存（RSS）。
+每个用例在独立子进程中运行，峰值内存互不影响；PDF 在渲染进程池中生成，
+其峰值内存单独记录为 children_peak_rss_kb。
+
+数据来源：
+- 默认使用内存中的模拟集合，按需逐条生成数据（不预先占用内存），
+  衡量导出器本身的开销；
+- 指定 --mongo 时写入本地 MongoDB 的基准库（MONGODB_URL，库名 --db），
+  已存在相同条数的数据时跳过写入。
+
+结果以 JSON 输出（--output 指定文件），可在不同版本间对比。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.export_bench [--rows 1000,100000,1000000] [--formats csv,json,pdf]
+        [--pdf-max-rows 100000] [--mongo] [--output results.json]
+"""
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+from queue import Empty
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.projection_bench import make_exercise, apply_projection
+
+BENCH_USER = "bench_user"
+START = datetime(2015, 1, 1)
+SEED_BATCH_SIZE = 10000
+
+
+class _MemoryCursor:
+    """模拟 Motor 游标：按时间倒序逐条生成文档"""
+
+    def __init__(self, rows: int, fields):
+        self._rows = rows
+        self._fields = fields
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def batch_size(self, size: int):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for index in range(self._rows - 1, -1, -1):
+            doc = make_exercise(index, START)
+            doc["userId"] = BENCH_USER
+            yield apply_projection(doc, list(self._fields)) if self._fields else doc
+            if index % 1000 == 0:
+                # 与真实游标一样按批让出事件循环
+                await asyncio.sleep(0)
+
+
+class _MemoryCollection:
+    """只实现导出所需的 find / find_one"""
+
+    def __init__(self, rows: int):
+        self._rows = rows
+
+    def find(self, query=None, fields=None):
+        return _MemoryCursor(self._rows, fields)
+
+    async def find_one(self, query=None, fields=None, sort=None):
+        if not self._rows:
+            return None
+        doc = make_exercise(self._rows - 1, START)
+        return {"_id": doc["_id"], "timestamp": doc["timestamp"]}
+
+
+class _MemoryDatabase:
+    def __init__(self, rows: int):
+        self._collection = _MemoryCollection(rows)
+
+    def __getitem__(self, name: str):
+        return self._collection
+
+
+async def _seed_mongo(rows: int):
+    """确保基准库中该用户恰好有 rows 条数据"""
+    from utils.database import Database
+    from utils.exercise_storage import EXERCISE_COLLECTION
+
+    await Database.connect()
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    user_id = f"{BENCH_USER}_{rows}"
+    if await collection.count_documents({"userId": user_id}) == rows:
+        return user_id
+    await collection.delete_many({"userId": user_id})
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        batch = []
+        for index in range(start, min(start + SEED_BATCH_SIZE, rows)):
+            doc = make_exercise(index, START)
+            doc["userId"] = user_id
+            batch.append(doc)
+        await collection.insert_many(batch, ordered=False)
+    return user_id
+
+
+async def _measure(format: str, rows: int, use_mongo: bool) -> dict:
+    from utils.database import Database
+    from utils.export import shutdown_pdf_executor
+    from app.export import resolve_export_range, build_csv_export, build_json_export, build_pdf_export
+
+    if use_mongo:
+        user_id = await _seed_mongo(rows)
+    else:
+        Database.database = _MemoryDatabase(rows)
+        user_id = BENCH_USER
+
+    builders = {
+        "csv": lambda query: build_csv_export(query),
+        "json": lambda query: build_json_export(query, "json"),
+        "ndjson": lambda query: build_json_export(query, "ndjson"),
+        "pdf": lambda query: build_pdf_export(query),
+    }
+
+    start = time.perf_counter()
+    query, _ = await resolve_export_range(user_id)
+    response = await builders[format](query)
+    ttfb = None
+    total_bytes = 0
+    chunks = 0
+    async for chunk in response.body_iterator:
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        total_bytes += len(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        chunks += 1
+    wall = time.perf_counter() - start
+
+    # 等待渲染进程退出，使其内存计入 RUSAGE_CHILDREN
+    shutdown_pdf_executor(wait=True)
+    if use_mongo:
+        await Database.disconnect()
+
+    return {
+        "wall_s": round(wall, 4),
+        "ttfb_s": round(ttfb, 4) if ttfb is not None else None,
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "rows_per_s": round(rows / wall, 1) if wall else None,
+    }
+
+
+def _run_case(format: str, rows: int, use_mongo: bool, queue):
+    try:
+        result = asyncio.run(_measure(format, rows, use_mongo))
+        # Linux 下 ru_maxrss 单位为 KB
+        result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["children_peak_rss_kb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_case(format: str, rows: int, use_mongo: bool) -> dict:
+    """在独立子进程中运行一个用例"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(format, rows, use_mongo, queue))
+    process.start()
+    # 子进程异常退出（如内存不足被杀死）时不会写入结果，轮询以免永久阻塞
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except Empty:
+            if process.is_alive():
+                continue
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                process.join()
+                result = {"error": f"exitcode {process.exitcode}"}
+            break
+    process.join()
+    return {"format": format, "rows": rows, **result}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出吞吐基准")
+    parser.add_argument("--rows", default="1000,100000,1000000", help="逗号分隔的数据条数")
+    parser.add_argument("--formats", default="csv,json,pdf", help="逗号分隔的导出格式（csv、json、ndjson、pdf）")
+    parser.add_argument("--pdf-max-rows", type=int, default=100000, help="超过该条数时跳过PDF用例")
+    parser.add_argument("--mongo", action="store_true", help="使用本地MongoDB而非内存模拟集合")
+    parser.add_argument("--db", default="running_analysis_bench", help="--mongo 时使用的数据库名")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    if args.mongo:
+        # 子进程继承环境变量，Database.connect 据此连接基准库
+        os.environ["MONGODB_DB_NAME"] = args.db
+
+    sizes = [int(value) for value in args.rows.split(",") if value.strip()]
+    formats = [value.strip() for value in args.formats.split(",") if value.strip()]
+
+    results = []
+    for rows in sizes:
+        for format in formats:
+            if format == "pdf" and rows > args.pdf_max_rows:
+                results.append({"format": format, "rows": rows, "skipped": f"超过 --pdf-max-rows={args.pdf_max_rows}"})
+                continue
+            result = run_case(format, rows, args.mongo)
+            results.append(result)
+            print(f"{format:<8}{rows:>10} {json.dumps(result, ensure_ascii=False)}", file=sys.stderr)
+
+    report = {
+        "benchmark": "export",
+        "created_at": datetime.now().isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "source": "mongo" if args.mongo else "memory",
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
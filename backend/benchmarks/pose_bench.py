@@ -0,0 +1,58 @@
+"""姿态估计吞吐基准
+
+对同一段视频按不同抽帧间隔与批量大小运行解码 + 推理流水线，报告解码、推理与整体吞吐（帧/秒），
+用于评估分析工作进程（ANALYSIS_WORKERS）与 CPU 核数、POSE_THREADS 的配置。
+模型按 POSE_BACKEND / POSE_MODEL_PATH 加载。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.pose_bench VIDEO [--strides 1,2,4] [--batch-sizes 1,8,16] [--output results.json]
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import sys
+
+from utils.pose_analysis import estimate_poses
+from utils.pose_models import load_pose_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="姿态估计吞吐基准")
+    parser.add_argument("video", help="视频文件")
+    parser.add_argument("--strides", default="1,2,4", help="逗号分隔的抽帧间隔")
+    parser.add_argument("--batch-sizes", default="1,8,16", help="逗号分隔的批量大小")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    model = load_pose_model()
+    # 预热：首次推理包含图优化与内存分配
+    estimate_poses(args.video, model, stride=max(int(value) for value in args.strides.split(",")), batch_size=1)
+
+    results = []
+    for stride in [int(value) for value in args.strides.split(",") if value.strip()]:
+        for batch_size in [int(value) for value in args.batch_sizes.split(",") if value.strip()]:
+            _, _, video, performance = estimate_poses(args.video, model, stride=stride, batch_size=batch_size)
+            results.append(performance)
+            print(json.dumps(performance, ensure_ascii=False), file=sys.stderr)
+
+    report = {
+        "benchmark": "pose",
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "video": {"path": os.path.basename(args.video), **video},
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
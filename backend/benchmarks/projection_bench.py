@@ -0,0 +1,90 @@
+"""字段投影基准
+
+对比读取完整运动数据文档与按 utils.projections 投影后的文档：
+BSON 传输字节数与编码/解码耗时。
+
+仅在进程内对模拟文档做 BSON 编解码，不连接 MongoDB，因此不包含服务端执行投影、
+网络传输与游标往返的耗时；实际查询耗时请使用 benchmarks.export_bench --mongo。
+
+运行（在 backend 目录下）：
+    python -m benchmarks.projection_bench [--rows 100000]
+"""
+from datetime import datetime, timedelta
+import argparse
+import random
+import time
+
+import bson
+from bson import ObjectId
+
+from utils.projections import EXERCISE_READS
+
+
+def make_exercise(index: int, start: datetime) -> dict:
+    """生成一条与线上结构一致的运动数据"""
+    return {
+        "_id": ObjectId(),
+        "userId": "user001",
+        "timestamp": start + timedelta(hours=index),
+        "basicInfo": {
+            "gender": "male", "age": 28, "height": 175.0, "weight": 70.0,
+            "bodyFat": 15.0, "muscleMass": 32.5, "waterContent": 55.0
+        },
+        "bandData": {
+            "heartRate": random.randint(110, 180), "pace": round(random.uniform(4, 7), 2),
+            "trainingLoad": random.randint(30, 120), "calories": random.randint(150, 700),
+            "sleep": {"duration": 7.5, "deepSleep": 1.8, "lightSleep": 4.2, "remSleep": 1.5}
+        },
+        "treadmillData": {
+            "speed": round(random.uniform(8, 14), 1), "incline": 1.0,
+            "duration": random.randint(20, 90), "distance": round(random.uniform(3, 15), 2)
+        }
+    }
+
+
+def apply_projection(doc: dict, fields: list) -> dict:
+    """在本地模拟服务端投影"""
+    result = {"_id": doc["_id"]}
+    for field in fields:
+        source, target = doc, result
+        parts = field.split(".")
+        for part in parts[:-1]:
+            source = source.get(part) or {}
+            target = target.setdefault(part, {})
+        if parts[-1] in source:
+            target[parts[-1]] = source[parts[-1]]
+    return result
+
+
+def measure(encoded: list) -> float:
+    start = time.perf_counter()
+    for raw in encoded:
+        bson.decode(raw)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字段投影基准")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    start = datetime(2022, 1, 1)
+    docs = [make_exercise(i, start) for i in range(args.rows)]
+    full = [bson.encode(doc) for doc in docs]
+    full_bytes = sum(len(raw) for raw in full)
+    full_time = measure(full)
+
+    print(f"{'读取路径':<12}{'字节数':>14}{'节省':>8}{'解码耗时(ms)':>14}{'节省':>8}")
+    print(f"{'full':<12}{full_bytes:>14}{'-':>8}{full_time * 1000:>14.1f}{'-':>8}")
+    for name, fields in EXERCISE_READS.items():
+        projected = [bson.encode(apply_projection(doc, fields)) for doc in docs]
+        projected_bytes = sum(len(raw) for raw in projected)
+        projected_time = measure(projected)
+        print(
+            f"{name:<12}{projected_bytes:>14}{1 - projected_bytes / full_bytes:>8.0%}"
+            f"{projected_time * 1000:>14.1f}{1 - projected_time / full_time:>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class ExportJobCreate(BaseModel):
+    """创建导出任务模型"""
+    format: str = Field(default="csv", description="导出格式：csv、json、ndjson、pdf、parquet、arrow")
+    pretty: bool = Field(default=False, description="JSON是否缩进输出")
+    columns: Optional[str] = Field(default=None, description="Parquet/Arrow导出的列，逗号分隔")
+    since: Optional[datetime] = Field(default=None, description="导出起始时间（含）")
+    until: Optional[datetime] = Field(default=None, description="导出截止时间（不含）")
+    after_cursor: Optional[str] = Field(default=None, description="上次导出返回的水位线，仅导出之后写入的记录")
@@ -0,0 +1,8 @@
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    """创建断点续传上传会话模型"""
+    filename: str = Field(..., description="原始文件名（用于检查扩展名）")
+    size: int = Field(..., gt=0, description="文件总字节数")
+    angle: str = Field(default="front", description="拍摄角度：front、side、back")
@@ -0,0 +1,6 @@
+import sys
+import os
+
+# 与应用模块一致，以 backend 目录为导入根（from utils... / from app...）
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_root)
@@ -0,0 +1,80 @@
+import numpy as np
+
+from utils.analytics import (
+    ExerciseArrays, ewma, heart_rate_zones, pace_trend, training_load, weekly_volume,
+)
+
+
+def make_arrays(day, heart_rate=None, pace=None, training_load=None, duration=None, distance=None, max_heart_rate=200):
+    n = len(day)
+
+    def column(values):
+        return np.array(values if values is not None else [np.nan] * n, dtype=np.float64)
+
+    return ExerciseArrays(
+        day=np.array(day, dtype=np.int64),
+        heart_rate=column(heart_rate),
+        pace=column(pace),
+        training_load=column(training_load),
+        duration=column(duration),
+        distance=column(distance),
+        max_heart_rate=max_heart_rate,
+    )
+
+
+def test_ewma_matches_recurrence():
+    values = np.random.default_rng(0).uniform(0, 200, 1000)
+    expected = []
+    previous = 0.0
+    for value in values:
+        previous = previous + (value - previous) / 42
+        expected.append(previous)
+    np.testing.assert_allclose(ewma(values, 42, block=128), expected, rtol=1e-9)
+
+
+def test_training_load_current_matches_series():
+    arrays = make_arrays([0, 1, 3], training_load=[100, 50, 80])
+    result = training_load(arrays)
+    assert result["dates"] == ["1970-01-01", "1970-01-02", "1970-01-03", "1970-01-04"]
+    assert result["load"] == [100.0, 50.0, 0.0, 80.0]
+    # TSB 为前一天的 CTL - ATL
+    assert result["tsb"][0] == 0.0
+    assert result["tsb"][1] == round(result["ctl"][0] - result["atl"][0], 1)
+    assert result["current"] == {"atl": result["atl"][-1], "ctl": result["ctl"][-1], "tsb": result["tsb"][-1]}
+
+
+def test_training_load_estimates_missing_load():
+    arrays = make_arrays([0], heart_rate=[150], duration=[40], max_heart_rate=200)
+    assert training_load(arrays)["load"] == [30.0]
+    assert training_load(make_arrays([]))["current"] is None
+
+
+def test_heart_rate_zones_bounds():
+    # 90 低于 Z1 下限比例 0.5 → 计入 Z1；210 超过最大心率 → 计入 Z5；负值不计入
+    arrays = make_arrays(
+        [0, 0, 0, 0, 0],
+        heart_rate=[90, 130, 170, 210, -5],
+        duration=[10, 20, np.nan, 5, 30],
+        max_heart_rate=200,
+    )
+    zones = heart_rate_zones(arrays)["zones"]
+    assert [zone["minutes"] for zone in zones] == [10.0, 20.0, 0.0, 1.0, 5.0]
+    assert zones[0]["range"] == [0, 120]
+    assert round(sum(zone["percent"] for zone in zones)) == 100
+
+
+def test_weekly_volume_starts_on_monday():
+    # 1970-01-05 为周一（第 4 天）
+    arrays = make_arrays([3, 4, 10, 11], distance=[1, 2, 3, np.nan], duration=[10, 20, 30, 40])
+    weeks = weekly_volume(arrays)["weeks"]
+    assert [week["week_start"] for week in weeks] == ["1969-12-29", "1970-01-05", "1970-01-12"]
+    assert [week["sessions"] for week in weeks] == [1, 2, 1]
+    assert [week["distance"] for week in weeks] == [1.0, 5.0, 0.0]
+
+
+def test_pace_trend_slope():
+    arrays = make_arrays([0, 7, 14], pace=[6.0, 5.9, 5.8])
+    trend = pace_trend(arrays, window=2)
+    assert trend["slope_per_week"] == -0.1
+    assert trend["improving"] is True
+    assert trend["rolling"] == [None, 5.95, 5.85]
@@ -0,0 +1,107 @@
+import gzip
+
+from starlette.requests import Request
+
+from utils import cache as cache_module
+from utils.cache import ResponseCache, cached_response, make_etag, request_key
+
+
+def make_request(path="/api/statistics", query=b"", headers=None):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    return Request(scope)
+
+
+def test_request_key_ignores_query_order():
+    assert request_key(make_request(query=b"a=1&b=2")) == request_key(make_request(query=b"b=2&a=1"))
+    assert request_key(make_request(query=b"a=1")) != request_key(make_request(query=b"a=2"))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.set("u", ("a",), b"a")
+    cache.set("u", ("b",), b"b")
+    assert cache.get("u", ("a",)) is not None
+    cache.set("u", ("c",), b"c")
+    assert cache.get("u", ("b",)) is None
+    assert cache.get("u", ("a",)).body == b"a"
+    assert cache.get("u", ("c",)).body == b"c"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=10, ttl=5)
+    cache.set("u", ("a",), b"a")
+    now[0] += 4
+    assert cache.get("u", ("a",)) is not None
+    now[0] += 2
+    assert cache.get("u", ("a",)) is None
+
+
+def test_invalidate_drops_user_and_shared_entries_only():
+    cache = ResponseCache()
+    cache.set("u1", ("a",), b"1")
+    cache.set("u2", ("a",), b"2")
+    cache.set(None, ("a",), b"all")
+    cache.invalidate("u1")
+    assert cache.get("u1", ("a",)) is None
+    assert cache.get(None, ("a",)) is None
+    assert cache.get("u2", ("a",)).body == b"2"
+
+
+def test_set_skips_store_when_invalidated_during_read():
+    cache = ResponseCache()
+    generation = cache.generation("u")
+    shared_generation = cache.generation(None)
+    # 读取数据库期间发生写入
+    cache.invalidate("u")
+    entry = cache.set("u", ("a",), b"stale", generation=generation)
+    assert entry.body == b"stale"
+    assert cache.get("u", ("a",)) is None
+    # 其他用户的写入同样使不区分用户的汇总缓存失效
+    cache.invalidate("other")
+    cache.set(None, ("a",), b"stale", generation=shared_generation)
+    assert cache.get(None, ("a",)) is None
+
+    cache.set("u", ("a",), b"fresh", generation=cache.generation("u"))
+    assert cache.get("u", ("a",)).body == b"fresh"
+
+
+def test_unrelated_invalidation_keeps_generation():
+    cache = ResponseCache()
+    generation = cache.generation("u")
+    cache.invalidate("other")
+    cache.set("u", ("a",), b"ok", generation=generation)
+    assert cache.get("u", ("a",)).body == b"ok"
+
+
+def test_cached_response_etag_and_304():
+    cache = ResponseCache()
+    entry = cache.set("u", ("a",), b'{"x":1}', {"X-Next-Cursor": "c"})
+    response = cached_response(make_request(), entry)
+    assert response.status_code == 200
+    assert response.headers["etag"] == make_etag(b'{"x":1}')
+    assert response.headers["x-next-cursor"] == "c"
+
+    response = cached_response(make_request(headers={"If-None-Match": f'"other", {entry.etag}'}), entry)
+    assert response.status_code == 304
+    assert response.body == b""
+
+
+def test_cached_response_compresses_large_bodies():
+    body = b'{"data":"' + b"x" * (cache_module.COMPRESSION_MIN_SIZE * 2) + b'"}'
+    entry = ResponseCache().set("u", ("a",), body)
+    response = cached_response(make_request(headers={"Accept-Encoding": "gzip"}), entry)
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(response.body) == body
+    assert response.headers["etag"] != entry.etag
+    # 压缩变体的 ETag 同样可用于条件请求
+    etag = response.headers["etag"]
+    response = cached_response(make_request(headers={"Accept-Encoding": "gzip", "If-None-Match": etag}), entry)
+    assert response.status_code == 304
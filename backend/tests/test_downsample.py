@@ -0,0 +1,56 @@
+import math
+
+from utils.downsample import downsample_statistics, lttb_indices
+
+
+def test_lttb_returns_all_points_under_threshold():
+    assert lttb_indices([1.0, None, 3.0], 5) == [0, 2]
+    assert lttb_indices([1.0, 2.0, 3.0], 0) == [0, 1, 2]
+    assert lttb_indices([1.0, 2.0, 3.0, 4.0], 2) == [0, 3]
+    assert lttb_indices([1.0, 2.0, 3.0, 4.0], 1) == [0]
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    values = [math.sin(i / 10) for i in range(1000)]
+    values[500] = 10.0
+    values[700] = -10.0
+    indices = lttb_indices(values, 50)
+    assert len(indices) == 50
+    assert indices == sorted(set(indices))
+    assert indices[0] == 0 and indices[-1] == 999
+    assert 500 in indices and 700 in indices
+
+
+def test_lttb_skips_missing_values():
+    values = [None if i % 3 == 0 else float(i % 7) for i in range(300)]
+    indices = lttb_indices(values, 20)
+    assert len(indices) == 20
+    assert all(values[i] is not None for i in indices)
+
+
+def make_stats(days):
+    return {
+        "heartRate": {"avg": 0, "max": 0, "min": 0, "data": [float(100 + i % 13) for i in range(days)]},
+        "pace": {"avg": 0, "max": 0, "min": 0, "data": [None if i % 5 == 0 else float(5 + i % 4) for i in range(days)]},
+        "calories": {"avg": 0, "max": 0, "min": 0, "data": []},
+        "dates": [f"d{i}" for i in range(days)],
+    }
+
+
+def test_downsample_statistics_keeps_series_aligned():
+    stats = make_stats(400)
+    result = downsample_statistics(stats, 60)
+    assert len(result["dates"]) <= 60
+    for name in ("heartRate", "pace"):
+        assert len(result[name]["data"]) == len(result["dates"])
+        for date, value in zip(result["dates"], result[name]["data"]):
+            assert stats[name]["data"][int(date[1:])] == value
+    assert result["calories"] == stats["calories"]
+    # 原结果不被修改
+    assert len(stats["dates"]) == 400
+
+
+def test_downsample_statistics_noop():
+    stats = make_stats(30)
+    assert downsample_statistics(stats, 60) is stats
+    assert downsample_statistics(make_stats(400), 0)["dates"] == make_stats(400)["dates"]
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import export
+from utils.pagination import decode_cursor, encode_cursor
+
+
+class FakeExercises:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def get_collection(self, name):
+        return self
+
+    async def find_one(self, query, fields, sort):
+        self.queries.append(query)
+        return self.results.pop(0) if self.results else None
+
+
+def lag_bound(query):
+    bounds = [c["timestamp"]["$lte"] for c in query["$and"] if "$lte" in c.get("timestamp", {})]
+    return bounds[0] if bounds else None
+
+
+def until(doc):
+    return {"$or": [
+        {"timestamp": None},
+        {"timestamp": {"$lt": doc["timestamp"]}},
+        {"timestamp": doc["timestamp"], "_id": {"$lte": doc["_id"]}},
+    ]}
+
+
+def test_full_export_keeps_recent_records(monkeypatch):
+    settled = {"_id": ObjectId(), "timestamp": datetime(2024, 1, 1, 12)}
+    latest = {"_id": ObjectId(), "timestamp": datetime(2024, 1, 1, 12, 5)}
+    fake = FakeExercises(settled, latest)
+    monkeypatch.setattr(export, "Database", fake)
+    monkeypatch.setattr(export, "EXPORT_WATERMARK_LAG", 60)
+
+    before = datetime.now()
+    query, watermark = asyncio.run(export.resolve_export_range("u"))
+    bound = lag_bound(fake.queries[0])
+    assert before - timedelta(seconds=61) < bound <= datetime.now() - timedelta(seconds=60)
+    # 水位线滞后，导出范围截止到当前最新的记录，且不受滞后条件限制
+    assert watermark == encode_cursor(settled["timestamp"], settled["_id"])
+    assert until(latest) in query["$and"]
+    assert lag_bound(query) is None
+
+
+def test_full_export_without_timestamps(monkeypatch):
+    fake = FakeExercises(None, {"_id": ObjectId()})
+    monkeypatch.setattr(export, "Database", fake)
+
+    query, watermark = asyncio.run(export.resolve_export_range("u"))
+    assert watermark is None
+    assert query == {"$and": [{"userId": "u"}]}
+
+
+def test_incremental_export_stops_at_watermark(monkeypatch):
+    settled = {"_id": ObjectId(), "timestamp": datetime(2024, 1, 2, 12)}
+    fake = FakeExercises(settled)
+    monkeypatch.setattr(export, "Database", fake)
+    cursor = encode_cursor(datetime(2024, 1, 1), ObjectId())
+
+    query, watermark = asyncio.run(export.resolve_export_range("u", after_cursor=cursor))
+    assert len(fake.queries) == 1
+    assert watermark == encode_cursor(settled["timestamp"], settled["_id"])
+    assert until(settled) in query["$and"]
+    assert lag_bound(query) is not None
+
+
+def test_watermark_unchanged_without_new_records(monkeypatch):
+    fake = FakeExercises(None)
+    monkeypatch.setattr(export, "Database", fake)
+    cursor = encode_cursor(datetime(2024, 1, 1), ObjectId())
+
+    query, watermark = asyncio.run(export.resolve_export_range("u", after_cursor=cursor))
+    assert watermark == cursor
+    assert {"timestamp": {"$gte": decode_cursor(cursor)[0]}} in query["$and"]
+    assert lag_bound(query) <= datetime.now()
+
+
+def test_invalid_after_cursor(monkeypatch):
+    monkeypatch.setattr(export, "Database", FakeExercises(None))
+    with pytest.raises(ValueError):
+        asyncio.run(export.resolve_export_range("u", after_cursor="not-a-cursor"))
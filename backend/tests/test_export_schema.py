@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from utils.export_schema import (
+    COLUMNAR_EXPORT_SCHEMA, TABLE_EXPORT_SCHEMA, ExportColumn, ExportSchema, compile_column,
+    iter_batches, normalize_documents,
+)
+
+
+def test_compile_column_nested_paths():
+    extract = compile_column(ExportColumn("hr", "bandData.heartRate", default=""))
+    assert extract({"bandData": {"heartRate": 150}}) == 150
+    assert extract({"bandData": {"heartRate": 0}}) == 0
+    assert extract({"bandData": None}) == ""
+    assert extract({"bandData": [1, 2]}) == ""
+    assert extract({}) == ""
+
+
+def test_compile_column_convert_and_default():
+    extract = compile_column(ExportColumn("id", "_id", default="-", convert=str))
+    doc_id = ObjectId()
+    assert extract({"_id": doc_id}) == str(doc_id)
+    assert extract({}) == "-"
+
+
+def test_timestamp_falls_back_to_id_generation_time():
+    generated = datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone.utc)
+    doc = {"_id": ObjectId.from_datetime(generated)}
+    extract = compile_column(ExportColumn("日期", "timestamp"))
+    assert extract(doc) == datetime(2024, 5, 6, 7, 8, 9)
+    assert extract({**doc, "timestamp": datetime(2024, 1, 1)}) == datetime(2024, 1, 1)
+
+
+def test_table_schema_formats_rows():
+    doc = {
+        "_id": ObjectId(),
+        "userId": "u",
+        "timestamp": datetime(2024, 1, 2, 3, 4, 5),
+        "bandData": {"heartRate": 150, "pace": 5.5},
+        "treadmillData": {"distance": 5.0},
+    }
+    (row,) = TABLE_EXPORT_SCHEMA.format_batch([doc])
+    assert len(row) == len(TABLE_EXPORT_SCHEMA.headers)
+    assert row[:4] == ("2024-01-02 03:04:05", "u", 150, 5.5)
+    assert row[6] == 5.0
+    assert row[7] == ""
+    assert TABLE_EXPORT_SCHEMA.format_batch([]) == []
+
+
+def test_column_values_and_projection():
+    schema = ExportSchema([ExportColumn("a", "a"), ExportColumn("b", "x.b", default=0)])
+    assert schema.column_values([{"a": 1, "x": {"b": 2}}, {"a": 3}]) == [[1, 3], [2, 0]]
+    assert schema.projection() == {"a": 1, "x.b": 1}
+
+
+def test_select_columns():
+    selected = COLUMNAR_EXPORT_SCHEMA.select(["timestamp", "userId"])
+    assert selected.headers == ["timestamp", "userId"]
+    assert selected.fields == ["timestamp", "userId"]
+    with pytest.raises(ValueError):
+        COLUMNAR_EXPORT_SCHEMA.select(["userId", "unknown"])
+
+
+def test_normalize_documents():
+    doc_id = ObjectId()
+    (doc,) = normalize_documents([{"_id": doc_id, "userId": "u"}])
+    assert doc["id"] == doc_id
+    assert "_id" not in doc
+    assert doc["timestamp"] == doc_id.generation_time.replace(tzinfo=None)
+
+
+def test_iter_batches():
+    async def cursor():
+        for i in range(5):
+            yield {"i": i}
+
+    async def collect():
+        return [[doc["i"] for doc in batch] async for batch in iter_batches(cursor(), 2)]
+
+    assert asyncio.run(collect()) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from utils import ingest as ingest_module
+from utils.ingest import LineTooLong, ingest, iter_json_array, iter_ndjson
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def parse(*chunks, **kwargs):
+    async def collect():
+        return [item async for item in iter_ndjson(stream(*chunks), **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_iter_ndjson_splits_across_chunks():
+    body = b'{"a": 1}\n\n{"a": 2}\r\n{"a"'
+    items = parse(body[:3], body[3:12], body[12:], b': 3}')
+    assert items == [(0, {"a": 1}), (1, {"a": 2}), (2, {"a": 3})]
+
+
+def test_iter_ndjson_reports_invalid_lines():
+    items = parse(b'{"a": 1}\nnot json\n{"a": 2}\n')
+    assert items[0] == (0, {"a": 1})
+    assert items[1][0] == 1 and isinstance(items[1][1], json.JSONDecodeError)
+    assert items[2] == (2, {"a": 2})
+
+
+def test_iter_ndjson_reports_non_utf8_lines():
+    items = parse(b'{"userId": "\xe4"}\n{"a": 1}\n')
+    assert items[0][0] == 0 and isinstance(items[0][1], UnicodeDecodeError)
+    assert items[1] == (1, {"a": 1})
+
+
+def test_iter_ndjson_long_line_in_small_chunks():
+    value = "x" * 200000
+    body = json.dumps({"v": value}).encode() + b"\n"
+    chunks = [body[i:i + 1024] for i in range(0, len(body), 1024)]
+    assert parse(*chunks) == [(0, {"v": value})]
+
+
+def test_iter_ndjson_rejects_oversized_line():
+    with pytest.raises(LineTooLong) as error:
+        parse(b'{"a": 1}\n' + b" " * 20 + b"\n", b'{"b": "' + b"x" * 50, max_line_bytes=16)
+    assert error.value.index == 1
+
+    # 单个数据块内的超长行
+    with pytest.raises(LineTooLong):
+        parse(b'{"b": "' + b"x" * 50 + b'"}\n', max_line_bytes=16)
+
+
+def test_iter_json_array_requires_list():
+    with pytest.raises(ValueError):
+        iter_json_array(b'{"a": 1}')
+
+
+class FakeCollection:
+    def __init__(self, fail_positions=()):
+        self.fail_positions = set(fail_positions)
+        self.batches = []
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            doc["_id"] = ObjectId()
+        self.batches.append(len(docs))
+        if self.fail_positions:
+            raise BulkWriteError({"writeErrors": [
+                {"index": position, "errmsg": "duplicate"} for position in sorted(self.fail_positions)
+            ]})
+
+
+def test_ingest_reports_per_record_results(monkeypatch):
+    monkeypatch.setattr(ingest_module, "INGEST_CHUNK_SIZE", 2)
+    collection = FakeCollection(fail_positions=[0])
+    inserted = []
+
+    async def on_inserted(docs):
+        inserted.extend(docs)
+
+    body = b'{"userId": "u"}\n[1]\n{"userId": "u"}\n{"userId": "u"}\n{"userId": "\xe4"}\n'
+    result = asyncio.run(ingest(collection, iter_ndjson(stream(body)), on_inserted))
+    assert collection.batches == [1, 2]
+    assert result["inserted"] == 1
+    assert result["failed"] == 4
+    assert [r["index"] for r in result["results"]] == [0, 1, 2, 3, 4]
+    assert "error" in result["results"][1]
+    assert result["results"][4]["error"].startswith("JSON解析失败")
+    assert "id" in result["results"][3]
+    assert len(inserted) == 1
@@ -0,0 +1,326 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app import analysis_jobs, export_jobs
+from models.export import ExportJobCreate
+
+MISSING = object()
+
+
+def check(value, condition):
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return value is not MISSING and value == condition
+    for op, operand in condition.items():
+        if op == "$exists":
+            ok = (value is not MISSING) == operand
+        elif op == "$not":
+            ok = not check(value, operand)
+        elif op == "$in":
+            ok = value is not MISSING and value in operand
+        elif op == "$ne":
+            ok = value is MISSING or value != operand
+        else:
+            ok = value not in (MISSING, None) and {
+                "$lt": lambda: value < operand,
+                "$lte": lambda: value <= operand,
+                "$gt": lambda: value > operand,
+                "$gte": lambda: value >= operand,
+            }[op]()
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc, query):
+    """按 MongoDB 语义计算任务队列使用的查询条件"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif not check(doc.get(key, MISSING), condition):
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+class FakeCollection:
+    """内存中的集合；每次操作前让出事件循环，以便并发的调用交错执行
+
+    unique=(字段, 部分索引字段)：仅对带有部分索引字段的文档检查唯一性
+    """
+
+    def __init__(self, docs=(), unique=None):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.unique = unique
+
+    def _sorted(self, query, sort):
+        found = [doc for doc in self.docs if matches(doc, query)]
+        for key, direction in reversed(sort or []):
+            found.sort(key=lambda doc: doc.get(key), reverse=direction < 0)
+        return found
+
+    @staticmethod
+    def _apply(doc, update):
+        doc.update(update.get("$set", {}))
+        for key, amount in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + amount
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+    def find(self, query, projection=None):
+        return FakeCursor([copy.deepcopy(doc) for doc in self._sorted(query, None)])
+
+    async def find_one(self, query, projection=None, sort=None):
+        await asyncio.sleep(0)
+        found = self._sorted(query, sort)
+        return copy.deepcopy(found[0]) if found else None
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        doc.setdefault("_id", ObjectId())
+        if self.unique:
+            fields, partial = self.unique
+            for other in self.docs:
+                if partial in doc and partial in other and all(doc.get(f) == other.get(f) for f in fields):
+                    raise DuplicateKeyError("duplicate key")
+        self.docs.append(copy.deepcopy(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def update_one(self, query, update):
+        await asyncio.sleep(0)
+        found = self._sorted(query, None)
+        if found:
+            self._apply(found[0], update)
+        return SimpleNamespace(modified_count=len(found[:1]))
+
+    async def find_one_and_update(self, query, update, sort=None, return_document=ReturnDocument.BEFORE):
+        await asyncio.sleep(0)
+        found = self._sorted(query, sort)
+        if not found:
+            return None
+        before = copy.deepcopy(found[0])
+        self._apply(found[0], update)
+        return copy.deepcopy(found[0]) if return_document == ReturnDocument.AFTER else before
+
+    def get(self, doc_id):
+        return next(doc for doc in self.docs if doc["_id"] == doc_id)
+
+
+class FakeDatabase:
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def get_collection(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+# ---- 导出任务 ----
+
+def export_db(*jobs):
+    return FakeDatabase(export_jobs=FakeCollection(jobs, unique=(("user_id", "dedupe_key"), "dedupe_key")))
+
+
+def test_export_job_is_claimed_once(monkeypatch, tmp_path):
+    job = {"_id": ObjectId(), "user_id": "u", "format": "csv", "options": {}, "status": "pending", "attempts": 0}
+    fake = export_db(job)
+    monkeypatch.setattr(export_jobs, "Database", fake)
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    builds = []
+
+    async def resolve(user_id, options):
+        return {"userId": user_id}, "mark"
+
+    async def build(query, options):
+        builds.append(query)
+
+        async def body():
+            yield "a,b\n"
+        return SimpleNamespace(body_iterator=body(), media_type="text/csv")
+
+    monkeypatch.setattr(export_jobs, "_resolve_range", resolve)
+    monkeypatch.setitem(export_jobs.EXPORT_JOB_FORMATS, "csv", (".csv", build))
+
+    async def run_twice():
+        await asyncio.gather(export_jobs.run_export_job(job["_id"]), export_jobs.run_export_job(job["_id"]))
+
+    asyncio.run(run_twice())
+    stored = fake.collections["export_jobs"].get(job["_id"])
+    assert len(builds) == 1
+    assert stored["status"] == "completed"
+    assert stored["attempts"] == 1
+    assert stored["watermark"] == "mark"
+    assert open(stored["filepath"]).read() == "a,b\n"
+
+
+def test_export_job_expired_lease_is_requeued(monkeypatch):
+    expired = datetime.now() - timedelta(seconds=1)
+    stale = {"_id": ObjectId(), "status": "processing", "attempts": 1, "lease_until": expired, "dedupe_key": "k", "user_id": "u"}
+    live = {"_id": ObjectId(), "status": "processing", "attempts": 1, "lease_until": datetime.now() + timedelta(seconds=60)}
+    fake = export_db(stale, live)
+    monkeypatch.setattr(export_jobs, "Database", fake)
+    scheduled = []
+    monkeypatch.setattr(export_jobs, "schedule_export_job", scheduled.append)
+
+    assert asyncio.run(export_jobs.recover_stale_jobs()) == 1
+    assert scheduled == [stale["_id"]]
+    assert fake.collections["export_jobs"].get(stale["_id"])["status"] == "pending"
+    assert fake.collections["export_jobs"].get(live["_id"])["status"] == "processing"
+
+
+def test_export_job_fails_after_max_attempts(monkeypatch):
+    expired = datetime.now() - timedelta(seconds=1)
+    job = {"_id": ObjectId(), "status": "processing", "attempts": 3, "lease_until": expired, "dedupe_key": "k", "user_id": "u"}
+    fake = export_db(job)
+    monkeypatch.setattr(export_jobs, "Database", fake)
+    monkeypatch.setattr(export_jobs, "EXPORT_JOB_MAX_ATTEMPTS", 3)
+    scheduled = []
+    monkeypatch.setattr(export_jobs, "schedule_export_job", scheduled.append)
+
+    assert asyncio.run(export_jobs.recover_stale_jobs()) == 1
+    stored = fake.collections["export_jobs"].get(job["_id"])
+    assert scheduled == []
+    assert stored["status"] == "failed"
+    assert "dedupe_key" not in stored
+
+
+def test_duplicate_export_job_returns_existing(monkeypatch):
+    fake = export_db()
+    monkeypatch.setattr(export_jobs, "Database", fake)
+    scheduled = []
+    monkeypatch.setattr(export_jobs, "schedule_export_job", scheduled.append)
+
+    async def resolve(user_id, options):
+        return {}, "mark"
+
+    async def version(user_id):
+        return "latest"
+
+    monkeypatch.setattr(export_jobs, "_resolve_range", resolve)
+    monkeypatch.setattr(export_jobs, "_data_version", version)
+
+    async def create_concurrently():
+        user = {"id": "u"}
+        return await asyncio.gather(*[
+            export_jobs.create_export_job(ExportJobCreate(format="csv"), current_user=user) for _ in range(3)
+        ])
+
+    jobs = asyncio.run(create_concurrently())
+    assert len({job["id"] for job in jobs}) == 1
+    assert len(scheduled) == 1
+    assert len(fake.collections["export_jobs"].docs) == 1
+
+
+# ---- 视频分析任务 ----
+
+def analysis_db(*jobs):
+    return FakeDatabase(analysis_jobs=FakeCollection(jobs, unique=(("video_id",), "active")))
+
+
+def test_analysis_job_is_claimed_once(monkeypatch):
+    now = datetime.now()
+    jobs = [
+        {"_id": ObjectId(), "status": "pending", "available_at": now - timedelta(seconds=2), "attempts": 0},
+        {"_id": ObjectId(), "status": "pending", "available_at": now - timedelta(seconds=1), "attempts": 1},
+        {"_id": ObjectId(), "status": "pending", "available_at": now + timedelta(seconds=60), "attempts": 0},
+    ]
+    monkeypatch.setattr(analysis_jobs, "Database", analysis_db(*jobs))
+
+    async def claim_concurrently():
+        return await asyncio.gather(*[analysis_jobs._claim_job() for _ in range(3)])
+
+    claimed = asyncio.run(claim_concurrently())
+    assert [job["_id"] if job else None for job in claimed] == [jobs[0]["_id"], jobs[1]["_id"], None]
+    assert [job["attempts"] for job in claimed[:2]] == [1, 2]
+    assert all(job["status"] == "processing" for job in claimed[:2])
+
+
+def stale_analysis_job(attempts):
+    return {
+        "_id": ObjectId(), "video_id": ObjectId(), "status": "processing", "active": True,
+        "attempts": attempts, "lease_until": datetime.now() - timedelta(seconds=1),
+    }
+
+
+def test_analysis_job_expired_lease_is_requeued(monkeypatch):
+    job = stale_analysis_job(1)
+    fake = analysis_db(job)
+    monkeypatch.setattr(analysis_jobs, "Database", fake)
+
+    assert asyncio.run(analysis_jobs.recover_stale_jobs()) == 1
+    stored = fake.collections["analysis_jobs"].get(job["_id"])
+    assert stored["status"] == "pending"
+    assert stored["available_at"] > datetime.now()
+    assert stored["active"] is True
+
+
+def test_analysis_job_fails_after_max_attempts(monkeypatch):
+    job = stale_analysis_job(3)
+    fake = analysis_db(job)
+    monkeypatch.setattr(analysis_jobs, "Database", fake)
+    monkeypatch.setattr(analysis_jobs, "ANALYSIS_MAX_ATTEMPTS", 3)
+
+    assert asyncio.run(analysis_jobs.recover_stale_jobs()) == 1
+    stored = fake.collections["analysis_jobs"].get(job["_id"])
+    assert stored["status"] == "failed"
+    assert "active" not in stored
+    # 再次执行不会重复处理
+    assert asyncio.run(analysis_jobs.recover_stale_jobs()) == 0
+
+
+def test_duplicate_analysis_enqueue_returns_existing(monkeypatch):
+    fake = analysis_db()
+    monkeypatch.setattr(analysis_jobs, "Database", fake)
+    video = {"_id": ObjectId(), "user_id": "u", "filepath": "/tmp/v.mp4"}
+
+    async def enqueue_concurrently():
+        return await asyncio.gather(*[analysis_jobs.enqueue_analysis(video) for _ in range(3)])
+
+    jobs = asyncio.run(enqueue_concurrently())
+    assert len({job["_id"] for job in jobs}) == 1
+    assert len(fake.collections["analysis_jobs"].docs) == 1
+
+    # 任务结束后可以重新提交
+    fake.collections["analysis_jobs"].docs[0].update(status="completed")
+    fake.collections["analysis_jobs"].docs[0].pop("active")
+    assert asyncio.run(analysis_jobs.enqueue_analysis(video))["_id"] != jobs[0]["_id"]
+
+
+def test_missing_pose_model_fails_without_retry(monkeypatch, tmp_path):
+    import queue
+
+    from utils import pose_models
+
+    monkeypatch.setattr(pose_models, "POSE_MODEL_PATH", str(tmp_path / "missing.onnx"))
+
+    def missing():
+        raise ImportError("No module named 'mediapipe'")
+
+    monkeypatch.setattr(pose_models, "MediaPipePoseModel", missing)
+    messages = queue.Queue()
+    analysis_jobs._worker_main(str(tmp_path / "v.mp4"), None, messages)
+    kind, error = messages.get_nowait()
+    assert kind == "fatal"
+
+    job = stale_analysis_job(1)
+    fake = analysis_db(job)
+    monkeypatch.setattr(analysis_jobs, "Database", fake)
+    asyncio.run(analysis_jobs._finish_job(job, error=error, retry=False))
+    stored = fake.collections["analysis_jobs"].get(job["_id"])
+    assert stored["status"] == "failed"
+    assert "active" not in stored
@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from utils.pagination import decode_cursor, encode_cursor, keyset_after, keyset_filter, keyset_until, next_cursor
+
+
+def matches(doc, query):
+    """按 MongoDB 语义计算本模块生成的查询条件（缺失字段等于 None）"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == "$ne":
+                if value == operand:
+                    return False
+            elif value is None or not {
+                "$lt": value < operand,
+                "$lte": value <= operand,
+                "$gt": value > operand,
+                "$gte": value >= operand,
+            }[op]:
+                return False
+    return True
+
+
+def sort_key(doc):
+    # MongoDB 排序中 null 小于任何日期
+    timestamp = doc.get("timestamp")
+    return (timestamp is not None, timestamp or datetime.min, doc["_id"])
+
+
+@pytest.fixture
+def docs():
+    same = datetime(2024, 1, 2, 8)
+    docs = [
+        {"_id": ObjectId(), "timestamp": datetime(2024, 1, 1, 8)},
+        {"_id": ObjectId(), "timestamp": same},
+        {"_id": ObjectId(), "timestamp": same},
+        {"_id": ObjectId(), "timestamp": same},
+        {"_id": ObjectId(), "timestamp": datetime(2024, 1, 3, 8)},
+        {"_id": ObjectId()},
+        {"_id": ObjectId(), "timestamp": None},
+        {"_id": ObjectId()},
+    ]
+    return docs
+
+
+def test_cursor_round_trip():
+    doc_id = ObjectId()
+    assert decode_cursor(encode_cursor(datetime(2024, 1, 1, 8, 30), doc_id)) == (datetime(2024, 1, 1, 8, 30), doc_id)
+    assert decode_cursor(encode_cursor(None, doc_id)) == (None, doc_id)
+    with pytest.raises(ValueError):
+        decode_cursor("bm90LWpzb24")
+
+
+def test_next_cursor_uses_stored_timestamp():
+    doc = {"_id": ObjectId()}
+    assert decode_cursor(next_cursor([doc], 1)) == (None, doc["_id"])
+    assert next_cursor([doc], 2) is None
+
+
+def test_descending_pages_cover_every_document_once(docs):
+    ordered = sorted(docs, key=sort_key, reverse=True)
+    seen = []
+    cursor = None
+    while True:
+        remaining = [doc for doc in ordered if cursor is None or matches(doc, keyset_filter(cursor))]
+        page = remaining[:2]
+        seen.extend(doc["_id"] for doc in page)
+        cursor = next_cursor(page, 2)
+        if cursor is None:
+            break
+    assert seen == [doc["_id"] for doc in ordered]
+
+
+def test_keyset_after_and_until(docs):
+    ordered = sorted(docs, key=sort_key)
+    for position, doc in enumerate(ordered):
+        cursor = encode_cursor(doc.get("timestamp"), doc["_id"])
+        after = [other["_id"] for other in ordered if matches(other, keyset_after(cursor))]
+        assert after == [other["_id"] for other in ordered[position + 1:]]
+
+        if doc.get("timestamp"):
+            until = [other["_id"] for other in ordered if matches(other, keyset_until(doc["timestamp"], doc["_id"]))]
+            assert until == [other["_id"] for other in ordered[:position + 1]]
@@ -0,0 +1,251 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from utils import pose_analysis
+from utils.pose_analysis import (
+    estimate_poses, evaluate_running_form, score_running_form, _contact_frames,
+    L_SHOULDER, R_SHOULDER, L_ELBOW, R_ELBOW, L_WRIST, R_WRIST,
+    L_HIP, R_HIP, L_KNEE, R_KNEE, L_ANKLE, R_ANKLE, NOSE, L_EAR, R_EAR,
+)
+
+SIZE = 1000  # 关键点坐标已归一化，按 1000x1000 画面换算
+
+
+def side_run(lean=5.0, overstride=0.0, arm=0.4, direction=1, frames=120):
+    """侧面跑步的关键点序列：direction=1 向右跑，步频 20 帧/步"""
+    sequence = []
+    hip = np.array([0.5, 0.5])
+    for i in range(frames):
+        phase = 2 * np.pi * i / 20
+        shoulder = hip + [direction * np.sin(np.radians(lean)) * 0.2, -np.cos(np.radians(lean)) * 0.2]
+        points = np.zeros((17, 3))
+        points[:, 2] = 0.9
+        points[NOSE, :2] = shoulder + [direction * 0.03, -0.08]
+        points[1, :2] = points[2, :2] = points[NOSE, :2]
+        points[L_EAR, :2] = points[R_EAR, :2] = shoulder + [-direction * 0.01, -0.08]
+        points[L_SHOULDER, :2] = points[R_SHOULDER, :2] = shoulder
+        points[L_HIP, :2] = points[R_HIP, :2] = hip
+        for side, (knee, ankle, elbow, wrist) in enumerate([(L_KNEE, L_ANKLE, L_ELBOW, L_WRIST), (R_KNEE, R_ANKLE, R_ELBOW, R_WRIST)]):
+            leg_phase = phase + side * np.pi
+            ankle_x = hip[0] + direction * (overstride + 0.1 * np.sin(leg_phase))
+            # 着地时踝关节在最低点
+            ankle_y = 0.8 - (0 if np.cos(leg_phase) > 0.95 else 0.05 * (1 - np.cos(leg_phase)))
+            points[knee, :2] = [(hip[0] + ankle_x) / 2 + direction * 0.03, 0.65]
+            points[ankle, :2] = [ankle_x, ankle_y]
+            points[elbow, :2] = shoulder + [0, 0.12]
+            points[wrist, :2] = shoulder + [direction * arm * 0.2 * np.sin(leg_phase + np.pi), 0.25]
+        sequence.append(points)
+    return np.array(sequence)
+
+
+def front_run(knee_in=0.0, tilt=0.0, frames=60):
+    """正面跑步的关键点序列：knee_in > 0 表示膝盖向身体中线偏移，tilt 为肩部整体横移（侧倾）"""
+    sequence = []
+    for i in range(frames):
+        points = np.zeros((17, 3))
+        points[:, 2] = 0.9
+        points[L_SHOULDER, :2] = [0.42 + tilt, 0.3]
+        points[R_SHOULDER, :2] = [0.58 + tilt, 0.3]
+        points[L_HIP, :2] = [0.45, 0.5]
+        points[R_HIP, :2] = [0.55, 0.5]
+        points[L_KNEE, :2] = [0.45 + knee_in, 0.65]
+        points[R_KNEE, :2] = [0.55 - knee_in, 0.65]
+        points[L_ANKLE, :2] = [0.45, 0.8 + 0.01 * np.sin(i)]
+        points[R_ANKLE, :2] = [0.55, 0.8]
+        points[L_WRIST, :2] = [0.40 + tilt, 0.5]
+        points[R_WRIST, :2] = [0.60 + tilt, 0.5]
+        sequence.append(points)
+    return np.array(sequence)
+
+
+def evaluate(points, angle=None):
+    return evaluate_running_form(points, SIZE, SIZE, angle)
+
+
+def test_side_view_baseline_is_good_form():
+    form = evaluate(side_run())
+    assert form["view"] == "side"
+    assert form["posture"] == "upright"
+    assert form["foot_strike"] == "forefoot"
+    assert form["arm_swing"] == "optimal"
+    assert form["knee_alignment"] == "good"
+    assert score_running_form(form) == (100, ["保持当前姿势"])
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_side_view_detects_issues_in_either_direction(direction):
+    assert evaluate(side_run(lean=25, direction=direction))["posture"] == "leaning_forward"
+    assert evaluate(side_run(lean=-10, direction=direction))["posture"] == "leaning_back"
+    assert evaluate(side_run(overstride=0.12, direction=direction))["foot_strike"] == "heel"
+    assert evaluate(side_run(arm=0.05, direction=direction))["arm_swing"] == "limited"
+
+
+def test_issues_lower_score_and_add_suggestions():
+    form = evaluate(side_run(lean=25, overstride=0.12))
+    score, suggestions = score_running_form(form)
+    assert score == 80
+    assert len(suggestions) == 2
+
+
+@pytest.mark.parametrize("knee_in, expected", [(0.05, "inward"), (0.0, "good"), (-0.05, "outward")])
+def test_frontal_view_knee_alignment(knee_in, expected):
+    form = evaluate(front_run(knee_in=knee_in))
+    assert form["view"] == "frontal"
+    assert form["knee_alignment"] == expected
+    assert form["foot_strike"] == "unknown"
+
+
+def test_frontal_view_does_not_classify_posture():
+    # 正面画面中的躯干侧倾不能当作前倾
+    form = evaluate(front_run(tilt=0.08))
+    assert form["posture"] == "unknown"
+    assert "trunk_lean_deg" not in form["metrics"]
+    assert score_running_form(form)[0] == 100
+
+
+def test_uploaded_angle_overrides_detected_view():
+    form = evaluate(side_run(lean=25), angle="front")
+    assert form["view"] == "frontal"
+    assert form["posture"] == "unknown"
+    assert form["metrics"]["detected_view"] == "side"
+    assert form["metrics"]["view_mismatch"] is True
+    assert "拍摄角度" in score_running_form(form)[1][-1]
+
+    form = evaluate(side_run(), angle="side")
+    assert form["metrics"]["view_mismatch"] is False
+
+
+def test_too_few_visible_frames_is_unknown():
+    points = side_run(frames=5)
+    form = evaluate(points)
+    assert form["view"] == "unknown"
+    assert score_running_form(form)[0] is None
+
+    hidden = side_run()
+    hidden[:, L_HIP, 2] = 0.1
+    assert evaluate(hidden)["view"] == "unknown"
+
+
+def test_contact_frames():
+    assert len(_contact_frames(np.full(50, 0.8))) == 0
+    assert len(_contact_frames(np.array([0.1, 0.2]))) == 0
+    series = np.sin(2 * np.pi * np.arange(100) / 20)
+    contacts = _contact_frames(series)
+    assert len(contacts) == 5
+    assert all(series[contacts] > 0.9)
+
+
+class FakeModel:
+    """记录每批帧数，输出固定关键点"""
+
+    name = "fake"
+
+    def __init__(self, max_batch=None):
+        self.max_batch = max_batch
+        self.batches = []
+
+    def prepare(self, frame):
+        return int(frame[0, 0, 0]), None
+
+    def infer(self, batch):
+        self.batches.append([value for value, _ in batch])
+        return np.full((len(batch), 17, 3), 0.5, dtype=np.float32)
+
+
+@pytest.fixture(scope="module")
+def video_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("video") / "run.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(40):
+        writer.write(np.full((48, 64, 3), i * 6, np.uint8))
+    writer.release()
+    return path
+
+
+def test_estimate_poses_samples_with_stride_and_batches(video_path):
+    model = FakeModel()
+    progress = []
+    indices, keypoints, video, performance = estimate_poses(video_path, model, stride=3, batch_size=4, progress=progress.append)
+    assert indices == list(range(0, 40, 3))
+    assert keypoints.shape == (len(indices), 17, 3)
+    assert [len(batch) for batch in model.batches] == [4, 4, 4, 2]
+    # 帧按解码顺序进入批次（灰度值随帧号递增）
+    flat = [value for batch in model.batches for value in batch]
+    assert flat == sorted(flat)
+    assert progress == sorted(progress) and 0 < progress[-1] <= 99
+    assert video["frame_count"] == 40 and (video["width"], video["height"]) == (64, 48)
+    assert performance["frames_decoded"] == 40
+    assert performance["frames_analyzed"] == len(indices)
+    assert performance["throughput_fps"] > 0
+
+
+def test_estimate_poses_respects_fixed_batch_models(video_path):
+    model = FakeModel(max_batch=1)
+    indices, _, _, performance = estimate_poses(video_path, model, stride=10, batch_size=8)
+    assert indices == [0, 10, 20, 30]
+    assert all(len(batch) == 1 for batch in model.batches)
+    assert performance["batch_size"] == 1
+
+
+def test_estimate_poses_propagates_inference_errors(video_path):
+    class Failing(FakeModel):
+        def infer(self, batch):
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        estimate_poses(video_path, Failing(), stride=1, batch_size=2)
+
+
+def test_estimate_poses_rejects_unreadable_video(tmp_path):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(b"not a video")
+    with pytest.raises(ValueError):
+        estimate_poses(str(path), FakeModel())
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_many(self, docs):
+        self.docs.extend(docs)
+
+    async def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not (doc["video_id"] == query["video_id"] and doc["job_id"] != query["job_id"]["$ne"])]
+
+
+def test_store_key_points_chunks_and_replaces_previous(monkeypatch):
+    from app import analysis_jobs
+    from utils.database import Database
+
+    collection = FakeCollection()
+    monkeypatch.setattr(Database, "get_collection", staticmethod(lambda name: collection))
+    monkeypatch.setattr(analysis_jobs, "KEYPOINT_CHUNK_FRAMES", 4)
+    frames = list(range(0, 20, 2))
+    points = np.random.rand(len(frames), 17, 3).astype(np.float32)
+
+    asyncio.run(analysis_jobs.store_key_points("video", "old", {"frames": frames[:3], "points": points[:3]}, 30.0))
+    reference = asyncio.run(analysis_jobs.store_key_points("video", "new", {"frames": frames, "points": points}, 30.0))
+
+    assert reference == {"job_id": "new", "count": 10}
+    assert [doc["job_id"] for doc in collection.docs] == ["new"] * 3
+    assert [doc["start"] for doc in collection.docs] == [0, 4, 8]
+    assert collection.docs[1]["frames"] == [8, 10, 12, 14]
+    assert collection.docs[1]["times"][0] == round(8 / 30, 3)
+    assert collection.docs[2]["points"][0][0] == pytest.approx(points[8, 0].tolist(), abs=1e-3)
+
+
+def test_load_pose_model_without_backend(monkeypatch, tmp_path):
+    from utils import pose_models
+
+    def missing():
+        raise ImportError("No module named 'mediapipe'")
+
+    monkeypatch.setattr(pose_models, "POSE_MODEL_PATH", str(tmp_path / "missing.onnx"))
+    monkeypatch.setattr(pose_models, "MediaPipePoseModel", missing)
+    for backend in ("auto", "onnx", "mediapipe"):
+        with pytest.raises(pose_models.PoseModelUnavailable):
+            pose_models.load_pose_model(backend)
@@ -0,0 +1,131 @@
+import asyncio
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from utils import ranges
+from utils.ranges import content_disposition, guess_media_type, parse_range, range_file_response
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=90-500", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+
+
+def test_parse_range_ignores_unsupported_forms():
+    assert parse_range("items=0-9", 100) is None
+    assert parse_range("bytes=0-9,20-29", 100) is None
+    assert parse_range("bytes=a-b", 100) is None
+    assert parse_range("bytes=-0", 100) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, 100)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */100"
+
+
+def test_content_disposition_and_media_type():
+    assert content_disposition("inline", "run.mp4") == 'inline; filename="run.mp4"'
+    assert content_disposition("attachment", "跑步.mp4") == (
+        "attachment; filename=\"file.mp4\"; filename*=UTF-8''%E8%B7%91%E6%AD%A5.mp4"
+    )
+    assert guess_media_type("a.MKV") == "video/x-matroska"
+    assert guess_media_type("a.unknownext") == "application/octet-stream"
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    return str(path)
+
+
+def send(path, headers=None, method="GET", extensions=None):
+    request = Request({
+        "type": "http",
+        "method": method,
+        "path": "/",
+        "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+    response = range_file_response(request, path)
+    messages = []
+
+    async def collect(message):
+        messages.append(message)
+
+    asyncio.run(response({"type": "http", "method": method, "extensions": extensions or {}}, None, collect))
+    body = b"".join(message.get("body", b"") for message in messages)
+    return response, body, messages
+
+
+def test_full_and_partial_responses(video):
+    content = open(video, "rb").read()
+    response, body, _ = send(video)
+    assert response.status_code == 200
+    assert body == content
+    assert response.headers["content-length"] == "1024"
+    assert response.headers["content-type"] == "video/mp4"
+
+    response, body, _ = send(video, {"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert body == content[100:200]
+    assert response.headers["content-range"] == "bytes 100-199/1024"
+    assert response.headers["content-length"] == "100"
+
+
+def test_head_sends_no_body(video):
+    response, body, _ = send(video, method="HEAD")
+    assert response.status_code == 200
+    assert body == b""
+    assert response.headers["content-length"] == "1024"
+
+
+def test_conditional_requests(video):
+    response, _, _ = send(video)
+    etag = response.headers["etag"]
+    assert send(video, {"If-None-Match": etag})[0].status_code == 304
+    assert send(video, {"If-None-Match": "*"})[0].status_code == 304
+    assert send(video, {"If-None-Match": '"other"'})[0].status_code == 200
+
+    mtime = os.stat(video).st_mtime
+    assert send(video, {"If-Modified-Since": formatdate(mtime + 60, usegmt=True)})[0].status_code == 304
+    assert send(video, {"If-Modified-Since": formatdate(mtime - 60, usegmt=True)})[0].status_code == 200
+    assert send(video, {"If-Modified-Since": "not a date"})[0].status_code == 200
+
+
+def test_if_range_mismatch_returns_full_content(video):
+    etag = send(video)[0].headers["etag"]
+    assert send(video, {"Range": "bytes=0-9", "If-Range": etag})[0].status_code == 206
+    response, body, _ = send(video, {"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert len(body) == 1024
+
+
+def test_zerocopy_extension(video):
+    response, _, messages = send(video, {"Range": "bytes=10-19"}, extensions={"http.response.zerocopy": {}})
+    assert messages[1]["type"] == "http.response.zerocopy"
+    assert (messages[1]["offset"], messages[1]["count"]) == (10, 10)
+    assert response.file.closed
+
+
+def test_sendfile_header(video, monkeypatch):
+    monkeypatch.setattr(ranges, "SENDFILE_HEADER", "X-Accel-Redirect")
+    monkeypatch.setattr(ranges, "SENDFILE_ROOT", os.path.dirname(video))
+    monkeypatch.setattr(ranges, "SENDFILE_PREFIX", "/protected/")
+    response, body, _ = send(video)
+    assert response.headers["x-accel-redirect"] == "/protected/clip.mp4"
+    assert body == b""
+
+    monkeypatch.setattr(ranges, "SENDFILE_ROOT", "/elsewhere")
+    assert "x-accel-redirect" not in send(video)[0].headers
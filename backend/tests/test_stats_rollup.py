@@ -0,0 +1,230 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from utils import stats_rollup
+from utils.stats_rollup import (
+    bucket_keys, build_rollup_update, raw_day_bucket, read_statistics, split_day_range,
+)
+
+
+def test_split_day_range_whole_days():
+    bucket, edges = split_day_range(datetime(2024, 1, 1), datetime(2024, 1, 3, 23, 59, 59, 999000))
+    assert bucket == {"$gte": "2024-01-01", "$lte": "2024-01-03"}
+    assert edges == []
+
+
+def test_split_day_range_partial_edges():
+    start = datetime(2024, 1, 1, 8)
+    end = datetime(2024, 1, 3, 12)
+    bucket, edges = split_day_range(start, end)
+    assert bucket == {"$gte": "2024-01-02", "$lte": "2024-01-02"}
+    assert edges == [
+        {"$gte": start, "$lt": datetime(2024, 1, 2)},
+        {"$gte": datetime(2024, 1, 3), "$lte": end},
+    ]
+
+
+def test_split_day_range_end_at_midnight_matches_lte():
+    # timestamp <= 当天 00:00 只包含该时刻，不能读取整天的桶
+    bucket, edges = split_day_range(datetime(2024, 1, 1), datetime(2024, 1, 3))
+    assert bucket == {"$gte": "2024-01-01", "$lte": "2024-01-02"}
+    assert edges == [{"$gte": datetime(2024, 1, 3), "$lte": datetime(2024, 1, 3)}]
+
+
+def test_split_day_range_within_one_day():
+    start = datetime(2024, 1, 1, 8)
+    end = datetime(2024, 1, 1, 20)
+    assert split_day_range(start, end) == (None, [{"$gte": start, "$lte": end}])
+    assert split_day_range(None, None) == ({}, [])
+
+
+def test_split_day_range_converts_aware_bounds_to_utc():
+    start = datetime(2024, 1, 2, 0, 0, tzinfo=timezone(timedelta(hours=8)))
+    bucket, edges = split_day_range(start, None)
+    assert bucket == {"$gte": "2024-01-02"}
+    assert edges == [{"$gte": datetime(2024, 1, 1, 16), "$lt": datetime(2024, 1, 2)}]
+
+
+def test_bucket_keys_use_stored_utc_day():
+    aware = datetime(2024, 1, 1, 1, 0, tzinfo=timezone(timedelta(hours=8)))
+    assert bucket_keys(aware)[0] == ("day", "2023-12-31")
+    assert bucket_keys(datetime(2024, 1, 1, 1, 0))[0] == ("day", "2024-01-01")
+
+    oid = ObjectId.from_datetime(datetime(2024, 3, 4, 23, 30, tzinfo=timezone.utc))
+    operations = stats_rollup.build_rollup_operations([{"_id": oid, "userId": "u"}])
+    assert [op._filter["bucket"] for op in operations] == ["2024-03-04", "2024-W10", "all"]
+
+
+def test_build_rollup_update_skips_empty_values():
+    update = build_rollup_update({"bandData": {"heartRate": 150, "pace": 0}, "treadmillData": {"distance": 5.0}})
+    assert update["$inc"] == {
+        "exercises": 1,
+        "heartRate.count": 1, "heartRate.sum": 150,
+        "distance.count": 1, "distance.sum": 5.0,
+    }
+    assert update["$min"] == {"heartRate.min": 150, "distance.min": 5.0}
+    assert update["$max"] == {"heartRate.max": 150, "distance.max": 5.0}
+
+
+def test_raw_day_bucket_shape():
+    row = {"_id": "2024-01-01", "exercises": 2}
+    for name in stats_rollup.ROLLUP_FIELDS:
+        row.update({f"{name}_count": 0, f"{name}_sum": 0, f"{name}_min": None, f"{name}_max": None})
+    row.update({"heartRate_count": 2, "heartRate_sum": 300, "heartRate_min": 140, "heartRate_max": 160})
+    assert raw_day_bucket(row) == {
+        "bucket": "2024-01-01",
+        "exercises": 2,
+        "heartRate": {"count": 2, "sum": 300, "min": 140, "max": 160},
+    }
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+    def __aiter__(self):
+        async def iterate():
+            for doc in self.docs:
+                yield doc
+        return iterate()
+
+
+class FakeCollections:
+    def __init__(self, buckets, raw_rows, locks=None):
+        self.buckets = buckets
+        self.raw_rows = raw_rows
+        self.locks = locks or {}
+        self.queries = []
+        self.pipelines = []
+
+    def get_collection(self, name):
+        return self
+
+    def find(self, query):
+        self.queries.append(query)
+        return FakeCursor(self.buckets)
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return FakeCursor(self.raw_rows.pop(0))
+
+    async def find_one_and_update(self, query, update):
+        lock = self.locks.get(query["_id"])
+        if lock is None or lock["state"] not in query["state"]["$in"]:
+            return None
+        lock["deferred"].extend(update["$push"]["deferred"]["$each"])
+        return lock
+
+
+def test_read_statistics_merges_raw_edge_days(monkeypatch):
+    buckets = [{"bucket": "2024-01-02", "exercises": 1, "heartRate": {"count": 1, "sum": 150, "min": 150, "max": 150}}]
+    raw_rows = [
+        [{"_id": "2024-01-01", "exercises": 1, "heartRate_count": 1, "heartRate_sum": 130, "heartRate_min": 130, "heartRate_max": 130}],
+        [{"_id": "2024-01-03", "exercises": 1, "heartRate_count": 1, "heartRate_sum": 170, "heartRate_min": 170, "heartRate_max": 170}],
+    ]
+    fake = FakeCollections(buckets, raw_rows)
+    monkeypatch.setattr(stats_rollup, "Database", fake)
+
+    stats = asyncio.run(read_statistics("u", datetime(2024, 1, 1, 12), datetime(2024, 1, 3, 12)))
+    assert fake.queries == [{"userId": "u", "period": "day", "bucket": {"$gte": "2024-01-02", "$lte": "2024-01-02"}}]
+    assert [pipeline[0]["$match"]["timestamp"] for pipeline in fake.pipelines] == [
+        {"$gte": datetime(2024, 1, 1, 12), "$lt": datetime(2024, 1, 2)},
+        {"$gte": datetime(2024, 1, 3), "$lte": datetime(2024, 1, 3, 12)},
+    ]
+    assert stats["dates"] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert stats["heartRate"] == {"avg": 150.0, "max": 170, "min": 130, "data": [130.0, 150.0, 170.0]}
+
+
+def test_apply_exercises_defers_users_being_rebuilt(monkeypatch):
+    fake = FakeCollections([], [], locks={"busy": {"state": "running", "deferred": []}})
+    monkeypatch.setattr(stats_rollup, "Database", fake)
+    written = []
+
+    async def write(docs):
+        written.extend(docs)
+
+    monkeypatch.setattr(stats_rollup, "_write_rollup", write)
+    docs = [{"_id": 1, "userId": "busy"}, {"_id": 2, "userId": "idle"}, {"_id": 3, "userId": "busy"}]
+    asyncio.run(stats_rollup.apply_exercises(docs))
+    assert written == [{"_id": 2, "userId": "idle"}]
+    assert fake.locks["busy"]["deferred"] == [1, 3]
+
+
+class FakeRebuildCollection:
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.deleted = []
+
+    def find(self, query, fields=None):
+        if "userId" in query:
+            return FakeCursor([doc for doc in self.docs.values() if doc["userId"] in query["userId"]["$in"]])
+        return FakeCursor([self.docs[doc_id] for doc_id in query["_id"]["$in"] if doc_id in self.docs])
+
+    async def distinct(self, key):
+        return list({doc[key] for doc in self.docs.values()})
+
+    async def insert_one(self, doc):
+        self.docs[doc["_id"]] = doc
+
+    async def update_many(self, query, update):
+        for doc_id in query["_id"]["$in"]:
+            self.docs[doc_id].update(update["$set"])
+
+    async def find_one_and_delete(self, query):
+        return self.docs.pop(query["_id"], None)
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+        field, condition = next(iter(query.items()))
+        for doc_id, doc in list(self.docs.items()):
+            if doc[field] in condition["$in"]:
+                del self.docs[doc_id]
+
+
+class FakeRebuildDatabase:
+    def __init__(self, exercises, rollups):
+        self.collections = {
+            stats_rollup.EXERCISE_COLLECTION: FakeRebuildCollection(exercises),
+            stats_rollup.ROLLUP_COLLECTION: FakeRebuildCollection(rollups),
+            stats_rollup.REBUILD_LOCK_COLLECTION: FakeRebuildCollection(),
+        }
+
+    def get_collection(self, name):
+        return self.collections[name]
+
+
+def test_rebuild_locks_users_in_batches(monkeypatch):
+    exercises = [{"_id": i, "userId": user} for i, user in enumerate(["a", "b", "a", "c"])]
+    fake = FakeRebuildDatabase(exercises, [{"_id": "r", "userId": "gone"}])
+    monkeypatch.setattr(stats_rollup, "Database", fake)
+    monkeypatch.setattr(stats_rollup, "REBUILD_USER_BATCH", 2)
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(stats_rollup.asyncio, "sleep", sleep)
+    written = []
+
+    async def write(docs):
+        written.extend(doc["_id"] for doc in docs)
+
+    monkeypatch.setattr(stats_rollup, "_write_rollup", write)
+
+    assert asyncio.run(stats_rollup.rebuild()) == 4
+    assert sorted(written) == [0, 1, 2, 3]
+    # 每批只等待两次；没有运动数据的用户在其所在批次内清空，不再有批次之外的删除
+    assert len(sleeps) == 4
+    rollups = fake.collections[stats_rollup.ROLLUP_COLLECTION]
+    assert rollups.deleted == [{"userId": {"$in": ["a", "b"]}}, {"userId": {"$in": ["c", "gone"]}}]
+    assert rollups.docs == {}
+    assert fake.collections[stats_rollup.REBUILD_LOCK_COLLECTION].docs == {}
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import ClientDisconnect, Request
+
+from utils.upload import file_sha256, receive_upload
+
+BOUNDARY = "testboundary"
+
+
+def multipart(filename, content, fields=None):
+    body = b""
+    for name, value in (fields or {}).items():
+        body += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        ).encode()
+    body += (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return body
+
+
+def make_request(body, chunk_size=100, content_length=False):
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(len(body)).encode()))
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        chunk = chunks.pop(0) if chunks else b""
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    return Request({"type": "http", "method": "POST", "path": "/", "query_string": b"", "headers": headers}, receive)
+
+
+def upload(request, dest_dir, max_size=1024, allowed_extensions=(".mp4",)):
+    return asyncio.run(receive_upload(request, str(dest_dir), max_size, "file", allowed_extensions))
+
+
+def test_receive_upload_reports_size_and_sha256(tmp_path):
+    content = os.urandom(700)
+    result = upload(make_request(multipart("../clip.MP4", content, {"title": "晨跑"})), tmp_path)
+    assert result.filename == "clip.MP4"
+    assert result.size == len(content)
+    assert result.sha256 == hashlib.sha256(content).hexdigest()
+    assert result.fields == {"title": "晨跑"}
+    assert os.path.dirname(result.temp_path) == str(tmp_path)
+    assert open(result.temp_path, "rb").read() == content
+    assert file_sha256(result.temp_path, chunk_size=64) == result.sha256
+
+    result.commit(str(tmp_path / "clip.mp4"))
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+
+
+def test_receive_upload_aborts_over_size_limit(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        upload(make_request(multipart("clip.mp4", b"x" * 2000)), tmp_path)
+    assert error.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+    # 声明的 Content-Length 明显超限时不读取请求体
+    with pytest.raises(HTTPException) as error:
+        upload(make_request(multipart("clip.mp4", b"x" * 100000), content_length=True), tmp_path)
+    assert error.value.status_code == 413
+
+
+def test_receive_upload_rejects_extension(tmp_path):
+    with pytest.raises(HTTPException) as error:
+        upload(make_request(multipart("run.exe", b"x" * 10)), tmp_path)
+    assert error.value.status_code == 400
+    assert os.listdir(tmp_path) == []
+
+
+def test_receive_upload_cleans_up_on_error(tmp_path):
+    # 缺少文件字段
+    body = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="title"\r\n\r\nx\r\n--{BOUNDARY}--\r\n'.encode()
+    with pytest.raises(HTTPException) as error:
+        upload(make_request(body), tmp_path)
+    assert error.value.status_code == 400
+    assert os.listdir(tmp_path) == []
+
+    # 客户端中途断开
+    async def disconnect():
+        return {"type": "http.disconnect"}
+
+    request = Request({"type": "http", "method": "POST", "path": "/", "query_string": b"", "headers": [
+        (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())
+    ]}, disconnect)
+    with pytest.raises(ClientDisconnect):
+        upload(request, tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_receive_upload_requires_multipart(tmp_path):
+    request = Request({"type": "http", "method": "POST", "path": "/", "query_string": b"", "headers": [
+        (b"content-type", b"application/json")
+    ]})
+    with pytest.raises(HTTPException) as error:
+        upload(request, tmp_path)
+    assert error.value.status_code == 400
@@ -0,0 +1,140 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from starlette.requests import Request
+
+from app import video_uploads
+
+
+class FakeSessions:
+    """单个上传会话文档，支持 upload_chunk 用到的查询条件"""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.renewals = 0
+
+    def _matches(self, query):
+        if self.doc is None:
+            return False
+        for key, value in query.items():
+            if key == "$or":
+                if not any(self._matches(sub) for sub in value):
+                    return False
+            elif isinstance(value, dict) and "$lt" in value:
+                if self.doc.get(key) is None or not self.doc[key] < value["$lt"]:
+                    return False
+            elif self.doc.get(key) != value:
+                return False
+        return True
+
+    def get_collection(self, name):
+        return self
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.doc) if self._matches(query) else None
+
+    async def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE):
+        if not self._matches(query):
+            return None
+        before = copy.deepcopy(self.doc)
+        self.doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            self.doc.pop(key, None)
+        return copy.deepcopy(self.doc) if return_document == ReturnDocument.AFTER else before
+
+    async def update_one(self, query, update):
+        matched = self._matches(query)
+        if matched:
+            self.renewals += 1
+            self.doc.update(update["$set"])
+
+        class Result:
+            matched_count = int(matched)
+        return Result()
+
+
+def make_request(chunks, on_receive=None):
+    body = list(chunks)
+
+    async def receive():
+        if on_receive:
+            await on_receive(len(body))
+        if body:
+            return {"type": "http.request", "body": body.pop(0), "more_body": bool(body)}
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    return Request({"type": "http", "method": "PATCH", "headers": [], "query_string": b""}, receive)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    session_id = ObjectId()
+    sessions = FakeSessions({
+        "_id": session_id, "user_id": "u", "filename": "run.mp4", "angle": "side",
+        "size": 10, "offset": 0, "lock_until": None, "expires_at": datetime.now() + timedelta(hours=1),
+    })
+    monkeypatch.setattr(video_uploads, "Database", sessions)
+    monkeypatch.setattr(video_uploads, "_session_path", lambda sid: str(tmp_path / f"{sid}.upload"))
+    (tmp_path / f"{session_id}.upload").write_bytes(b"")
+    return sessions
+
+
+def upload(sessions, chunks, offset=0, on_receive=None):
+    return asyncio.run(video_uploads.upload_chunk(
+        str(sessions.doc["_id"]) if sessions.doc else str(ObjectId()),
+        make_request(chunks, on_receive),
+        offset=offset,
+        current_user={"id": "u"}
+    ))
+
+
+def test_upload_chunk_advances_offset_and_releases_lock(session):
+    response = upload(session, [b"abc", b"de"])
+    assert response.status_code == 204
+    assert response.headers["Upload-Offset"] == "5"
+    assert session.doc["offset"] == 5
+    assert session.doc["lock_until"] is None
+    assert "lock_token" not in session.doc
+
+
+def test_upload_chunk_rejects_wrong_offset(session):
+    with pytest.raises(HTTPException) as error:
+        upload(session, [b"abc"], offset=3)
+    assert error.value.status_code == 409
+    assert error.value.headers["Upload-Offset"] == "0"
+
+
+def test_upload_chunk_session_cancelled_while_writing(session):
+    async def cancel(remaining):
+        session.doc = None
+
+    with pytest.raises(HTTPException) as error:
+        upload(session, [b"abc"], on_receive=cancel)
+    assert error.value.status_code == 410
+
+
+def test_upload_chunk_lock_taken_over_while_writing(session):
+    async def take_over(remaining):
+        session.doc["lock_token"] = "other"
+
+    with pytest.raises(HTTPException) as error:
+        upload(session, [b"abc"], on_receive=take_over)
+    assert error.value.status_code == 409
+    assert session.doc["offset"] == 0
+
+
+def test_upload_chunk_renews_lock_while_streaming(session, monkeypatch):
+    monkeypatch.setattr(video_uploads, "UPLOAD_WRITE_LEASE", 0.03)
+
+    async def slow(remaining):
+        await asyncio.sleep(0.05)
+
+    response = upload(session, [b"ab", b"cd"], on_receive=slow)
+    assert response.status_code == 204
+    assert session.renewals >= 1
+    assert session.doc["offset"] == 4
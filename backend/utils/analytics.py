@@ -0,0 +1,226 @@
+"""训练负荷分析（NumPy 向量化）
+
+一次遍历将用户运动历史转换为数组，再向量化计算：
+- ATL/CTL/TSB 训练负荷（急性 7 天、慢性 42 天指数加权）
+- 心率区间分布
+- 每周训练量
+- 配速趋势
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
+from utils.projections import projection
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+DEFAULT_MAX_HEART_RATE = 190
+
+# 心率区间（占最大心率的比例）
+HEART_RATE_ZONES = [
+    ("Z1", 0.0, 0.6),
+    ("Z2", 0.6, 0.7),
+    ("Z3", 0.7, 0.8),
+    ("Z4", 0.8, 0.9),
+    ("Z5", 0.9, 1.0),
+]
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+@dataclass
+class ExerciseArrays:
+    """运动历史的列式数组（缺失值为 NaN）"""
+    day: np.ndarray  # 距 1970-01-01 的天数
+    heart_rate: np.ndarray
+    pace: np.ndarray
+    training_load: np.ndarray
+    duration: np.ndarray
+    distance: np.ndarray
+    max_heart_rate: float = DEFAULT_MAX_HEART_RATE
+
+    def __len__(self):
+        return len(self.day)
+
+
+def _number(value) -> float:
+    return float(value) if value else np.nan
+
+
+async def load_exercise_arrays(user_id: str, days: Optional[int] = None) -> ExerciseArrays:
+    """读取用户运动历史并转换为数组"""
+    collection = Database.get_collection(EXERCISE_COLLECTION)
+    query = {"userId": user_id}
+    if days:
+        query["timestamp"] = {"$gte": datetime.now() - timedelta(days=days)}
+
+    timestamps, heart_rates, paces, loads, durations, distances = [], [], [], [], [], []
+    age = None
+    async for doc in collection.find(query, projection("analytics")).sort("timestamp", 1):
+        band_data = doc.get("bandData", {}) or {}
+        treadmill_data = doc.get("treadmillData", {}) or {}
+        timestamps.append(doc.get("timestamp", doc["_id"].generation_time.replace(tzinfo=None)))
+        heart_rates.append(_number(band_data.get("heartRate")))
+        paces.append(_number(band_data.get("pace")))
+        loads.append(_number(band_data.get("trainingLoad")))
+        durations.append(_number(treadmill_data.get("duration")))
+        distances.append(_number(treadmill_data.get("distance")))
+        age = (doc.get("basicInfo", {}) or {}).get("age") or age
+
+    return ExerciseArrays(
+        day=(np.array(timestamps, dtype="datetime64[D]") - _EPOCH).astype(np.int64),
+        heart_rate=np.array(heart_rates, dtype=np.float64),
+        pace=np.array(paces, dtype=np.float64),
+        training_load=np.array(loads, dtype=np.float64),
+        duration=np.array(durations, dtype=np.float64),
+        distance=np.array(distances, dtype=np.float64),
+        max_heart_rate=float(220 - age) if age else DEFAULT_MAX_HEART_RATE,
+    )
+
+
+def _day_label(day) -> str:
+    return str(_EPOCH + np.timedelta64(int(day), "D"))
+
+
+def session_loads(arrays: ExerciseArrays) -> np.ndarray:
+    """单次训练负荷：优先使用手环 trainingLoad，否则按 时长 × 心率强度 估算"""
+    intensity = arrays.heart_rate / arrays.max_heart_rate
+    estimated = np.nan_to_num(arrays.duration * intensity)
+    return np.where(np.isnan(arrays.training_load), estimated, arrays.training_load)
+
+
+def ewma(values: np.ndarray, days: int, block: int = 128) -> np.ndarray:
+    """指数加权平均 y[n] = y[n-1] + (x[n] - y[n-1]) / days
+
+    分块使用闭式解 y = a·d^n·cumsum(x·d^-k) 计算，避免逐元素循环，
+    每块长度受限以防 d^-k 溢出。
+    """
+    alpha = 1.0 / days
+    decay = 1.0 - alpha
+    result = np.empty(len(values), dtype=np.float64)
+    previous = 0.0
+    for start in range(0, len(values), block):
+        x = values[start:start + block]
+        k = np.arange(len(x))
+        powers = decay ** k
+        y = powers * (alpha * np.cumsum(x / powers) + previous * decay)
+        result[start:start + len(x)] = y
+        previous = y[-1]
+    return result
+
+
+def training_load(arrays: ExerciseArrays) -> dict:
+    """按天计算 ATL/CTL/TSB"""
+    if len(arrays) == 0:
+        return {"dates": [], "load": [], "atl": [], "ctl": [], "tsb": [], "current": None}
+
+    first_day = arrays.day.min()
+    offsets = arrays.day - first_day
+    daily_load = np.bincount(offsets, weights=session_loads(arrays), minlength=int(offsets.max()) + 1)
+
+    atl = ewma(daily_load, ATL_DAYS)
+    ctl = ewma(daily_load, CTL_DAYS)
+    # TSB 取前一天的 CTL - ATL（当天训练前的状态），序列与 current 使用同一定义
+    tsb = np.concatenate(([0.0], (ctl - atl)[:-1]))
+
+    dates = (_EPOCH + np.timedelta64(int(first_day), "D") + np.arange(len(daily_load))).astype(str)
+    return {
+        "dates": dates.tolist(),
+        "load": np.round(daily_load, 1).tolist(),
+        "atl": np.round(atl, 1).tolist(),
+        "ctl": np.round(ctl, 1).tolist(),
+        "tsb": np.round(tsb, 1).tolist(),
+        "current": {
+            "atl": round(float(atl[-1]), 1),
+            "ctl": round(float(ctl[-1]), 1),
+            "tsb": round(float(tsb[-1]), 1),
+        },
+    }
+
+
+def heart_rate_zones(arrays: ExerciseArrays) -> dict:
+    """心率区间分布（按训练时长加权，无时长时按次数）
+
+    低于 Z1 下限的心率计入 Z1（区间下限取 0），高于最大心率的计入 Z5；非正值不计入。
+    """
+    mask = arrays.heart_rate > 0
+    ratios = arrays.heart_rate[mask] / arrays.max_heart_rate
+    weights = np.nan_to_num(arrays.duration[mask], nan=1.0)
+    edges = [0.0] + [zone[1] for zone in HEART_RATE_ZONES[1:]] + [np.inf]
+    totals, _ = np.histogram(ratios, bins=edges, weights=weights)
+    total = totals.sum()
+    return {
+        "max_heart_rate": arrays.max_heart_rate,
+        "zones": [
+            {
+                "zone": name,
+                "range": [int(low * arrays.max_heart_rate), int(high * arrays.max_heart_rate)],
+                "minutes": round(float(value), 1),
+                "percent": round(float(value / total * 100), 1) if total else 0,
+            }
+            for (name, low, high), value in zip(HEART_RATE_ZONES, totals)
+        ],
+    }
+
+
+def weekly_volume(arrays: ExerciseArrays) -> dict:
+    """每周（周一开始）训练次数、距离和时长"""
+    if len(arrays) == 0:
+        return {"weeks": []}
+
+    # 1970-01-01 为周四，+3 后按 7 天取整得到以周一开始的周序号
+    week = (arrays.day + 3) // 7
+    unique_weeks, index = np.unique(week, return_inverse=True)
+    sessions = np.bincount(index)
+    distance = np.bincount(index, weights=np.nan_to_num(arrays.distance))
+    duration = np.bincount(index, weights=np.nan_to_num(arrays.duration))
+
+    return {
+        "weeks": [
+            {
+                "week_start": _day_label(w * 7 - 3),
+                "sessions": int(s),
+                "distance": round(float(d), 2),
+                "duration": round(float(t), 1),
+            }
+            for w, s, d, t in zip(unique_weeks, sessions, distance, duration)
+        ]
+    }
+
+
+def pace_trend(arrays: ExerciseArrays, window: int = 5) -> dict:
+    """配速趋势：线性回归斜率（min/km 每周）与滑动平均"""
+    mask = ~np.isnan(arrays.pace)
+    days = arrays.day[mask]
+    paces = arrays.pace[mask]
+    if len(paces) < 2:
+        return {"slope_per_week": 0, "improving": False, "dates": [], "pace": [], "rolling": []}
+
+    slope, _ = np.polyfit(days - days[0], paces, 1)
+    window = max(1, min(window, len(paces)))
+    rolling = np.convolve(paces, np.ones(window) / window, mode="valid")
+    rolling = np.concatenate((np.full(window - 1, np.nan), rolling))
+
+    return {
+        "slope_per_week": round(float(slope * 7), 4),
+        "improving": bool(slope < 0),
+        "dates": [_day_label(d) for d in days],
+        "pace": np.round(paces, 2).tolist(),
+        "rolling": [None if np.isnan(v) else round(float(v), 2) for v in rolling],
+    }
+
+
+def summarize(arrays: ExerciseArrays) -> dict:
+    """训练计划提示词所需的分析摘要"""
+    load = training_load(arrays)
+    weeks = weekly_volume(arrays)["weeks"]
+    return {
+        "training_load": load["current"],
+        "heart_rate_zones": heart_rate_zones(arrays)["zones"],
+        "recent_weeks": weeks[-4:],
+        "pace_slope_per_week": pace_trend(arrays)["slope_per_week"],
+    }
@@ -0,0 +1,146 @@
+"""按用户缓存的接口响应（LRU + TTL）
+
+缓存 /api/statistics、/api/exercise 等只读接口序列化后的响应体，
+写入运动数据时按用户失效；响应附带 ETag，未变化时返回 304。
+每个用户有一个失效代数：查询数据库前记录代数，写入缓存时代数已变化则不缓存，
+避免查询与写入缓存之间发生的失效被旧数据覆盖。
+超过压缩阈值的响应按 Accept-Encoding 压缩，压缩结果随条目缓存。
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+import hashlib
+import json
+import os
+import time
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from utils.compression import COMPRESSION_MIN_SIZE, choose_encoding, compress_bytes
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+
+
+@dataclass
+class CachedResponse:
+    """缓存的响应"""
+    body: bytes
+    etag: str
+    headers: dict = field(default_factory=dict)
+    media_type: str = "application/json"
+    expires_at: float = 0
+    # 编码 -> (压缩后的响应体, ETag)
+    encoded: dict = field(default_factory=dict)
+
+    def variant(self, encoding: Optional[str]) -> tuple:
+        """返回指定编码的响应体与 ETag，首次请求时压缩"""
+        if encoding is None or len(self.body) < COMPRESSION_MIN_SIZE:
+            return self.body, self.etag
+        if encoding not in self.encoded:
+            self.encoded[encoding] = (compress_bytes(self.body, encoding), f'{self.etag[:-1]}-{encoding}"')
+        return self.encoded[encoding]
+
+
+def make_etag(body: bytes) -> str:
+    """根据响应体生成强 ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def encode_json(content) -> bytes:
+    """将接口返回值序列化为 JSON 字节"""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def request_key(request: Request) -> tuple:
+    """以路径和查询参数作为缓存键"""
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+
+class ResponseCache:
+    """有界 LRU 缓存，条目按 TTL 过期，可按用户失效"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._user_keys: dict = {}
+        self._generations: dict = {}
+
+    def generation(self, user_id: Optional[str]) -> int:
+        """用户当前的失效代数，应在读取数据库之前获取并传给 set()"""
+        return self._generations.get(user_id, 0)
+
+    def get(self, user_id: Optional[str], key: tuple) -> Optional[CachedResponse]:
+        entry = self._entries.get((user_id, key))
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove((user_id, key))
+            return None
+        self._entries.move_to_end((user_id, key))
+        return entry
+
+    def set(
+        self,
+        user_id: Optional[str],
+        key: tuple,
+        body: bytes,
+        headers: Optional[dict] = None,
+        generation: Optional[int] = None
+    ) -> CachedResponse:
+        """生成缓存条目；generation 与当前失效代数不一致时只返回条目而不缓存"""
+        entry = CachedResponse(
+            body=body,
+            etag=make_etag(body),
+            headers=headers or {},
+            expires_at=time.monotonic() + self.ttl
+        )
+        if generation is not None and generation != self.generation(user_id):
+            return entry
+        full_key = (user_id, key)
+        self._entries[full_key] = entry
+        self._entries.move_to_end(full_key)
+        self._user_keys.setdefault(user_id, set()).add(full_key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """失效指定用户的缓存，以及不区分用户的汇总缓存"""
+        for owner in {user_id, None}:
+            self._generations[owner] = self._generations.get(owner, 0) + 1
+            for full_key in self._user_keys.pop(owner, set()):
+                self._entries.pop(full_key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._user_keys.clear()
+        for owner in self._generations:
+            self._generations[owner] += 1
+
+    def _remove(self, full_key: tuple):
+        self._entries.pop(full_key, None)
+        keys = self._user_keys.get(full_key[0])
+        if keys is not None:
+            keys.discard(full_key)
+            if not keys:
+                self._user_keys.pop(full_key[0], None)
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """返回缓存内容（按需压缩）；客户端 ETag 匹配时返回 304"""
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    body, etag = entry.variant(encoding)
+    headers = {**entry.headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    if body is not entry.body:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=entry.media_type, headers=headers)
@@ -0,0 +1,102 @@
+"""响应压缩（gzip / zstd）
+
+根据 Accept-Encoding 协商编码：流式导出逐块压缩并刷新，客户端可边下边解压；
+普通 JSON 响应超过 COMPRESSION_MIN_SIZE 字节时整体压缩。
+"""
+from typing import AsyncIterator, Optional
+import os
+import zlib
+
+import zstandard
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
+# 服务端偏好顺序（q 值相同时优先 zstd）
+SUPPORTED_ENCODINGS = ("zstd", "gzip")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """从 Accept-Encoding 中选择编码，不支持压缩时返回 None"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = [(weights.get(name, wildcard), name) for name in SUPPORTED_ENCODINGS]
+    q, name = max(candidates, key=lambda item: (item[0], -SUPPORTED_ENCODINGS.index(item[1])))
+    return name if q > 0 else None
+
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def make_compressor(encoding: str, level: Optional[int] = None):
+    """创建流式压缩器：compress() 压缩并刷新一块，finish() 结束压缩流"""
+    if encoding == "gzip":
+        return _GzipCompressor(COMPRESSION_GZIP_LEVEL if level is None else level)
+    if encoding == "zstd":
+        return _ZstdCompressor(COMPRESSION_ZSTD_LEVEL if level is None else level)
+    raise ValueError(f"不支持的压缩编码: {encoding}")
+
+
+def compress_bytes(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """整体压缩"""
+    compressor = make_compressor(encoding, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+async def compress_stream(chunks: AsyncIterator, encoding: str) -> AsyncIterator[bytes]:
+    """逐块压缩流式响应体，每块压缩后立即刷新输出"""
+    compressor = make_compressor(encoding)
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if chunk:
+            yield compressor.compress(chunk)
+    yield compressor.finish()
+
+
+def compress_streaming_response(request: Request, response: StreamingResponse) -> StreamingResponse:
+    """按请求的 Accept-Encoding 压缩流式响应，不支持压缩时原样返回"""
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return response
+    response.body_iterator = compress_stream(response.body_iterator, encoding)
+    response.headers["Content-Encoding"] = encoding
+    if "content-length" in response.headers:
+        del response.headers["content-length"]
+    return response
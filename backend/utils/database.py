@@ -3,6 +3,9 @@ from typing import Optional
 import os
 from dotenv import load_dotenv
 
+from utils.indexes import ensure_indexes
+from utils.exercise_storage import ensure_exercise_storage
+
 load_dotenv()
 
 
@@ -19,6 +22,8 @@ class Database:
         
         cls.client = AsyncIOMotorClient(mongodb_url)
         cls.database = cls.client[db_name]
+        await ensure_exercise_storage(cls.database)
+        await ensure_indexes(cls.database)
         print(f"✅ 已连接到MongoDB: {mongodb_url}/{db_name}")
 
     @classmethod
@@ -0,0 +1,71 @@
+"""图表序列降采样
+
+使用 LTTB（Largest-Triangle-Three-Buckets）保留序列形状，
+多条序列共用同一组下标，保证与 dates 对齐。
+"""
+from typing import List, Optional
+
+from utils.statistics import STAT_FIELDS
+
+
+def lttb_indices(values: List[Optional[float]], threshold: int) -> List[int]:
+    """返回 LTTB 选中的下标（跳过空值）"""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if threshold <= 0 or len(points) <= threshold:
+        return [i for i, _ in points]
+    if threshold < 3:
+        return [points[0][0], points[-1][0]][:threshold]
+
+    selected = [points[0][0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # 下一个桶的平均点
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        # 选出与前一选中点、下一桶平均点构成最大三角形的点
+        ax, ay = points[a]
+        best_area = -1
+        best = start
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        selected.append(points[best][0])
+        a = best
+
+    selected.append(points[-1][0])
+    return selected
+
+
+def downsample_statistics(stats: dict, max_points: int) -> dict:
+    """将统计结果的各条序列降采样到不超过 max_points 个点"""
+    dates = stats.get("dates", [])
+    if max_points <= 0 or len(dates) <= max_points:
+        return stats
+
+    series_names = [name for name in STAT_FIELDS if stats.get(name, {}).get("data")]
+    if not series_names:
+        return stats
+
+    per_series = max(max_points // len(series_names), 2)
+    indices = set()
+    for name in series_names:
+        indices.update(lttb_indices(stats[name]["data"], per_series))
+    indices = sorted(indices)
+
+    result = dict(stats)
+    for name in series_names:
+        data = stats[name]["data"]
+        result[name] = {**stats[name], "data": [data[i] for i in indices]}
+    result["dates"] = [dates[i] for i in indices]
+    return result
@@ -0,0 +1,109 @@
+"""运动数据存储布局
+
+EXERCISE_STORAGE=document（默认）：沿用普通集合 exercise；
+EXERCISE_STORAGE=timeseries：使用 MongoDB 时序集合 exercise_ts
+（timeField=timestamp，metaField=userId，需要 MongoDB 5.0+）。
+
+所有读写路径通过 EXERCISE_COLLECTION 访问运动数据，切换布局对接口透明。
+已有数据迁移：
+    python -m utils.exercise_storage migrate [--batch-size 1000]
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid
+import os
+
+DOCUMENT_COLLECTION = "exercise"
+TIMESERIES_COLLECTION = "exercise_ts"
+
+EXERCISE_STORAGE = os.getenv("EXERCISE_STORAGE", "document").lower()
+TIMESERIES_GRANULARITY = os.getenv("EXERCISE_TIMESERIES_GRANULARITY", "hours")
+
+EXERCISE_COLLECTION = TIMESERIES_COLLECTION if EXERCISE_STORAGE == "timeseries" else DOCUMENT_COLLECTION
+
+# 时序集合的二级索引（时序集合不支持唯一索引；含 _id 的索引需要 MongoDB 6.0+）
+# 与普通集合的索引一致，_id 用于同一时间戳内的游标分页排序
+TIMESERIES_INDEXES = [
+    IndexModel([("userId", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="userId_timestamp"),
+    IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp"),
+]
+
+
+async def ensure_timeseries_collection(database):
+    """创建时序集合（已存在时跳过）"""
+    try:
+        await database.create_collection(
+            TIMESERIES_COLLECTION,
+            timeseries={
+                "timeField": "timestamp",
+                "metaField": "userId",
+                "granularity": TIMESERIES_GRANULARITY
+            }
+        )
+    except CollectionInvalid:
+        pass
+    await database[TIMESERIES_COLLECTION].create_indexes(TIMESERIES_INDEXES)
+
+
+async def ensure_exercise_storage(database):
+    """按配置准备运动数据存储"""
+    if EXERCISE_COLLECTION == TIMESERIES_COLLECTION:
+        await ensure_timeseries_collection(database)
+
+
+async def migrate(database, batch_size: int = 1000) -> int:
+    """将 exercise 中的数据复制到时序集合，返回复制的文档数
+
+    按 (timestamp, _id) 顺序复制，从目标中最后一条已迁移数据之后继续（走 timestamp 索引，
+    无需扫描时序集合），中断后可重复执行。缺少 timestamp 的旧数据先在源集合中补齐为
+    _id 的生成时间（与读取时的回退值相同），使其参与同一顺序。
+    """
+    await ensure_timeseries_collection(database)
+    source = database[DOCUMENT_COLLECTION]
+    target = database[TIMESERIES_COLLECTION]
+
+    await source.update_many(
+        {"timestamp": None},
+        [{"$set": {"timestamp": {"$toDate": "$_id"}}}]
+    )
+
+    query = {}
+    last = await target.find_one({}, {"timestamp": 1, "_id": 1}, sort=[("timestamp", -1), ("_id", -1)])
+    if last:
+        query["$or"] = [
+            {"timestamp": {"$gt": last["timestamp"]}},
+            {"timestamp": last["timestamp"], "_id": {"$gt": last["_id"]}},
+        ]
+
+    count = 0
+    batch = []
+    async for doc in source.find(query).sort([("timestamp", 1), ("_id", 1)]):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await target.insert_many(batch, ordered=True)
+            count += len(batch)
+            batch = []
+    if batch:
+        await target.insert_many(batch, ordered=True)
+        count += len(batch)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from utils.database import Database
+
+    parser = argparse.ArgumentParser(description="运动数据存储迁移工具")
+    parser.add_argument("command", choices=["migrate"], help="migrate: 复制 exercise 数据到时序集合")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    async def main():
+        await Database.connect()
+        try:
+            count = await migrate(Database.database, args.batch_size)
+            print(f"✅ 已迁移运动数据 {count} 条到 {TIMESERIES_COLLECTION}")
+        finally:
+            await Database.disconnect()
+
+    asyncio.run(main())
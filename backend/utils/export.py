@@ -1,10 +1,15 @@
-from fastapi.responses import StreamingResponse, Response
-from typing import List, Optional
-from datetime import datetime
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from concurrent.futures import ProcessPoolExecutor
 from bson import ObjectId
+import asyncio
 import csv
 import io
-import json
+import multiprocessing
+import os
+import tempfile
+import aiofiles
+import orjson
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -13,55 +18,137 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
+# 流式导出时每块的行数
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+# 请求可指定的最大块行数（每块的行在内存中整批格式化）
+EXPORT_MAX_CHUNK_SIZE = int(os.getenv("EXPORT_MAX_CHUNK_SIZE", 10000))
+
+# JSON导出格式 -> (媒体类型, 文件扩展名)
+JSON_EXPORT_FORMATS = {
+    "json": ("application/json", ".json"),
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+}
+
+# PDF渲染进程数与每个表格块的行数
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 2))
+PDF_ROWS_PER_TABLE = int(os.getenv("PDF_ROWS_PER_TABLE", 500))
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+
 # 注册中文字体（需要字体文件，这里使用默认字体）
 # pdfmetrics.registerFont(TTFont('SimHei', 'SimHei.ttf'))
 
 
-async def export_to_csv(data: List[dict], filename: str = "data.csv") -> StreamingResponse:
-    """导出数据为CSV格式"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    if not data:
-        writer.writerow(["暂无数据"])
-    else:
-        # 写入表头
-        headers = list(data[0].keys())
+async def export_to_csv(
+    headers: List[str],
+    batches: AsyncIterator[List[tuple]],
+    filename: str = "data.csv"
+) -> StreamingResponse:
+    """导出数据为CSV格式（每批行写入后立即输出）"""
+    async def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
         writer.writerow(headers)
+        empty = True
         
-        # 写入数据
-        for row in data:
-            writer.writerow([row.get(header, "") for header in headers])
-    
-    output.seek(0)
+        async for rows in batches:
+            writer.writerows(rows)
+            empty = empty and not rows
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+        
+        if empty:
+            writer.writerow(["暂无数据"])
+        if output.tell():
+            yield output.getvalue()
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        generate(),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
-async def export_to_json(data: List[dict], filename: str = "data.json") -> Response:
-    """导出数据为JSON格式"""
-    json_data = json.dumps(data, ensure_ascii=False, indent=2, default=str)
+def _json_default(value):
+    """orjson 未内置支持的类型"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps_json(value, pretty: bool = False) -> bytes:
+    """使用 orjson 序列化（原生支持 datetime，ObjectId 转为字符串）"""
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(value, default=_json_default, option=option)
+
+
+async def export_to_json(
+    batches: AsyncIterator[List[dict]],
+    filename: str = "data",
+    format: str = "json",
+    pretty: bool = False
+) -> StreamingResponse:
+    """导出数据为JSON数组或NDJSON格式（每批文档序列化后立即输出）"""
+    media_type, extension = JSON_EXPORT_FORMATS[format]
+    ndjson = format == "ndjson"
     
-    return Response(
-        content=json_data,
-        media_type="application/json",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    async def generate():
+        parts = [] if ndjson else [b"[\n" if pretty else b"["]
+        separator = b"\n" if ndjson else (b",\n" if pretty else b",")
+        first = True
+        
+        async for docs in batches:
+            for doc in docs:
+                if not first and not ndjson:
+                    parts.append(separator)
+                parts.append(dumps_json(doc, pretty and not ndjson))
+                if ndjson:
+                    parts.append(separator)
+                first = False
+            if parts:
+                yield b"".join(parts)
+                parts = []
+        
+        if not ndjson:
+            parts.append(b"\n]" if pretty and not first else b"]")
+        if parts:
+            yield b"".join(parts)
+    
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}{extension}"}
     )
 
 
-async def export_to_pdf(data: List[dict], title: str = "数据导出", filename: str = "data.pdf") -> StreamingResponse:
-    """导出数据为PDF格式"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    
-    # 样式
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """PDF渲染进程池（首次使用时创建）"""
+    global _pdf_executor
+    if _pdf_executor is None:
+        # spawn：API 进程中有运行中的事件循环与 Motor 线程，fork 出的子进程状态不可靠
+        _pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_executor
+
+
+def shutdown_pdf_executor(wait: bool = False):
+    """关闭PDF渲染进程池"""
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown(wait=wait, cancel_futures=True)
+        _pdf_executor = None
+
+
+async def _render_in_pool(func, *args):
+    """在进程池中渲染PDF，避免阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pdf_executor(), func, *args)
+
+
+def _title_style(styles) -> ParagraphStyle:
+    return ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
         fontSize=18,
@@ -69,68 +156,166 @@ async def export_to_pdf(data: List[dict], title: str = "数据导出", filename:
         spaceAfter=30,
         alignment=1  # 居中
     )
+
+
+_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+])
+
+
+class _LazyStory(list):
+    """按需从生成器补充的 story
+
+    ReportLab 的 build 只从列表头部逐个取出并删除 flowable，
+    这里始终只缓冲少量元素，删除后再从生成器补充，内存中不会同时存在全部表格。
+    """
+
+    def __init__(self, flowables, source, lookahead: int = 2):
+        super().__init__(flowables)
+        self._source = source
+        self._lookahead = lookahead
+        self._fill()
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._fill()
+
+
+def _read_spool(path: str):
+    """逐行读取 CSV 暂存文件"""
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.reader(f)
+
+
+def _iter_tables(headers: List[str], rows, rows_per_table: int):
+    """按块惰性生成表格，每块重复表头，跨页时同样重复表头"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= rows_per_table:
+            yield _make_table(headers, chunk)
+            chunk = []
+    if chunk:
+        yield _make_table(headers, chunk)
+
+
+def _make_table(headers: List[str], rows: List[list]) -> Table:
+    table = Table([headers] + rows, repeatRows=1)
+    table.setStyle(_TABLE_STYLE)
+    return table
+
+
+def render_table_pdf(
+    title: str,
+    headers: List[str],
+    spool_path: str,
+    output_path: str,
+    rows_per_table: int = PDF_ROWS_PER_TABLE
+) -> str:
+    """从 CSV 暂存文件渲染表格PDF到 output_path（在工作进程中执行）
+
+    行数据与表格均按块读取和生成，内存占用与总行数无关。
+    """
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    styles = getSampleStyleSheet()
     
     # 标题
-    story.append(Paragraph(title, title_style))
-    story.append(Spacer(1, 0.2 * inch))
-    
-    if not data:
+    story = [Paragraph(title, _title_style(styles)), Spacer(1, 0.2 * inch)]
+    tables = _iter_tables(headers, _read_spool(spool_path), rows_per_table)
+    first = next(tables, None)
+    if first is None:
         story.append(Paragraph("暂无数据", styles['Normal']))
     else:
-        # 准备表格数据
-        headers = list(data[0].keys())
-        table_data = [headers]
-        
-        for row in data:
-            table_data.append([str(row.get(header, "")) for header in headers])
-        
-        # 创建表格
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ]))
-        
-        story.append(table)
+        story.append(first)
     
     # 生成PDF
-    doc.build(story)
-    buffer.seek(0)
+    doc.build(_LazyStory(story, tables))
+    return output_path
+
+
+def _temp_path(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def _iter_file_and_remove(path: str, chunk_size: int = 64 * 1024):
+    """分块读取文件，读完（或客户端断开）后删除"""
+    try:
+        async with aiofiles.open(path, "rb") as f:
+            while chunk := await f.read(chunk_size):
+                yield chunk
+    finally:
+        _remove(path)
+
+
+async def export_to_pdf(
+    headers: List[str],
+    batches: AsyncIterator[List[tuple]],
+    title: str = "数据导出",
+    filename: str = "data.pdf"
+) -> StreamingResponse:
+    """导出数据为PDF格式
+
+    行数据按批写入临时 CSV 暂存文件，渲染进程从中逐块读取并生成表格，
+    PDF 写入临时文件后分块输出，API 进程与渲染进程都不持有全部行。
+    """
+    spool_path = _temp_path(".csv")
+    output_path = _temp_path(".pdf")
+    try:
+        async with aiofiles.open(spool_path, "w", newline="", encoding="utf-8") as f:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            async for rows in batches:
+                writer.writerows(rows)
+                await f.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        await _render_in_pool(render_table_pdf, title, headers, spool_path, output_path)
+    except BaseException:
+        _remove(output_path)
+        raise
+    finally:
+        _remove(spool_path)
     
     return StreamingResponse(
-        iter([buffer.getvalue()]),
+        _iter_file_and_remove(output_path),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
-async def export_training_plan_to_pdf(plan_data: dict, filename: str = "training_plan.pdf") -> StreamingResponse:
-    """导出训练计划为PDF格式"""
+def render_training_plan_pdf(plan_data: dict) -> bytes:
+    """渲染训练计划PDF（在工作进程中执行）"""
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
-    
-    # 样式
     styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=30,
-        alignment=1
-    )
     
     # 标题
     title = plan_data.get("title", "训练计划")
-    story.append(Paragraph(title, title_style))
+    story.append(Paragraph(title, _title_style(styles)))
     story.append(Spacer(1, 0.2 * inch))
     
     # 计划信息
@@ -164,11 +349,20 @@ async def export_training_plan_to_pdf(plan_data: dict, filename: str = "training
     
     # 生成PDF
     doc.build(story)
-    buffer.seek(0)
+    return buffer.getvalue()
+
+
+async def render_training_plan(plan_data: dict) -> bytes:
+    """在进程池中渲染训练计划PDF"""
+    return await _render_in_pool(render_training_plan_pdf, plan_data)
+
+
+async def export_training_plan_to_pdf(plan_data: dict, filename: str = "training_plan.pdf") -> StreamingResponse:
+    """导出训练计划为PDF格式"""
+    content = await render_training_plan(plan_data)
     
     return StreamingResponse(
-        iter([buffer.getvalue()]),
+        iter([content]),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
-
@@ -0,0 +1,165 @@
+"""导出字段定义
+
+所有导出格式共用的列定义。每列在创建 ExportSchema 时编译为取值函数，
+之后按游标批次整批转换，新增导出列只需在对应列表中添加一行。
+"""
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional
+
+
+def format_datetime(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+class ExportColumn:
+    """导出列：列名、文档字段路径、缺失值、转换函数与列式导出类型"""
+    __slots__ = ("name", "path", "default", "convert", "type")
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        default=None,
+        convert: Optional[Callable] = None,
+        type: str = "string"
+    ):
+        self.name = name
+        self.path = path
+        self.default = default
+        self.convert = convert
+        self.type = type
+
+
+def _timestamp(doc: dict) -> datetime:
+    """运动时间，缺失时使用 _id 的生成时间"""
+    timestamp = doc.get("timestamp")
+    if timestamp is None:
+        return doc["_id"].generation_time.replace(tzinfo=None)
+    return timestamp
+
+
+def compile_column(column: ExportColumn) -> Callable[[dict], object]:
+    """将列编译为取值函数"""
+    default = column.default
+    convert = column.convert
+
+    if column.path == "timestamp":
+        getter = _timestamp
+    elif "." not in column.path:
+        key = column.path
+
+        def getter(doc):
+            return doc.get(key)
+    else:
+        *parents, leaf = column.path.split(".")
+
+        def getter(doc):
+            for parent in parents:
+                doc = doc.get(parent)
+                if not isinstance(doc, dict):
+                    return None
+            return doc.get(leaf)
+
+    if convert is None:
+        def extract(doc):
+            value = getter(doc)
+            return default if value is None else value
+    else:
+        def extract(doc):
+            value = getter(doc)
+            return default if value is None else convert(value)
+    return extract
+
+
+class ExportSchema:
+    """一组导出列及其编译后的取值函数"""
+
+    def __init__(self, columns: List[ExportColumn]):
+        self.columns = columns
+        self.headers = [column.name for column in columns]
+        self.fields = [column.path for column in columns]
+        self._extractors = [compile_column(column) for column in columns]
+
+    def projection(self) -> dict:
+        """所需字段对应的 MongoDB 投影（_id 用于时间戳回退）"""
+        return {field: 1 for field in self.fields}
+
+    def select(self, names: List[str]) -> "ExportSchema":
+        """按列名裁剪，存在未知列时抛出 ValueError"""
+        by_name = {column.name: column for column in self.columns}
+        unknown = [name for name in names if name not in by_name]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+        return ExportSchema([by_name[name] for name in names])
+
+    def column_values(self, docs: List[dict]) -> List[list]:
+        """按列批量取值"""
+        return [[extract(doc) for doc in docs] for extract in self._extractors]
+
+    def format_batch(self, docs: List[dict]) -> List[tuple]:
+        """按行批量取值"""
+        return list(zip(*self.column_values(docs))) if docs else []
+
+
+async def iter_batches(cursor, batch_size: int) -> AsyncIterator[List[dict]]:
+    """按批次读取游标"""
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def normalize_documents(docs: List[dict]) -> List[dict]:
+    """完整文档导出（JSON）：_id 改为 id，补全时间戳"""
+    for doc in docs:
+        doc["timestamp"] = _timestamp(doc)
+        doc["id"] = doc.pop("_id")
+    return docs
+
+
+# 表格导出（CSV、PDF）
+TABLE_EXPORT_SCHEMA = ExportSchema([
+    ExportColumn("日期", "timestamp", convert=format_datetime),
+    ExportColumn("用户ID", "userId", default=""),
+    ExportColumn("心率(bpm)", "bandData.heartRate", default=""),
+    ExportColumn("配速(min/km)", "bandData.pace", default=""),
+    ExportColumn("卡路里(kcal)", "bandData.calories", default=""),
+    ExportColumn("速度(km/h)", "treadmillData.speed", default=""),
+    ExportColumn("距离(km)", "treadmillData.distance", default=""),
+    ExportColumn("时长(分钟)", "treadmillData.duration", default=""),
+    ExportColumn("身高(cm)", "basicInfo.height", default=""),
+    ExportColumn("体重(kg)", "basicInfo.weight", default=""),
+    ExportColumn("体脂率(%)", "basicInfo.bodyFat", default=""),
+])
+
+# 列式导出（Parquet、Arrow），嵌套字段展开为带类型的列
+COLUMNAR_EXPORT_SCHEMA = ExportSchema([
+    ExportColumn("id", "_id", convert=str),
+    ExportColumn("userId", "userId"),
+    ExportColumn("timestamp", "timestamp", type="timestamp"),
+    ExportColumn("basicInfo_gender", "basicInfo.gender"),
+    ExportColumn("basicInfo_age", "basicInfo.age", type="int32"),
+    ExportColumn("basicInfo_height", "basicInfo.height", type="float64"),
+    ExportColumn("basicInfo_weight", "basicInfo.weight", type="float64"),
+    ExportColumn("basicInfo_bodyFat", "basicInfo.bodyFat", type="float64"),
+    ExportColumn("basicInfo_muscleMass", "basicInfo.muscleMass", type="float64"),
+    ExportColumn("basicInfo_waterContent", "basicInfo.waterContent", type="float64"),
+    ExportColumn("bandData_heartRate", "bandData.heartRate", type="int32"),
+    ExportColumn("bandData_pace", "bandData.pace", type="float64"),
+    ExportColumn("bandData_trainingLoad", "bandData.trainingLoad", type="int32"),
+    ExportColumn("bandData_calories", "bandData.calories", type="int32"),
+    ExportColumn("bandData_sleep_duration", "bandData.sleep.duration", type="float64"),
+    ExportColumn("bandData_sleep_deepSleep", "bandData.sleep.deepSleep", type="float64"),
+    ExportColumn("bandData_sleep_lightSleep", "bandData.sleep.lightSleep", type="float64"),
+    ExportColumn("bandData_sleep_remSleep", "bandData.sleep.remSleep", type="float64"),
+    ExportColumn("treadmillData_speed", "treadmillData.speed", type="float64"),
+    ExportColumn("treadmillData_incline", "treadmillData.incline", type="float64"),
+    ExportColumn("treadmillData_duration", "treadmillData.duration", type="int32"),
+    ExportColumn("treadmillData_distance", "treadmillData.distance", type="float64"),
+])
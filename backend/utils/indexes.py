@@ -0,0 +1,159 @@
+"""MongoDB 索引注册表
+
+启动时由 Database.connect 幂等创建；热点查询的执行计划可通过以下命令检查：
+    python -m utils.indexes verify
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from datetime import datetime
+from bson import ObjectId
+
+from utils.exercise_storage import EXERCISE_COLLECTION
+
+
+def _unique_if_present(field: str) -> IndexModel:
+    """唯一索引，仅约束已填写的字段（未绑定时为 None）
+
+    使用 $gt: "" 而非 $type，使按字符串等值查询时能够命中该部分索引。
+    """
+    return IndexModel(
+        [(field, ASCENDING)],
+        name=f"{field}_unique",
+        unique=True,
+        partialFilterExpression={field: {"$gt": ""}}
+    )
+
+
+# 集合 -> 索引定义
+INDEXES = {
+    "exercise": [
+        IndexModel([("userId", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="userId_timestamp"),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp"),
+    ],
+    "users": [
+        _unique_if_present("phone"),
+        _unique_if_present("email"),
+        _unique_if_present("wechat_openid"),
+    ],
+    "videos": [
+        IndexModel([("user_id", ASCENDING), ("uploaded_at", DESCENDING)], name="user_id_uploaded_at"),
+    ],
+    "training_plans": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_created_at"),
+    ],
+    "export_jobs": [
+        IndexModel(
+            [("user_id", ASCENDING), ("dedupe_key", ASCENDING)],
+            name="user_id_dedupe_key",
+            unique=True,
+            partialFilterExpression={"dedupe_key": {"$exists": True}}
+        ),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "upload_sessions": [
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "analysis_jobs": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        IndexModel([("video_id", ASCENDING), ("status", ASCENDING)], name="video_id_status"),
+        # 每个视频最多一个未完成（pending/processing）的任务
+        IndexModel(
+            [("video_id", ASCENDING)],
+            name="video_id_active",
+            unique=True,
+            partialFilterExpression={"active": {"$exists": True}}
+        ),
+    ],
+    "video_keypoints": [
+        IndexModel([("video_id", ASCENDING), ("job_id", ASCENDING), ("start", ASCENDING)], name="video_id_job_id_start"),
+    ],
+    "user_stats": [
+        IndexModel([("userId", ASCENDING), ("period", ASCENDING), ("bucket", ASCENDING)], name="userId_period_bucket", unique=True),
+    ],
+}
+
+# 热点查询：(集合, 查询条件, 排序)
+HOT_QUERIES = [
+    (EXERCISE_COLLECTION, {"userId": "_"}, [("timestamp", DESCENDING)]),
+    (EXERCISE_COLLECTION, {"userId": "_", "timestamp": {"$gte": datetime(1970, 1, 1)}}, [("timestamp", ASCENDING)]),
+    (EXERCISE_COLLECTION, {}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    (EXERCISE_COLLECTION, {"$and": [
+        {"userId": "_"},
+        {"timestamp": {"$gte": datetime(1970, 1, 1)}},
+        {"$or": [
+            {"timestamp": {"$gt": datetime(1970, 1, 1)}},
+            {"timestamp": datetime(1970, 1, 1), "_id": {"$gt": ObjectId("000000000000000000000000")}}
+        ]}
+    ]}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    ("videos", {"user_id": "_"}, [("uploaded_at", DESCENDING)]),
+    ("training_plans", {"user_id": "_"}, [("created_at", DESCENDING)]),
+    ("users", {"phone": "_"}, None),
+    ("users", {"email": "_"}, None),
+    ("users", {"wechat_openid": "_"}, None),
+    ("user_stats", {"userId": "_", "period": "day"}, [("bucket", ASCENDING)]),
+]
+
+
+async def ensure_indexes(database):
+    """按注册表创建索引（已存在时跳过）"""
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await database[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            print(f"⚠️ 创建索引失败 {collection_name}: {e}")
+
+
+def _plan_stages(plan: dict) -> list:
+    """递归收集执行计划中的所有阶段"""
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def verify_indexes(database) -> list:
+    """对热点查询执行 explain()，返回未走索引的查询"""
+    problems = []
+    for collection_name, query, sort in HOT_QUERIES:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        if "COLLSCAN" in stages or "SORT" in stages:
+            problems.append({"collection": collection_name, "query": query, "sort": sort, "stages": stages})
+    return problems
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from utils.database import Database
+
+    parser = argparse.ArgumentParser(description="索引管理工具")
+    parser.add_argument("command", choices=["ensure", "verify"], help="ensure: 创建索引；verify: 检查热点查询执行计划")
+    args = parser.parse_args()
+
+    async def main():
+        await Database.connect()
+        try:
+            if args.command == "ensure":
+                await ensure_indexes(Database.database)
+                print("✅ 索引已创建")
+                return
+            problems = await verify_indexes(Database.database)
+            for problem in problems:
+                print(f"❌ {problem['collection']} {problem['query']} sort={problem['sort']} -> {problem['stages']}")
+            if problems:
+                raise SystemExit(1)
+            print("✅ 所有热点查询均使用索引")
+        finally:
+            await Database.disconnect()
+
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""运动数据批量写入
+
+支持 JSON 数组与 NDJSON 两种请求体，按块校验后使用无序 insert_many 写入，
+返回每条记录的 ID 或错误信息，不再回读数据库。
+"""
+from datetime import datetime
+from typing import AsyncIterator, List, Tuple
+import json
+import os
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from models.exercise import ExerciseDataCreate
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 500))
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+NDJSON_MAX_LINE_BYTES = int(os.getenv("NDJSON_MAX_LINE_BYTES", 1024 * 1024))  # 单条记录的最大字节数
+
+
+class LineTooLong(ValueError):
+    """NDJSON 单行超过 NDJSON_MAX_LINE_BYTES"""
+
+    def __init__(self, index: int, limit: int):
+        super().__init__(f"第 {index} 条记录超过 {limit} 字节")
+        self.index = index
+
+
+def _parse_line(index: int, line: bytes) -> Tuple[int, object]:
+    """解析一行；JSON 格式错误与非 UTF-8 编码（均为 ValueError）作为该条记录的错误返回"""
+    try:
+        return index, json.loads(line)
+    except ValueError as e:
+        return index, e
+
+
+async def iter_ndjson(
+    stream: AsyncIterator[bytes],
+    max_line_bytes: int = NDJSON_MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, object]]:
+    """逐行解析 NDJSON 请求体，返回 (序号, 对象或异常)
+
+    只在新到达的数据块中查找换行，未完成的行累积在 bytearray 中，耗时与请求体大小成线性；
+    单行超过 max_line_bytes 时抛出 LineTooLong。
+    """
+    buffer = bytearray()
+    index = 0
+    async for chunk in stream:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            if len(buffer) + end - start > max_line_bytes:
+                raise LineTooLong(index, max_line_bytes)
+            if buffer:
+                buffer += chunk[start:end]
+                line = bytes(buffer)
+                buffer.clear()
+            else:
+                line = chunk[start:end]
+            start = end + 1
+            if line.strip():
+                yield _parse_line(index, line)
+                index += 1
+        buffer += chunk[start:]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLong(index, max_line_bytes)
+    if buffer.strip():
+        yield _parse_line(index, bytes(buffer))
+
+
+def iter_json_array(body: bytes) -> AsyncIterator[Tuple[int, object]]:
+    """解析 JSON 数组请求体，格式错误时立即抛出 ValueError"""
+    items = json.loads(body)
+    if not isinstance(items, list):
+        raise ValueError("请求体必须是JSON数组")
+
+    async def generate():
+        for index, item in enumerate(items):
+            yield index, item
+
+    return generate()
+
+
+def _validate(index: int, item: object, now: datetime) -> Tuple[dict, dict]:
+    """校验单条记录，返回 (待写入文档, 错误)"""
+    if isinstance(item, Exception):
+        return None, {"index": index, "error": f"JSON解析失败: {item}"}
+    if not isinstance(item, dict):
+        return None, {"index": index, "error": "记录必须是JSON对象"}
+    try:
+        doc = ExerciseDataCreate(**item).dict()
+    except ValidationError as e:
+        return None, {"index": index, "error": str(e)}
+    doc["timestamp"] = now
+    return doc, None
+
+
+async def insert_chunk(collection, chunk: List[Tuple[int, object]]) -> Tuple[List[dict], List[dict]]:
+    """校验并写入一个数据块，返回 (结果列表, 成功写入的文档)"""
+    now = datetime.now()
+    results = []
+    docs = []
+    indexes = []
+    for index, item in chunk:
+        doc, error = _validate(index, item, now)
+        if error:
+            results.append(error)
+        else:
+            docs.append(doc)
+            indexes.append(index)
+
+    if not docs:
+        return results, []
+
+    failed = {}
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            failed[write_error["index"]] = write_error.get("errmsg", "写入失败")
+
+    inserted = []
+    for position, (index, doc) in enumerate(zip(indexes, docs)):
+        if position in failed:
+            results.append({"index": index, "error": failed[position]})
+        else:
+            results.append({"index": index, "id": str(doc["_id"])})
+            inserted.append(doc)
+    return results, inserted
+
+
+async def ingest(collection, items: AsyncIterator[Tuple[int, object]], on_inserted=None) -> dict:
+    """按块写入运动数据，on_inserted 在每块写入成功后回调"""
+    results = []
+    inserted_count = 0
+    chunk = []
+
+    async def flush():
+        nonlocal inserted_count
+        chunk_results, inserted = await insert_chunk(collection, chunk)
+        results.extend(chunk_results)
+        inserted_count += len(inserted)
+        if inserted and on_inserted:
+            await on_inserted(inserted)
+
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= INGEST_CHUNK_SIZE:
+            await flush()
+            chunk = []
+    if chunk:
+        await flush()
+
+    results.sort(key=lambda r: r["index"])
+    return {
+        "inserted": inserted_count,
+        "failed": len(results) - inserted_count,
+        "results": results
+    }
@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+import base64
+import json
+
+
+def encode_cursor(timestamp: Optional[datetime], doc_id: ObjectId) -> str:
+    """将 (timestamp, _id) 编码为不透明游标
+
+    timestamp 为库中保存的原值，缺失时为 None（排序时位于所有有时间戳的文档之前/之后），
+    不能用 _id 生成时间代替，否则与按存储字段过滤的条件不一致。
+    """
+    payload = json.dumps(
+        {"t": timestamp.isoformat() if timestamp is not None else None, "id": str(doc_id)},
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """解码游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = datetime.fromisoformat(payload["t"]) if payload["t"] is not None else None
+        return timestamp, ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def keyset_filter(cursor: str) -> dict:
+    """按 (timestamp, _id) 倒序翻页时，位于游标之后的查询条件
+
+    倒序时缺少 timestamp 的文档排在最后。
+    """
+    timestamp, doc_id = decode_cursor(cursor)
+    if timestamp is None:
+        return {"timestamp": None, "_id": {"$lt": doc_id}}
+    return {"$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": doc_id}},
+        {"timestamp": None}
+    ]}
+
+
+def next_cursor(docs: list, limit: int) -> Optional[str]:
+    """根据本页最后一条文档（库中原值）生成下一页游标，不足一页时返回 None"""
+    if len(docs) < limit or not docs:
+        return None
+    last = docs[-1]
+    return encode_cursor(last.get("timestamp"), last["_id"])
+
+
+def keyset_after(cursor: str) -> dict:
+    """增量读取时，位于游标之后（更新）的查询条件
+
+    正序时缺少 timestamp 的文档排在最前。
+    """
+    timestamp, doc_id = decode_cursor(cursor)
+    if timestamp is None:
+        return {"$or": [
+            {"timestamp": None, "_id": {"$gt": doc_id}},
+            {"timestamp": {"$ne": None}}
+        ]}
+    return {"$or": [
+        {"timestamp": {"$gt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$gt": doc_id}}
+    ]}
+
+
+def keyset_until(timestamp: datetime, doc_id: ObjectId) -> dict:
+    """不晚于 (timestamp, _id) 的查询条件（含该条）
+
+    正序时缺少 timestamp 的文档排在最前，因此总是包含在内。
+    """
+    return {"$or": [
+        {"timestamp": None},
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lte": doc_id}}
+    ]}
@@ -0,0 +1,113 @@
+"""训练计划PDF磁盘缓存
+
+以 plan_data 的规范化 JSON 哈希作为文件名（内容寻址），计划内容不变时
+重复下载直接读取已生成的文件；缓存总大小超过 PDF_CACHE_MAX_BYTES 时
+按最近访问时间淘汰。
+"""
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from utils.export import render_training_plan
+
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.dirname(backend_root), "data", "pdf_cache"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+
+# 渲染模板变化时递增，使旧缓存失效
+PDF_RENDER_VERSION = 1
+
+_rendering: Dict[str, asyncio.Future] = {}
+
+
+def plan_pdf_key(plan_data: dict) -> str:
+    """plan_data 的内容哈希"""
+    payload = json.dumps(
+        [PDF_RENDER_VERSION, plan_data],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(PDF_CACHE_DIR, f"{key}.pdf")
+
+
+def _touch(path: str):
+    """更新访问时间（保留修改时间，ETag 不变）"""
+    stat = os.stat(path)
+    os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+
+def evict(max_bytes: int = PDF_CACHE_MAX_BYTES, keep: Optional[str] = None) -> int:
+    """按访问时间从旧到新删除缓存文件（keep 除外），直到总大小不超过 max_bytes，返回删除数量"""
+    entries = []
+    total = 0
+    with os.scandir(PDF_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def _store(content: bytes, path: str):
+    temp_path = f"{path}.{os.getpid()}.part"
+    with open(temp_path, "wb") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    evict(keep=path)
+
+
+async def _render_to_cache(plan_data: dict, path: str):
+    content = await render_training_plan(plan_data)
+    # 写入与淘汰时的目录扫描在线程中执行，不阻塞事件循环
+    await asyncio.to_thread(_store, content, path)
+
+
+async def get_plan_pdf(plan_data: dict) -> str:
+    """返回训练计划PDF的缓存文件路径，未命中时渲染（同一内容并发请求只渲染一次）
+
+    返回的文件之后仍可能被其他请求的淘汰删除，打开时遇到 FileNotFoundError 应重新调用。
+    """
+    key = plan_pdf_key(plan_data)
+    path = _cache_path(key)
+    if os.path.exists(path):
+        try:
+            _touch(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+    future = _rendering.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_render_to_cache(plan_data, path))
+        _rendering[key] = future
+        future.add_done_callback(lambda _: _rendering.pop(key, None))
+    await asyncio.shield(future)
+    return path
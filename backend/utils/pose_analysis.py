@@ -0,0 +1,341 @@
+"""跑姿视频分析
+
+在分析工作进程中执行（见 app.analysis_jobs），通过 progress 回调报告 0-100 的进度。
+
+解码与推理重叠执行：解码线程按 POSE_FRAME_STRIDE 抽帧并预处理，放入有界队列；
+主线程每次取 POSE_BATCH_SIZE 帧整批推理（OpenCV 解码与 ONNX Runtime 推理都会释放 GIL）。
+结果中的 performance 记录解码、推理与整体吞吐（帧/秒），用于评估硬件配置。
+"""
+from typing import Callable, List, Optional
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.pose_models import KEYPOINT_NAMES, load_pose_model
+
+POSE_FRAME_STRIDE = int(os.getenv("POSE_FRAME_STRIDE", 2))  # 每隔几帧取一帧
+POSE_BATCH_SIZE = int(os.getenv("POSE_BATCH_SIZE", 8))
+POSE_MIN_SCORE = float(os.getenv("POSE_MIN_SCORE", 0.3))  # 关键点置信度下限
+POSE_MIN_FRAMES = 10  # 有效帧少于该数量时不评估
+
+NOSE, L_EAR, R_EAR = 0, 3, 4
+L_SHOULDER, R_SHOULDER, L_ELBOW, R_ELBOW, L_WRIST, R_WRIST = 5, 6, 7, 8, 9, 10
+L_HIP, R_HIP, L_KNEE, R_KNEE, L_ANKLE, R_ANKLE = 11, 12, 13, 14, 15, 16
+TORSO = [L_SHOULDER, R_SHOULDER, L_HIP, R_HIP]
+LEGS = [(L_HIP, L_KNEE, L_ANKLE), (R_HIP, R_KNEE, R_ANKLE)]
+
+# 上传时选择的拍摄角度 -> 评估使用的视角
+ANGLE_VIEWS = {"side": "side", "front": "frontal", "back": "frontal"}
+
+SUGGESTIONS = {
+    ("knee_alignment", "inward"): "落地时膝盖内扣，建议加强臀中肌力量训练",
+    ("knee_alignment", "outward"): "落地时膝盖外翻，注意膝盖与脚尖保持同一方向",
+    ("knee_alignment", "extended"): "落地时膝盖过直，着地时保持膝盖微屈以缓冲冲击",
+    ("foot_strike", "heel"): "脚跟着地且步幅过大，建议缩短步幅、适当增加步频",
+    ("arm_swing", "limited"): "摆臂幅度偏小，肩部放松、以肩为轴前后摆臂",
+    ("arm_swing", "excessive"): "摆臂幅度过大，注意保持手臂自然弯曲约90度",
+    ("arm_swing", "crossing"): "摆臂横向越过身体中线，手臂应前后摆动",
+    ("posture", "leaning_forward"): "上身前倾过多，注意保持身体直立、从脚踝轻微前倾",
+    ("posture", "leaning_back"): "上身后仰，注意核心收紧、身体略微前倾",
+}
+
+
+class _DecodeError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _decode_frames(capture, prepare, stride: int, frames: queue.Queue, stop: threading.Event, stats: dict):
+    """解码线程：跳过的帧只 grab 不转换，取样帧预处理后放入队列，结束时放入 None"""
+    try:
+        index = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            if index % stride:
+                if not capture.grab():
+                    break
+                item = None
+            else:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                item = (index, prepare(frame))
+            stats["decode_time"] += time.perf_counter() - started
+            index += 1
+            stats["frames_decoded"] = index
+            if item:
+                frames.put(item)
+    except BaseException as e:
+        frames.put(_DecodeError(e))
+    finally:
+        frames.put(None)
+
+
+def estimate_poses(
+    path: str,
+    model,
+    stride: int = POSE_FRAME_STRIDE,
+    batch_size: int = POSE_BATCH_SIZE,
+    progress: Optional[Callable[[float], None]] = None
+):
+    """抽帧并批量推理，返回 (帧号列表, (N, 17, 3) 归一化关键点, 视频信息, 性能统计)"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"无法读取视频：{os.path.basename(path)}")
+    video = {
+        "fps": capture.get(cv2.CAP_PROP_FPS) or 30.0,
+        "frame_count": int(capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    if model.max_batch:
+        batch_size = min(batch_size, model.max_batch)
+
+    frames = queue.Queue(maxsize=batch_size * 2)
+    stop = threading.Event()
+    stats = {"decode_time": 0.0, "frames_decoded": 0}
+    decoder = threading.Thread(target=_decode_frames, args=(capture, model.prepare, stride, frames, stop, stats), daemon=True)
+    started = time.perf_counter()
+    decoder.start()
+
+    indices, results = [], []
+    inference_time = 0.0
+    finished = False
+    try:
+        while not finished:
+            batch = []
+            while len(batch) < batch_size:
+                item = frames.get()
+                if item is None:
+                    finished = True
+                    break
+                if isinstance(item, _DecodeError):
+                    raise item.error
+                batch.append(item)
+            if not batch:
+                break
+            inference_started = time.perf_counter()
+            results.append(model.infer([prepared for _, prepared in batch]))
+            inference_time += time.perf_counter() - inference_started
+            indices.extend(index for index, _ in batch)
+            if progress and video["frame_count"]:
+                progress(min(99.0, 100.0 * (indices[-1] + 1) / video["frame_count"]))
+    finally:
+        stop.set()
+        # 解除解码线程在满队列上的阻塞
+        while decoder.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        capture.release()
+
+    elapsed = time.perf_counter() - started
+    analyzed = len(indices)
+    performance = {
+        "backend": model.name,
+        "stride": stride,
+        "batch_size": batch_size,
+        "frames_decoded": stats["frames_decoded"],
+        "frames_analyzed": analyzed,
+        "elapsed_s": round(elapsed, 3),
+        # 解码线程每秒读取的源视频帧数（含跳过的帧）
+        "decode_fps": round(stats["frames_decoded"] / stats["decode_time"], 1) if stats["decode_time"] else None,
+        "inference_fps": round(analyzed / inference_time, 1) if inference_time else None,
+        # 整体每秒分析的取样帧数，以及折合的源视频帧数
+        "throughput_fps": round(analyzed / elapsed, 1) if elapsed else None,
+        "video_fps_processed": round(stats["frames_decoded"] / elapsed, 1) if elapsed else None,
+    }
+    keypoints = np.concatenate(results) if results else np.zeros((0, len(KEYPOINT_NAMES), 3), dtype=np.float32)
+    return indices, keypoints, video, performance
+
+
+def _angle_from_vertical(top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    """bottom→top 向量与竖直向上方向的夹角（度，x 正方向为正）"""
+    dx = top[..., 0] - bottom[..., 0]
+    dy = bottom[..., 1] - top[..., 1]
+    return np.degrees(np.arctan2(dx, dy))
+
+
+def _joint_angle(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """b 点处 a-b-c 的夹角（度）"""
+    v1, v2 = a[..., :2] - b[..., :2], c[..., :2] - b[..., :2]
+    cos = (v1 * v2).sum(-1) / (np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1) + 1e-9)
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+
+def _visible(points: np.ndarray, joints: List[int]) -> np.ndarray:
+    return (points[:, joints, 2] >= POSE_MIN_SCORE).all(axis=1)
+
+
+def _contact_frames(ankle_y: np.ndarray) -> np.ndarray:
+    """脚着地帧：踝关节在画面中最低（y 局部最大且低于中位数）的帧"""
+    if len(ankle_y) < 5:
+        return np.zeros(0, dtype=int)
+    smooth = np.convolve(ankle_y, np.ones(3) / 3, mode="valid")
+    middle = smooth[1:-1]
+    peaks = (middle >= smooth[:-2]) & (middle > smooth[2:]) & (middle > np.median(smooth))
+    # valid 卷积后下标偏移 1，middle 再偏移 1
+    return np.nonzero(peaks)[0] + 2
+
+
+def _median(values) -> Optional[float]:
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    return float(np.median(values)) if len(values) else None
+
+
+def evaluate_running_form(keypoints: np.ndarray, width: int, height: int, angle: Optional[str] = None) -> dict:
+    """由关键点序列评估膝关节对齐、着地方式、摆臂与躯干姿态
+
+    视角优先使用上传时选择的拍摄角度 angle，未提供时按肩宽与躯干长度之比判断
+    （侧面拍摄时肩宽远小于躯干长度）；两者不一致时 metrics.view_mismatch 为 True。
+    侧面拍摄时评估躯干前倾、着地时小腿角度与摆臂幅度；
+    正面/背面拍摄时评估膝内扣/外翻与摆臂是否越过中线，着地方式与躯干前倾无法判断。
+    """
+    points = keypoints.astype(np.float64).copy()
+    points[..., 0] *= width
+    points[..., 1] *= height
+    points = points[_visible(points, TORSO)]
+    result = {"knee_alignment": "unknown", "foot_strike": "unknown", "arm_swing": "unknown", "posture": "unknown"}
+    metrics = {"valid_frames": int(len(points))}
+    if len(points) < POSE_MIN_FRAMES:
+        return {**result, "view": "unknown", "metrics": metrics}
+
+    shoulder_mid = (points[:, L_SHOULDER, :2] + points[:, R_SHOULDER, :2]) / 2
+    hip_mid = (points[:, L_HIP, :2] + points[:, R_HIP, :2]) / 2
+    torso = float(np.median(np.linalg.norm(shoulder_mid - hip_mid, axis=1)))
+    shoulder_width = float(np.median(np.abs(points[:, L_SHOULDER, 0] - points[:, R_SHOULDER, 0])))
+    detected_view = "side" if shoulder_width < 0.35 * torso else "frontal"
+    view = ANGLE_VIEWS.get(angle, detected_view)
+    metrics["detected_view"] = detected_view
+    metrics["view_mismatch"] = view != detected_view
+
+    # 侧面时由鼻尖相对耳朵的位置判断跑动方向（+1 向右，-1 向左）
+    direction = 0.0
+    if view == "side":
+        ears = points[:, [L_EAR, R_EAR]]
+        ear_x = np.where(ears[..., 2] >= POSE_MIN_SCORE, ears[..., 0], np.nan)
+        with np.errstate(all="ignore"):
+            facing = points[:, NOSE, 0] - np.nanmean(ear_x, axis=1)
+        facing = _median(np.where(points[:, NOSE, 2] >= POSE_MIN_SCORE, facing, np.nan))
+        direction = float(np.sign(facing)) if facing else 0.0
+
+        # 躯干前倾角（仅侧面可测，正面拍摄时该角度是左右侧倾）：方向未知时取绝对值
+        lean = _angle_from_vertical(shoulder_mid, hip_mid)
+        trunk_lean = _median(lean * direction if direction else np.abs(lean))
+        metrics["trunk_lean_deg"] = round(trunk_lean, 1)
+        if trunk_lean > 15:
+            result["posture"] = "leaning_forward"
+        elif trunk_lean < -3:
+            result["posture"] = "leaning_back"
+        else:
+            result["posture"] = "upright"
+
+    knee_values, shank_values = [], []
+    for hip, knee, ankle in LEGS:
+        leg = points[_visible(points, [hip, knee, ankle])]
+        if len(leg) < POSE_MIN_FRAMES:
+            continue
+        contacts = leg[_contact_frames(leg[:, ankle, 1])]
+        if view == "frontal":
+            # 膝盖偏离髋-踝连线的距离（朝身体中线为正），按腿长归一化
+            line = leg[:, ankle, :2] - leg[:, hip, :2]
+            length = np.linalg.norm(line, axis=1) + 1e-9
+            offset = leg[:, knee, :2] - leg[:, hip, :2]
+            deviation = (line[:, 0] * offset[:, 1] - line[:, 1] * offset[:, 0]) / length
+            center_x = (leg[:, L_HIP, 0] + leg[:, R_HIP, 0]) / 2
+            toward_center = np.sign(center_x - leg[:, hip, 0]) * np.sign(line[:, 1])
+            knee_values.append(_median(-deviation * toward_center / length))
+        elif len(contacts):
+            knee_values.append(_median(_joint_angle(contacts[:, hip], contacts[:, knee], contacts[:, ankle])))
+            # 着地时小腿（膝→踝）相对竖直方向的角度，踝在膝前方为正
+            shank = -_angle_from_vertical(contacts[:, knee], contacts[:, ankle])
+            shank_values.append(_median(shank * direction if direction else np.abs(shank)))
+
+    knee_metric = _median([value for value in knee_values if value is not None])
+    if knee_metric is not None:
+        if view == "frontal":
+            metrics["knee_deviation"] = round(knee_metric, 3)
+            result["knee_alignment"] = "inward" if knee_metric > 0.06 else "outward" if knee_metric < -0.06 else "good"
+        else:
+            metrics["knee_angle_at_contact_deg"] = round(knee_metric, 1)
+            result["knee_alignment"] = "extended" if knee_metric > 170 else "good"
+
+    shank_metric = _median([value for value in shank_values if value is not None])
+    if shank_metric is not None:
+        metrics["shank_angle_at_contact_deg"] = round(shank_metric, 1)
+        result["foot_strike"] = "heel" if shank_metric > 10 else "midfoot" if shank_metric > 2 else "forefoot"
+
+    arms = [(L_SHOULDER, L_WRIST), (R_SHOULDER, R_WRIST)]
+    if view == "side":
+        ranges = []
+        for shoulder, wrist in arms:
+            arm = points[_visible(points, [shoulder, wrist])]
+            if len(arm) >= POSE_MIN_FRAMES:
+                swing = arm[:, wrist, 0] - arm[:, shoulder, 0]
+                ranges.append((np.percentile(swing, 95) - np.percentile(swing, 5)) / torso)
+        if ranges:
+            swing_range = max(ranges)
+            metrics["arm_swing_range"] = round(float(swing_range), 3)
+            result["arm_swing"] = "limited" if swing_range < 0.3 else "excessive" if swing_range > 1.0 else "optimal"
+    else:
+        crossings = []
+        for shoulder, wrist in arms:
+            arm = points[_visible(points, [shoulder, wrist])]
+            if len(arm) >= POSE_MIN_FRAMES:
+                center_x = (arm[:, L_SHOULDER, 0] + arm[:, R_SHOULDER, 0]) / 2
+                side = np.sign(arm[:, shoulder, 0] - center_x)
+                crossings.append(float(np.mean((arm[:, wrist, 0] - center_x) * side < -0.1 * shoulder_width)))
+        if crossings:
+            metrics["arm_crossing_ratio"] = round(max(crossings), 3)
+            result["arm_swing"] = "crossing" if max(crossings) > 0.2 else "optimal"
+
+    return {**result, "view": view, "metrics": metrics}
+
+
+def score_running_form(form: dict) -> tuple:
+    """按发现的问题扣分并生成建议，返回 (score, suggestions)"""
+    if form["view"] == "unknown":
+        return None, ["未检测到完整的人体姿态，请确保跑者全身在画面中且光线充足"]
+    issues = [SUGGESTIONS[(name, form[name])] for name in ("knee_alignment", "foot_strike", "arm_swing", "posture") if (name, form[name]) in SUGGESTIONS]
+    suggestions = issues or ["保持当前姿势"]
+    if form["metrics"].get("view_mismatch"):
+        suggestions.append("画面中的拍摄角度与上传时选择的角度不一致，请确认后重新上传以获得准确评估")
+    return max(0, 100 - 10 * len(issues)), suggestions
+
+
+def analyze_video_file(
+    path: str,
+    progress: Optional[Callable[[float], None]] = None,
+    angle: Optional[str] = None
+) -> dict:
+    """逐帧估计姿态并评估跑姿
+
+    key_points 为 {"frames": 取样帧号列表, "points": (N, 17, 3) float32 数组}，
+    由调用方单独存储（数据量随视频长度增长，不放入分析结果文档）。
+    """
+    model = load_pose_model()
+    indices, keypoints, video, performance = estimate_poses(path, model, progress=progress)
+    form = evaluate_running_form(keypoints, video["width"], video["height"], angle)
+    score, suggestions = score_running_form(form)
+    if progress:
+        progress(100)
+    return {
+        "score": score,
+        "knee_alignment": form["knee_alignment"],
+        "foot_strike": form["foot_strike"],
+        "arm_swing": form["arm_swing"],
+        "posture": form["posture"],
+        "view": form["view"],
+        "suggestions": suggestions,
+        "metrics": form["metrics"],
+        "keypoint_names": KEYPOINT_NAMES,
+        "key_points": {"frames": indices, "points": keypoints},
+        "video": video,
+        "performance": performance,
+    }
@@ -0,0 +1,126 @@
+"""CPU 姿态估计模型
+
+统一输出 COCO 17 关键点：形状 (N, 17, 3) 的数组，每点为 (x, y, score)，
+x、y 为相对原始帧宽高的归一化坐标。
+
+- onnx：ONNX Runtime 加载 MoveNet 类单人模型（输入 [N, H, W, 3]，输出 [N, 1, 17, 3]，
+  每点为 (y, x, score)），支持动态批量的模型整批推理；
+- mediapipe：MediaPipe Pose（逐帧推理，33 个关键点映射为 COCO 17 点）。
+
+两者均为可选依赖，仅在分析工作进程中按需导入。
+"""
+from typing import List
+import os
+
+import cv2
+import numpy as np
+
+backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+POSE_BACKEND = os.getenv("POSE_BACKEND", "auto")  # auto, onnx, mediapipe
+POSE_MODEL_PATH = os.getenv("POSE_MODEL_PATH", os.path.join(os.path.dirname(backend_root), "data", "models", "pose.onnx"))
+POSE_THREADS = int(os.getenv("POSE_THREADS", 0))  # 推理线程数，0 表示由运行时决定
+
+KEYPOINT_NAMES = [
+    "nose", "left_eye", "right_eye", "left_ear", "right_ear",
+    "left_shoulder", "right_shoulder", "left_elbow", "right_elbow",
+    "left_wrist", "right_wrist", "left_hip", "right_hip",
+    "left_knee", "right_knee", "left_ankle", "right_ankle",
+]
+
+# MediaPipe Pose 33 点中与 COCO 17 点对应的下标
+MEDIAPIPE_TO_COCO = [0, 2, 5, 7, 8, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28]
+
+
+class PoseModelUnavailable(RuntimeError):
+    """没有可用的姿态估计后端（部署配置问题，重试无效）"""
+
+
+class OnnxPoseModel:
+    """ONNX Runtime 推理（MoveNet 输入输出格式）"""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str = POSE_MODEL_PATH, threads: int = POSE_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        _, height, width, _ = model_input.shape
+        self.input_size = (int(width), int(height)) if isinstance(width, int) and isinstance(height, int) else (192, 192)
+        self.input_dtype = np.int32 if "int32" in model_input.type else np.float32
+        # 批量维度为固定值 1 的模型只能逐帧推理
+        self.max_batch = 1 if model_input.shape[0] == 1 else None
+
+    def prepare(self, frame: np.ndarray):
+        """BGR 帧 → 等比缩放并补边到模型输入尺寸（在解码线程中执行）"""
+        height, width = frame.shape[:2]
+        side = max(height, width)
+        pad_x, pad_y = (side - width) // 2, (side - height) // 2
+        square = cv2.copyMakeBorder(frame, pad_y, side - height - pad_y, pad_x, side - width - pad_x, cv2.BORDER_CONSTANT)
+        image = cv2.cvtColor(cv2.resize(square, self.input_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        return image.astype(self.input_dtype), (side, pad_x, pad_y, width, height)
+
+    def infer(self, batch: List[tuple]) -> np.ndarray:
+        images = np.stack([image for image, _ in batch])
+        if self.max_batch == 1:
+            outputs = [self.session.run(None, {self.input_name: image[None]})[0] for image in images]
+            raw = np.concatenate([output.reshape(1, -1, 3) for output in outputs])
+        else:
+            raw = self.session.run(None, {self.input_name: images})[0].reshape(len(batch), -1, 3)
+
+        keypoints = np.empty((len(batch), len(KEYPOINT_NAMES), 3), dtype=np.float32)
+        for i, (_, (side, pad_x, pad_y, width, height)) in enumerate(batch):
+            # 补边后的正方形坐标映射回原始帧
+            keypoints[i, :, 0] = (raw[i, :17, 1] * side - pad_x) / width
+            keypoints[i, :, 1] = (raw[i, :17, 0] * side - pad_y) / height
+            keypoints[i, :, 2] = raw[i, :17, 2]
+        return keypoints
+
+
+class MediaPipePoseModel:
+    """MediaPipe Pose 推理（视频模式，逐帧跟踪）"""
+
+    name = "mediapipe"
+    max_batch = None
+
+    def __init__(self):
+        import mediapipe as mp
+
+        self.pose = mp.solutions.pose.Pose(static_image_mode=False, model_complexity=1)
+
+    def prepare(self, frame: np.ndarray):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), None
+
+    def infer(self, batch: List[tuple]) -> np.ndarray:
+        keypoints = np.zeros((len(batch), len(KEYPOINT_NAMES), 3), dtype=np.float32)
+        for i, (image, _) in enumerate(batch):
+            landmarks = self.pose.process(image).pose_landmarks
+            if landmarks is None:
+                continue
+            for j, index in enumerate(MEDIAPIPE_TO_COCO):
+                point = landmarks.landmark[index]
+                keypoints[i, j] = (point.x, point.y, point.visibility)
+        return keypoints
+
+
+def load_pose_model(backend: str = POSE_BACKEND):
+    """按配置加载模型；auto 时优先使用已配置的 ONNX 模型，其次 MediaPipe
+
+    模型文件不存在或 mediapipe 未安装时抛出 PoseModelUnavailable。
+    """
+    if backend in ("onnx", "auto") and os.path.exists(POSE_MODEL_PATH):
+        return OnnxPoseModel()
+    if backend in ("mediapipe", "auto"):
+        try:
+            return MediaPipePoseModel()
+        except ImportError as e:
+            if backend == "mediapipe":
+                raise PoseModelUnavailable(f"没有可用的姿态估计模型：未安装 mediapipe（{e}）") from e
+    if backend == "onnx":
+        raise PoseModelUnavailable(f"没有可用的姿态估计模型：ONNX 模型 {POSE_MODEL_PATH} 不存在（POSE_MODEL_PATH）")
+    raise PoseModelUnavailable(f"没有可用的姿态估计模型：请将 ONNX 模型放在 {POSE_MODEL_PATH}（POSE_MODEL_PATH）或安装 mediapipe")
@@ -0,0 +1,29 @@
+"""运动数据读取字段声明
+
+每个读取路径在此声明所需字段，并由 projection() 生成对应的 MongoDB 投影，
+避免读取和反序列化不需要的 BSON 字段。新增读取路径时在 EXERCISE_READS 中添加一行。
+"""
+from utils.export_schema import TABLE_EXPORT_SCHEMA
+from utils.statistics import ROLLUP_FIELDS
+
+# 读取路径 -> 所需字段（_id 默认返回，用于时间戳回退）
+EXERCISE_READS = {
+    "export": TABLE_EXPORT_SCHEMA.fields,
+    "history": [
+        "timestamp", "basicInfo",
+        "bandData.heartRate", "bandData.pace", "bandData.calories",
+        "treadmillData.distance", "treadmillData.duration",
+    ],
+    "analytics": [
+        "timestamp", "basicInfo.age",
+        "bandData.heartRate", "bandData.pace", "bandData.trainingLoad",
+        "treadmillData.duration", "treadmillData.distance",
+    ],
+    # 与汇总指标保持一致，新增汇总指标时无需修改此处
+    "rollup": ["userId", "timestamp", *ROLLUP_FIELDS.values()],
+}
+
+
+def projection(read_path: str) -> dict:
+    """读取路径对应的 MongoDB 投影"""
+    return {field: 1 for field in EXERCISE_READS[read_path]}
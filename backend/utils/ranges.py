@@ -0,0 +1,224 @@
+"""HTTP Range 文件响应
+
+支持单段 Range 请求（206 Partial Content）与断点续传，
+以及 ETag / Last-Modified 条件请求。
+
+文件内容的发送方式（按优先级）：
+- 配置 SENDFILE_HEADER 时交给前置代理发送（nginx 的 X-Accel-Redirect
+  或 Apache/lighttpd 的 X-Sendfile），由代理使用 sendfile 并自行处理 Range；
+- ASGI 服务器支持 http.response.zerocopy 扩展时直接传递文件描述符；
+- 否则按 FILE_CHUNK_SIZE 分块读取。
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+import mimetypes
+import os
+
+import aiofiles
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+FILE_CHUNK_SIZE = 256 * 1024
+
+# 代理发送文件：SENDFILE_HEADER 为 X-Accel-Redirect 或 X-Sendfile；
+# X-Accel-Redirect 时 SENDFILE_ROOT 下的文件映射到 SENDFILE_PREFIX 下的内部路径
+SENDFILE_HEADER = os.getenv("SENDFILE_HEADER", "")
+SENDFILE_ROOT = os.getenv("SENDFILE_ROOT", "")
+SENDFILE_PREFIX = os.getenv("SENDFILE_PREFIX", "/protected/")
+
+# mimetypes 未收录或因平台而异的视频类型
+_MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+    ".mkv": "video/x-matroska",
+    ".webm": "video/webm",
+}
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析 Range 头，返回闭区间 (start, end)；无 Range 或格式不支持时返回 None"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # 后缀范围：最后 N 个字节
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            end = min(end, size - 1)
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="请求范围无效",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def guess_media_type(path: str, default: str = "application/octet-stream") -> str:
+    """根据扩展名确定媒体类型"""
+    ext = os.path.splitext(path)[1].lower()
+    return _MEDIA_TYPES.get(ext) or mimetypes.guess_type(path)[0] or default
+
+
+def content_disposition(disposition: str, filename: str) -> str:
+    """生成 Content-Disposition，非 ASCII 文件名使用 RFC 5987 编码"""
+    stem, ext = os.path.splitext(filename)
+    ascii_stem = stem.encode("ascii", "ignore").decode().replace('"', "").strip() or "file"
+    ascii_name = ascii_stem + ext.encode("ascii", "ignore").decode()
+    if ascii_name == filename:
+        return f'{disposition}; filename="{filename}"'
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """根据文件大小和修改时间生成 ETag"""
+    return f'"{stat.st_size:x}-{int(stat.st_mtime_ns):x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def iter_file(file, start: int, end: int, chunk_size: int = FILE_CHUNK_SIZE):
+    """读取文件闭区间 [start, end] 的内容（file 为路径或已打开的文件描述符，描述符不会被关闭）"""
+    remaining = end - start + 1
+    async with aiofiles.open(file, "rb", closefd=not isinstance(file, int)) as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _sendfile_target(path: str) -> Optional[str]:
+    """代理发送文件时的头部值，未配置或文件不在 SENDFILE_ROOT 下时返回 None"""
+    if not SENDFILE_HEADER:
+        return None
+    if SENDFILE_HEADER.lower() != "x-accel-redirect":
+        return os.path.abspath(path)
+    root = os.path.abspath(SENDFILE_ROOT) if SENDFILE_ROOT else ""
+    path = os.path.abspath(path)
+    if not root or os.path.commonpath([root, path]) != root:
+        return None
+    return SENDFILE_PREFIX.rstrip("/") + "/" + quote(os.path.relpath(path, root).replace(os.sep, "/"))
+
+
+class FileRangeResponse(Response):
+    """发送已打开文件闭区间 [start, end] 的响应（发送后关闭文件），服务器支持时使用 zerocopy 扩展
+
+    文件在构造响应前打开，之后文件被删除或替换（如缓存淘汰）不影响发送的内容。
+    """
+
+    def __init__(self, file, start: int, end: int, status_code: int, media_type: str, headers: dict):
+        self.file = file
+        self.start = start
+        self.count = end - start + 1
+        super().__init__(status_code=status_code, media_type=media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope.get("method") == "HEAD" or self.count <= 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": self.file.fileno(),
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False
+                })
+                return
+
+            async for chunk in iter_file(self.file.fileno(), self.start, self.start + self.count - 1):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            self.file.close()
+
+
+def range_file_response(
+    request: Request,
+    path: str,
+    media_type: Optional[str] = None,
+    content_disposition: Optional[str] = None
+) -> Response:
+    """返回支持 Range / 条件请求的文件响应（media_type 默认按扩展名确定）
+
+    文件在此打开，不存在时抛出 FileNotFoundError。
+    """
+    file = open(path, "rb")
+    try:
+        return _file_response(request, file, path, media_type, content_disposition)
+    except BaseException:
+        file.close()
+        raise
+
+
+def _file_response(
+    request: Request,
+    file,
+    path: str,
+    media_type: Optional[str],
+    content_disposition: Optional[str]
+) -> Response:
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    etag = file_etag(stat)
+    media_type = media_type or guess_media_type(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+    if content_disposition:
+        headers["Content-Disposition"] = content_disposition
+
+    if _not_modified(request, etag, stat.st_mtime):
+        file.close()
+        return Response(status_code=304, headers=headers)
+
+    # 交给前置代理发送（代理自行处理 Range）
+    sendfile_target = _sendfile_target(path)
+    if sendfile_target:
+        file.close()
+        headers[SENDFILE_HEADER] = sendfile_target
+        return Response(media_type=media_type, headers=headers)
+
+    # If-Range 不匹配时忽略 Range，返回完整内容
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() in (etag, headers["Last-Modified"]):
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return FileRangeResponse(file, 0, size - 1, 200, media_type, headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return FileRangeResponse(file, start, end, 206, media_type, headers)
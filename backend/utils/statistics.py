@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import Optional
+
+
+# 统计指标 -> 文档字段路径
+STAT_FIELDS = {
+    "heartRate": "bandData.heartRate",
+    "pace": "bandData.pace",
+    "calories": "bandData.calories",
+}
+
+# 用户统计汇总（stats_rollup）的指标 -> 文档字段路径
+ROLLUP_FIELDS = {
+    **STAT_FIELDS,
+    "distance": "treadmillData.distance",
+    "duration": "treadmillData.duration",
+}
+
+
+def empty_statistics() -> dict:
+    """无数据时的统计结果"""
+    result = {name: {"avg": 0, "max": 0, "min": 0, "data": []} for name in STAT_FIELDS}
+    result["dates"] = []
+    return result
+
+
+def build_match(
+    user_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> dict:
+    """构建用户与日期范围的查询条件"""
+    query = {}
+    if user_id:
+        query["userId"] = user_id
+    if start_date or end_date:
+        query["timestamp"] = {}
+        if start_date:
+            query["timestamp"]["$gte"] = start_date
+        if end_date:
+            query["timestamp"]["$lte"] = end_date
+    return query
+
+
+def _positive_or_null(path: str) -> dict:
+    """与原逻辑一致：0和空值不参与统计"""
+    return {"$cond": [{"$gt": [f"${path}", 0]}, f"${path}", None]}
+
+
+def build_statistics_pipeline(
+    user_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> list:
+    """构建统计聚合管道：整体 avg/max/min 与按天序列"""
+    project = {name: _positive_or_null(path) for name, path in STAT_FIELDS.items()}
+    project["day"] = {
+        "$dateToString": {
+            "format": "%Y-%m-%d",
+            "date": {"$ifNull": ["$timestamp", {"$toDate": "$_id"}]}
+        }
+    }
+
+    summary_group = {"_id": None}
+    daily_group = {"_id": "$day"}
+    for name in STAT_FIELDS:
+        summary_group[f"{name}_avg"] = {"$avg": f"${name}"}
+        summary_group[f"{name}_max"] = {"$max": f"${name}"}
+        summary_group[f"{name}_min"] = {"$min": f"${name}"}
+        daily_group[name] = {"$avg": f"${name}"}
+
+    daily_project = {"_id": 0, "date": "$_id"}
+    for name in STAT_FIELDS:
+        daily_project[name] = {"$round": [f"${name}", 2]}
+
+    return [
+        {"$match": build_match(user_id, start_date, end_date)},
+        {"$project": project},
+        {"$facet": {
+            "summary": [{"$group": summary_group}],
+            "daily": [
+                {"$group": daily_group},
+                {"$sort": {"_id": 1}},
+                {"$project": daily_project}
+            ]
+        }}
+    ]
+
+
+def format_statistics(facet: dict) -> dict:
+    """将聚合结果整理为接口返回格式"""
+    summary = facet.get("summary") or []
+    daily = facet.get("daily") or []
+    if not summary or not daily:
+        return empty_statistics()
+
+    summary = summary[0]
+    result = {}
+    for name in STAT_FIELDS:
+        avg = summary.get(f"{name}_avg")
+        result[name] = {
+            "avg": round(avg, 2) if avg is not None else 0,
+            "max": summary.get(f"{name}_max") or 0,
+            "min": summary.get(f"{name}_min") or 0,
+            "data": [day.get(name) for day in daily] if avg is not None else []
+        }
+    result["dates"] = [day["date"] for day in daily]
+    return result
+
+
+async def compute_statistics(
+    collection,
+    user_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> dict:
+    """在MongoDB服务端聚合统计数据"""
+    pipeline = build_statistics_pipeline(user_id, start_date, end_date)
+    results = await collection.aggregate(pipeline).to_list(length=1)
+    if not results:
+        return empty_statistics()
+    return format_statistics(results[0])
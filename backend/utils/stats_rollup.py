@@ -0,0 +1,403 @@
+"""用户统计汇总（user_stats）
+
+写入运动数据时按 日/周/累计 三个粒度增量维护 count/sum/min/max，
+读取统计时直接读取汇总桶，无需扫描原始 exercise 文档。
+
+按天分桶使用时间戳在库中的 UTC 日期，与聚合管道中 $dateToString 的结果一致；
+日期范围的首尾不足一天时，这部分从原始数据聚合，边界语义与 compute_statistics 相同。
+
+回填已有数据：
+    python -m utils.stats_rollup rebuild [--user USER_ID]
+
+重建按用户加锁：持锁期间该用户新写入的运动数据不直接累加，而是登记到锁文档，
+由重建结束时补记（已被重建扫描到的跳过），避免与实时累加重复或遗漏。
+全量重建时每批用户一起加锁，加锁与释放前的等待时间每批只需一次。
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+import asyncio
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from utils.database import Database
+from utils.exercise_storage import EXERCISE_COLLECTION
+from utils.statistics import STAT_FIELDS, ROLLUP_FIELDS, empty_statistics, _positive_or_null
+from utils.projections import projection
+
+ROLLUP_COLLECTION = "user_stats"
+REBUILD_LOCK_COLLECTION = "user_stats_locks"
+
+# 重建锁获取后、释放前的等待时间（秒），覆盖检查锁与写入汇总之间的间隔
+REBUILD_GRACE = float(os.getenv("STATS_REBUILD_GRACE", 2))
+REBUILD_LOCK_TTL = int(os.getenv("STATS_REBUILD_LOCK_TTL", 3600))
+# 全量重建时每批同时加锁的用户数
+REBUILD_USER_BATCH = int(os.getenv("STATS_REBUILD_USER_BATCH", 100))
+
+ONE_DAY = timedelta(days=1)
+# MongoDB 日期精度为毫秒，不早于当天最后一毫秒的结束时间视为覆盖整天
+DATE_PRECISION = timedelta(milliseconds=1)
+
+# 读取统计时是否使用汇总（回填完成前保持关闭）
+STATS_ROLLUP_ENABLED = os.getenv("STATS_ROLLUP_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def _get_path(doc: dict, path: str):
+    """按点号路径读取嵌套字段"""
+    value = doc
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def to_storage_time(value: datetime) -> datetime:
+    """转换为库中保存的时间：带时区的转为 UTC 去掉时区，不带时区的按原值保存"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def bucket_keys(timestamp: datetime) -> List[tuple]:
+    """运动时间对应的 (粒度, 桶) 列表"""
+    timestamp = to_storage_time(timestamp)
+    iso_year, iso_week, _ = timestamp.isocalendar()
+    return [
+        ("day", timestamp.strftime("%Y-%m-%d")),
+        ("week", f"{iso_year}-W{iso_week:02d}"),
+        ("lifetime", "all"),
+    ]
+
+
+def _doc_timestamp(doc: dict) -> datetime:
+    """运动时间，缺失时回退到 _id 的生成时间（UTC，与 $toDate(_id) 一致）"""
+    timestamp = doc.get("timestamp")
+    if isinstance(timestamp, datetime):
+        return timestamp
+    return doc["_id"].generation_time
+
+
+def build_rollup_update(doc: dict) -> dict:
+    """单条运动数据对应的原子更新（$inc/$min/$max）"""
+    inc = {"exercises": 1}
+    min_ops = {}
+    max_ops = {}
+    for name, path in ROLLUP_FIELDS.items():
+        value = _get_path(doc, path)
+        if not value or value <= 0:
+            continue
+        inc[f"{name}.count"] = 1
+        inc[f"{name}.sum"] = value
+        min_ops[f"{name}.min"] = value
+        max_ops[f"{name}.max"] = value
+
+    update = {"$inc": inc, "$set": {"updated_at": datetime.now()}}
+    if min_ops:
+        update["$min"] = min_ops
+        update["$max"] = max_ops
+    return update
+
+
+def build_rollup_operations(docs: List[dict]) -> List[UpdateOne]:
+    """批量运动数据对应的汇总更新操作"""
+    operations = []
+    for doc in docs:
+        update = build_rollup_update(doc)
+        for period, bucket in bucket_keys(_doc_timestamp(doc)):
+            operations.append(UpdateOne(
+                {"userId": doc.get("userId"), "period": period, "bucket": bucket},
+                update,
+                upsert=True
+            ))
+    return operations
+
+
+async def _write_rollup(docs: List[dict]):
+    operations = build_rollup_operations(docs)
+    if operations:
+        collection = Database.get_collection(ROLLUP_COLLECTION)
+        await collection.bulk_write(operations, ordered=False)
+
+
+async def _defer_if_rebuilding(docs: List[dict]) -> List[dict]:
+    """正在重建汇总的用户：将文档 _id 登记到重建锁，返回其余需要立即累加的文档"""
+    locks = Database.get_collection(REBUILD_LOCK_COLLECTION)
+    by_user = {}
+    for doc in docs:
+        by_user.setdefault(doc.get("userId"), []).append(doc)
+
+    pending = []
+    for user_id, user_docs in by_user.items():
+        lock = await locks.find_one_and_update(
+            {"_id": user_id, "state": {"$in": ["running", "releasing"]}, "expires_at": {"$gt": datetime.now()}},
+            {"$push": {"deferred": {"$each": [doc["_id"] for doc in user_docs]}}}
+        )
+        if lock is None:
+            pending.extend(user_docs)
+    return pending
+
+
+async def apply_exercises(docs: List[dict]):
+    """将新写入的运动数据累加到汇总"""
+    await _write_rollup(await _defer_if_rebuilding(docs))
+
+
+def _metric_stats(bucket_doc: dict, name: str) -> Optional[dict]:
+    metric = bucket_doc.get(name) or {}
+    if not metric.get("count"):
+        return None
+    return metric
+
+
+def _merge_metric(total: dict, metric: dict):
+    total["count"] = total.get("count", 0) + metric["count"]
+    total["sum"] = total.get("sum", 0) + metric["sum"]
+    total["min"] = min(total.get("min", metric["min"]), metric["min"])
+    total["max"] = max(total.get("max", metric["max"]), metric["max"])
+
+
+def _day_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def split_day_range(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[Optional[dict], List[dict]]:
+    """将 timestamp >= start_date 且 <= end_date 拆为整天桶范围与首尾不足一天的时间段
+
+    返回 (bucket 条件, [timestamp 条件, ...])；bucket 条件为 None 表示范围内没有整天。
+    """
+    start_date = to_storage_time(start_date) if start_date else None
+    end_date = to_storage_time(end_date) if end_date else None
+
+    first_day = last_day = None
+    if start_date:
+        first_day = _day_start(start_date)
+        if start_date > first_day:
+            first_day += ONE_DAY
+    if end_date:
+        last_day = _day_start(end_date)
+        if end_date < last_day + ONE_DAY - DATE_PRECISION:
+            last_day -= ONE_DAY
+
+    if first_day and last_day and first_day > last_day:
+        return None, [{"$gte": start_date, "$lte": end_date}]
+
+    bucket = {}
+    edges = []
+    if first_day:
+        bucket["$gte"] = first_day.strftime("%Y-%m-%d")
+        if start_date < first_day:
+            edges.append({"$gte": start_date, "$lt": first_day})
+    if last_day:
+        bucket["$lte"] = last_day.strftime("%Y-%m-%d")
+        if end_date >= last_day + ONE_DAY:
+            edges.append({"$gte": last_day + ONE_DAY, "$lte": end_date})
+    return bucket, edges
+
+
+def build_raw_day_pipeline(user_id: str, timestamp_range: dict) -> list:
+    """从原始运动数据聚合与汇总桶结构相同的按天统计"""
+    group = {
+        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        "exercises": {"$sum": 1},
+    }
+    for name, path in ROLLUP_FIELDS.items():
+        value = _positive_or_null(path)
+        group[f"{name}_count"] = {"$sum": {"$cond": [{"$gt": [f"${path}", 0]}, 1, 0]}}
+        group[f"{name}_sum"] = {"$sum": value}
+        group[f"{name}_min"] = {"$min": value}
+        group[f"{name}_max"] = {"$max": value}
+    return [
+        {"$match": {"userId": user_id, "timestamp": timestamp_range}},
+        {"$group": group},
+    ]
+
+
+def raw_day_bucket(row: dict) -> dict:
+    """聚合结果行 → 汇总桶文档结构"""
+    bucket_doc = {"bucket": row["_id"], "exercises": row["exercises"]}
+    for name in ROLLUP_FIELDS:
+        if row.get(f"{name}_count"):
+            bucket_doc[name] = {
+                stat: row[f"{name}_{stat}"] for stat in ("count", "sum", "min", "max")
+            }
+    return bucket_doc
+
+
+async def read_day_buckets(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[dict]:
+    """读取日期范围内的按天汇总（首尾不足一天的部分从原始数据聚合）"""
+    bucket, edges = split_day_range(start_date, end_date)
+    days = []
+    if bucket is not None:
+        query = {"userId": user_id, "period": "day"}
+        if bucket:
+            query["bucket"] = bucket
+        collection = Database.get_collection(ROLLUP_COLLECTION)
+        days = await collection.find(query).sort("bucket", 1).to_list(length=None)
+
+    if edges:
+        exercise_collection = Database.get_collection(EXERCISE_COLLECTION)
+        for timestamp_range in edges:
+            cursor = exercise_collection.aggregate(build_raw_day_pipeline(user_id, timestamp_range))
+            days.extend([raw_day_bucket(row) async for row in cursor])
+        days.sort(key=lambda day: day["bucket"])
+    return days
+
+
+async def read_summary(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> dict:
+    """读取汇总指标：{指标: {count, sum, min, max}}，另含 exercises 总数"""
+    if start_date or end_date:
+        buckets = await read_day_buckets(user_id, start_date, end_date)
+    else:
+        collection = Database.get_collection(ROLLUP_COLLECTION)
+        lifetime = await collection.find_one({"userId": user_id, "period": "lifetime", "bucket": "all"})
+        buckets = [lifetime] if lifetime else []
+
+    summary = {"exercises": 0}
+    for bucket_doc in buckets:
+        summary["exercises"] += bucket_doc.get("exercises", 0)
+        for name in ROLLUP_FIELDS:
+            metric = _metric_stats(bucket_doc, name)
+            if metric:
+                _merge_metric(summary.setdefault(name, {}), metric)
+    return summary
+
+
+async def read_statistics(
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> dict:
+    """从汇总读取 /api/statistics 的返回结果"""
+    days = await read_day_buckets(user_id, start_date, end_date)
+    if not days:
+        return empty_statistics()
+
+    result = {}
+    for name in STAT_FIELDS:
+        total = {}
+        series = []
+        for day in days:
+            metric = _metric_stats(day, name)
+            if metric:
+                _merge_metric(total, metric)
+                series.append(round(metric["sum"] / metric["count"], 2))
+            else:
+                series.append(None)
+        if not total:
+            result[name] = {"avg": 0, "max": 0, "min": 0, "data": []}
+            continue
+        result[name] = {
+            "avg": round(total["sum"] / total["count"], 2),
+            "max": total["max"],
+            "min": total["min"],
+            "data": series
+        }
+    result["dates"] = [day["bucket"] for day in days]
+    return result
+
+
+async def _acquire_rebuild_lock(user_id: str):
+    locks = Database.get_collection(REBUILD_LOCK_COLLECTION)
+    lock = {"state": "running", "deferred": [], "expires_at": datetime.now() + timedelta(seconds=REBUILD_LOCK_TTL)}
+    try:
+        await locks.insert_one({"_id": user_id, **lock})
+    except DuplicateKeyError:
+        # 重建进程异常退出后遗留的锁过期即可接管
+        taken = await locks.find_one_and_update(
+            {"_id": user_id, "expires_at": {"$lte": datetime.now()}},
+            {"$set": lock}
+        )
+        if taken is None:
+            raise RuntimeError(f"用户 {user_id} 的汇总正在重建")
+
+
+async def _rebuild_users(user_ids: List[str], batch_size: int) -> int:
+    exercise_collection = Database.get_collection(EXERCISE_COLLECTION)
+    rollup_collection = Database.get_collection(ROLLUP_COLLECTION)
+    locks = Database.get_collection(REBUILD_LOCK_COLLECTION)
+
+    acquired = []
+    try:
+        for each_user in user_ids:
+            await _acquire_rebuild_lock(each_user)
+            acquired.append(each_user)
+        # 等待获取锁之前已检查过锁的累加写入完成，之后再清空
+        await asyncio.sleep(REBUILD_GRACE)
+        await rollup_collection.delete_many({"userId": {"$in": user_ids}})
+
+        scanned = set()
+        batch = []
+        async for doc in exercise_collection.find({"userId": {"$in": user_ids}}, projection("rollup")):
+            scanned.add(doc["_id"])
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await _write_rollup(batch)
+                batch = []
+        if batch:
+            await _write_rollup(batch)
+
+        # 扫描结束前写入、尚未登记的文档在等待期间登记到锁
+        await locks.update_many({"_id": {"$in": user_ids}}, {"$set": {"state": "releasing"}})
+        await asyncio.sleep(REBUILD_GRACE)
+        deferred = []
+        for each_user in user_ids:
+            lock = await locks.find_one_and_delete({"_id": each_user})
+            deferred.extend(doc_id for doc_id in (lock or {}).get("deferred", []) if doc_id not in scanned)
+
+        for i in range(0, len(deferred), batch_size):
+            cursor = exercise_collection.find({"_id": {"$in": deferred[i:i + batch_size]}}, projection("rollup"))
+            await _write_rollup(await cursor.to_list(length=None))
+        return len(scanned) + len(deferred)
+    finally:
+        if acquired:
+            await locks.delete_many({"_id": {"$in": acquired}})
+
+
+async def rebuild(user_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """根据原始运动数据重建汇总（按批对用户加锁），返回处理的文档数"""
+    if user_id:
+        return await _rebuild_users([user_id], batch_size)
+
+    exercise_collection = Database.get_collection(EXERCISE_COLLECTION)
+    rollup_collection = Database.get_collection(ROLLUP_COLLECTION)
+    # 已没有运动数据的用户同样在持锁时清空汇总，重建期间新出现的用户不受影响
+    user_ids = set(await exercise_collection.distinct("userId"))
+    user_ids.update(await rollup_collection.distinct("userId"))
+    user_ids = sorted(user_ids, key=str)
+    count = 0
+    for i in range(0, len(user_ids), REBUILD_USER_BATCH):
+        count += await _rebuild_users(user_ids[i:i + REBUILD_USER_BATCH], batch_size)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="用户统计汇总工具")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: 根据原始数据重建汇总")
+    parser.add_argument("--user", default=None, help="只重建指定用户")
+    args = parser.parse_args()
+
+    async def main():
+        await Database.connect()
+        try:
+            count = await rebuild(args.user)
+            print(f"✅ 已重建汇总，处理运动数据 {count} 条")
+        finally:
+            await Database.disconnect()
+
+    asyncio.run(main())
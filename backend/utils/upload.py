@@ -0,0 +1,185 @@
+"""流式文件上传
+
+直接解析请求体中的 multipart 数据，文件内容按块写入目标目录下的临时文件，
+同时计算 SHA-256；超过大小限制时立即中止，内存占用与文件大小无关。
+"""
+from dataclasses import dataclass, field
+from typing import Collection, Optional
+import hashlib
+import os
+import uuid
+
+import aiofiles
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+
+# 非文件字段的最大长度
+MAX_FORM_FIELD_SIZE = 64 * 1024
+
+
+@dataclass
+class StreamedUpload:
+    """已写入临时文件的上传内容"""
+    filename: str
+    temp_path: str
+    size: int
+    sha256: str
+    fields: dict = field(default_factory=dict)
+
+    def commit(self, path: str):
+        """原子移动到最终路径"""
+        os.replace(self.temp_path, path)
+        self.temp_path = path
+
+    def discard(self):
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的 SHA-256（同步，需在线程中调用）"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"文件大小超过限制（最大{max_size // 1024 // 1024}MB）"
+    )
+
+
+class _UploadParser:
+    """multipart 回调：文件数据暂存为待写入的块，由调用方异步写盘"""
+
+    def __init__(self, file_field: str, max_size: int, allowed_extensions: Optional[Collection[str]]):
+        self.file_field = file_field
+        self.max_size = max_size
+        self.allowed_extensions = allowed_extensions
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.filename = None
+        self.fields = {}
+        self.pending = []
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name = None
+        self._in_file = False
+        self._file_seen = False
+        self._field_value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_value = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self._in_file = filename is not None and self._part_name == self.file_field and not self._file_seen
+        if not self._in_file:
+            return
+        self._file_seen = True
+        self.filename = os.path.basename(filename.decode("utf-8", "replace"))
+        ext = os.path.splitext(self.filename)[1].lower()
+        if self.allowed_extensions is not None and ext not in self.allowed_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的文件格式。支持的格式：{', '.join(self.allowed_extensions)}"
+            )
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.size += end - start
+            if self.size > self.max_size:
+                raise _too_large(self.max_size)
+            chunk = data[start:end]
+            self.hasher.update(chunk)
+            self.pending.append(chunk)
+        else:
+            self._field_value += data[start:end]
+            if len(self._field_value) > MAX_FORM_FIELD_SIZE:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="表单字段过长")
+
+    def on_part_end(self):
+        if not self._in_file and self._part_name:
+            self.fields[self._part_name] = self._field_value.decode("utf-8", "replace")
+        self._in_file = False
+
+
+async def receive_upload(
+    request: Request,
+    dest_dir: str,
+    max_size: int,
+    file_field: str = "file",
+    allowed_extensions: Optional[Collection[str]] = None
+) -> StreamedUpload:
+    """将 multipart 请求中的文件流式写入 dest_dir 下的临时文件
+
+    超过 max_size 时返回 413，扩展名不在 allowed_extensions 中时返回 400，
+    出错时删除临时文件。
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="请求必须为 multipart/form-data")
+
+    # 声明的请求体已明显超限时直接拒绝（预留 multipart 头部开销）
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + MAX_FORM_FIELD_SIZE:
+        raise _too_large(max_size)
+
+    handler = _UploadParser(file_field, max_size, allowed_extensions)
+    parser = MultipartParser(boundary, handler.callbacks())
+    temp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}.part")
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if handler.pending:
+                    await f.write(b"".join(handler.pending))
+                    handler.pending = []
+        parser.finalize()
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if handler.filename is None:
+        os.remove(temp_path)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"缺少文件字段：{file_field}")
+
+    return StreamedUpload(
+        filename=handler.filename,
+        temp_path=temp_path,
+        size=handler.size,
+        sha256=handler.hasher.hexdigest(),
+        fields=handler.fields
+    )